@@ -0,0 +1,68 @@
+"""Add change notify triggers
+
+Revision ID: 5b2e8f3c7d41
+Revises: 1a31ce608336
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f3c7d41'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Emit a compact NOTIFY on the `app_changes` channel for every row change
+    # of `item` and `user`: {"t": table, "op": "i"|"u"|"d", "id": ..., "o": owner}
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_app_change() RETURNS trigger AS $$
+        DECLARE
+            rec record;
+            payload json;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+            IF TG_TABLE_NAME = 'item' THEN
+                payload := json_build_object(
+                    't', 'item', 'op', lower(left(TG_OP, 1)),
+                    'id', rec.id, 'o', rec.owner_id
+                );
+            ELSE
+                payload := json_build_object(
+                    't', TG_TABLE_NAME, 'op', lower(left(TG_OP, 1)), 'id', rec.id
+                );
+            END IF;
+            PERFORM pg_notify('app_changes', payload::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON item
+        FOR EACH ROW EXECUTE FUNCTION notify_app_change();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER user_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON "user"
+        FOR EACH ROW EXECUTE FUNCTION notify_app_change();
+        """
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS user_notify_change ON "user"')
+    op.execute("DROP TRIGGER IF EXISTS item_notify_change ON item")
+    op.execute("DROP FUNCTION IF EXISTS notify_app_change()")
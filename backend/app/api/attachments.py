@@ -0,0 +1,91 @@
+"""R2 storage layout and URLs of item attachments.
+
+Attachment files are uploaded straight to R2 with a presigned PUT URL,
+never through the API, and downloaded with presigned GET URLs (or, where
+storage cannot be reached directly, streamed by `GET .../{id}/file`).
+Objects live under the owner's prefix (see `app.core.r2.user_prefix`), as
+`users/<owner id>/items/<item id>/attachments/<attachment id>/<filename>`,
+so deleting an item or a user removes its files with one prefix delete.
+"""
+
+import re
+import uuid
+
+from fastapi import BackgroundTasks
+
+from app.core.config import settings
+from app.core.derivatives import DERIVATIVES, derivative_key, has_derivatives
+from app.core.r2 import delete_object, delete_prefix, user_prefix
+from app.core.r2_presign import presign_url
+from app.models import Item, ItemAttachment, ItemAttachmentPublic
+from app.workers.tasks import enqueue, generate_derivatives
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def item_files_prefix(owner_id: uuid.UUID, item_id: uuid.UUID) -> str:
+    return f"{user_prefix(owner_id)}items/{item_id}/"
+
+
+def attachment_key(item: Item, attachment_id: uuid.UUID, filename: str) -> str:
+    # keep keys URL- and path-safe whatever the client sent
+    name = _UNSAFE_FILENAME_CHARS.sub("_", filename.rsplit("/", 1)[-1]).strip(".")
+    return (
+        f"{item_files_prefix(item.owner_id, item.id)}attachments/"
+        f"{attachment_id}/{name or 'file'}"
+    )
+
+
+def upload_url(attachment: ItemAttachment) -> str:
+    return presign_url(
+        "PUT", attachment.key, expires_in=settings.R2_ATTACHMENT_URL_EXPIRE_SECONDS
+    )
+
+
+def content_disposition(attachment: ItemAttachment) -> str:
+    # the last key segment is the sanitized filename
+    return f'attachment; filename="{attachment.key.rsplit("/", 1)[-1]}"'
+
+
+def attachment_public(attachment: ItemAttachment) -> ItemAttachmentPublic:
+    """The attachment with a presigned GET URL once its file is uploaded."""
+    url = None
+    derivatives = {}
+    if attachment.uploaded and settings.r2_enabled:
+        expires_in = settings.R2_ATTACHMENT_URL_EXPIRE_SECONDS
+        url = presign_url("GET", attachment.key, expires_in=expires_in)
+        if attachment.sha256:
+            derivatives = {
+                spec.name: presign_url(
+                    "GET",
+                    derivative_key(attachment.sha256, spec.name),
+                    expires_in=expires_in,
+                )
+                for spec in DERIVATIVES
+            }
+    return ItemAttachmentPublic.model_validate(
+        attachment, update={"url": url, "derivatives": derivatives}
+    )
+
+
+def schedule_derivatives(
+    background_tasks: BackgroundTasks, attachment: ItemAttachment
+) -> None:
+    """Queue thumbnail generation for image attachments after the response."""
+    if has_derivatives(attachment.content_type):
+        background_tasks.add_task(enqueue, generate_derivatives, str(attachment.id))
+
+
+def schedule_attachment_cleanup(
+    background_tasks: BackgroundTasks, attachment: ItemAttachment
+) -> None:
+    if settings.r2_enabled:
+        background_tasks.add_task(delete_object, attachment.key)
+
+
+def schedule_item_files_cleanup(background_tasks: BackgroundTasks, item: Item) -> None:
+    """Delete the item's R2 objects once the response has been sent."""
+    if settings.r2_enabled:
+        background_tasks.add_task(
+            delete_prefix, item_files_prefix(item.owner_id, item.id)
+        )
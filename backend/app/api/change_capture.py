@@ -0,0 +1,90 @@
+"""Feed database change notifications into WebSocket rooms.
+
+The `notify_app_change` trigger (see the alembic migration) sends a compact
+JSON payload on the `app_changes` channel for every row change of `item`
+and `user`, whether it came from the API or from bulk SQL. Each instance
+holds a single LISTEN connection and delivers the resulting events to its
+own room members only: every instance receives every notification, so
+publishing them through Redis would duplicate them.
+
+Item changes become the events of `app.api.events` (without `data`, the
+payload only carries ids) in `items:<owner id>` and `items`; user changes
+become `{"type": "user.<created|updated|deleted>", "id": ...}` in
+`user:<id>`.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+import psycopg
+
+from app.api.events import ITEMS_ROOM, item_event, items_room
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "app_changes"
+_VERBS = {"i": "created", "u": "updated", "d": "deleted"}
+
+
+def change_messages(payload: str) -> list[tuple[str, str]]:
+    """Map a notification payload to `(room, message)` pairs."""
+    try:
+        change = json.loads(payload)
+        table = change["t"]
+        verb = _VERBS[change["op"]]
+        row_id = change["id"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Ignoring malformed change notification: {payload!r}")
+        return []
+    if table == "item":
+        owner_id = change.get("o")
+        message = item_event(f"item.{verb}", row_id, owner_id)
+        return [(items_room(owner_id), message), (ITEMS_ROOM, message)]
+    if table == "user":
+        return [(f"user:{row_id}", json.dumps({"type": f"user.{verb}", "id": row_id}))]
+    return []
+
+
+class ChangeCapture:
+    """Single LISTEN connection per instance, reconnecting with backoff."""
+
+    def __init__(self, manager: Any, dsn: str, channel: str = CHANNEL):
+        self.manager = manager
+        self.dsn = dsn
+        self.channel = channel
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    logger.info(f"Listening for database changes on {self.channel}")
+                    backoff = 1.0
+                    async for notify in conn.notifies():
+                        await self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Change capture connection lost: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _dispatch(self, payload: str) -> None:
+        for room, message in change_messages(payload):
+            await self.manager.broadcast_local(room, message)
@@ -0,0 +1,100 @@
+"""Item change events delivered over the WebSocket manager's rooms.
+
+Every change to an item is published to the owner's room `items:<owner id>`
+and to the superuser-wide room `items`, as JSON
+`{"type": "item.created" | "item.updated" | "item.deleted", "id": ...,
+"owner_id": ..., "data": <ItemPublic or null>}`. Clients consume them over
+WebSockets or the Server-Sent Events stream `GET /items/events`.
+"""
+
+import asyncio
+import json
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi import BackgroundTasks, Request
+
+from app.core.config import settings
+from app.models import Item, ItemPublic
+
+ITEMS_ROOM = "items"
+ITEM_CREATED = "item.created"
+ITEM_UPDATED = "item.updated"
+ITEM_DELETED = "item.deleted"
+# Seconds between SSE comments keeping idle connections (and proxies) open.
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def items_room(owner_id: uuid.UUID | str) -> str:
+    return f"{ITEMS_ROOM}:{owner_id}"
+
+
+def item_event(
+    event_type: str, item_id: Any, owner_id: Any, data: dict[str, Any] | None = None
+) -> str:
+    return json.dumps(
+        {
+            "type": event_type,
+            "id": str(item_id),
+            "owner_id": str(owner_id),
+            "data": data,
+        }
+    )
+
+
+async def publish_item_event(manager: Any, event_type: str, item: ItemPublic) -> None:
+    data = None if event_type == ITEM_DELETED else item.model_dump(mode="json")
+    message = item_event(event_type, item.id, item.owner_id, data)
+    await manager.publish(items_room(item.owner_id), message)
+    await manager.publish(ITEMS_ROOM, message)
+
+
+def emit_item_event(
+    request: Request, background_tasks: BackgroundTasks, event_type: str, item: Item
+) -> None:
+    """Publish an item event once the response has been sent.
+
+    A no-op when change capture is enabled: the database triggers report
+    the change instead.
+    """
+    if settings.CHANGE_CAPTURE_ENABLED:
+        return
+    manager = getattr(request.app.state, "ws_manager", None)
+    if manager is None:
+        return
+    background_tasks.add_task(
+        publish_item_event, manager, event_type, ItemPublic.model_validate(item)
+    )
+
+
+async def sse_stream(
+    request: Request,
+    manager: Any,
+    room: str,
+    keepalive: float = SSE_KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+    """Yield the messages of `room` as Server-Sent Events until the client leaves.
+
+    The stream ends if the client falls too far behind; EventSource clients
+    reconnect on their own.
+    """
+    queue = manager.subscribe(room)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                return
+            if isinstance(message, (bytes, bytearray)):
+                # SSE is text only
+                continue
+            yield f"data: {message}\n\n"
+    finally:
+        manager.unsubscribe(room, queue)
@@ -1,6 +1,15 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, private, users, utils, ws
+from app.api.routes import (
+    attachments,
+    broadcasts,
+    items,
+    login,
+    private,
+    users,
+    utils,
+    ws,
+)
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -8,6 +17,8 @@ api_router.include_router(login.router)
 api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(items.router)
+api_router.include_router(attachments.router)
+api_router.include_router(broadcasts.router)
 api_router.include_router(ws.router)
 
 
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+# Cluster-wide room -> connection count, read in O(1) with HGET.
+ROOMS_KEY = "ws:presence:rooms"
+# Sorted set of live instances scored by their last heartbeat.
+INSTANCES_KEY = "ws:presence:instances"
+# Per-instance room -> local connection count, used to undo an instance's
+# contribution to ROOMS_KEY once it stops heartbeating. It does not expire:
+# every write also lists the instance in INSTANCES_KEY, so a reaper always
+# finds it, however long the instance has been gone.
+INSTANCE_KEY = "ws:presence:instance:{}"
+
+# KEYS: rooms, instance, instances; ARGV: room, delta, instance id, now
+_ADJUST = """
+local total = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if total <= 0 then redis.call('HDEL', KEYS[1], ARGV[1]) end
+local mine = redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+if mine <= 0 then redis.call('HDEL', KEYS[2], ARGV[1]) end
+redis.call('ZADD', KEYS[3], 'NX', ARGV[4], ARGV[3])
+return total
+"""
+
+# KEYS: rooms, instance, instances; ARGV: instance id, now, room1, count1, ...
+# Heartbeats and brings this instance's counts (and its share of the
+# totals) in line with the local connection map.
+_RECONCILE = """
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+local wanted = {}
+for i = 3, #ARGV, 2 do wanted[ARGV[i]] = tonumber(ARGV[i + 1]) end
+local current = redis.call('HGETALL', KEYS[2])
+for i = 1, #current, 2 do
+  if wanted[current[i]] == nil then wanted[current[i]] = 0 end
+end
+for room, count in pairs(wanted) do
+  local diff = count - tonumber(redis.call('HGET', KEYS[2], room) or '0')
+  if diff ~= 0 then
+    local total = redis.call('HINCRBY', KEYS[1], room, diff)
+    if total <= 0 then redis.call('HDEL', KEYS[1], room) end
+  end
+  if count > 0 then
+    redis.call('HSET', KEYS[2], room, count)
+  else
+    redis.call('HDEL', KEYS[2], room)
+  end
+end
+return 1
+"""
+
+# KEYS: instances, rooms, instance; ARGV: instance id, cutoff
+# Removes a dead instance's contribution; a no-op if it heartbeated since.
+_REAP = """
+local seen = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if seen and tonumber(seen) > tonumber(ARGV[2]) then return 0 end
+local counts = redis.call('HGETALL', KEYS[3])
+for i = 1, #counts, 2 do
+  local total = redis.call('HINCRBY', KEYS[2], counts[i], -tonumber(counts[i + 1]))
+  if total <= 0 then redis.call('HDEL', KEYS[2], counts[i]) end
+end
+redis.call('DEL', KEYS[3])
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('ZCARD', KEYS[1]) == 0 then redis.call('DEL', KEYS[2]) end
+return 1
+"""
+
+
+class PresenceTracker:
+    """Track cluster-wide room occupancy in Redis.
+
+    Every instance adjusts a shared `room -> count` hash when sockets join or
+    leave, mirrors its own share in a per-instance hash and heartbeats into
+    a sorted set. Instances that miss heartbeats for `ttl` seconds are reaped
+    by any live instance, subtracting their share from the shared hash, so
+    occupancy reads stay a single HGET.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        instance_id: str,
+        local_counts: Callable[[], dict[str, int]],
+        ttl: int = 30,
+    ):
+        self.redis = redis_client
+        self.instance_id = instance_id
+        self.local_counts = local_counts
+        self.ttl = ttl
+        self.interval = max(ttl / 3, 1)
+        self.instance_key = INSTANCE_KEY.format(instance_id)
+        self._adjust = redis_client.register_script(_ADJUST)
+        self._reconcile = redis_client.register_script(_RECONCILE)
+        self._reap = redis_client.register_script(_REAP)
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+        try:
+            # leave the cluster immediately instead of waiting to be reaped
+            await self._reap(
+                keys=[INSTANCES_KEY, ROOMS_KEY, self.instance_key],
+                args=[self.instance_id, time.time()],
+            )
+        except Exception as e:
+            logger.warning(f"Presence cleanup failed: {e}")
+
+    async def adjust(self, room: str, delta: int) -> None:
+        try:
+            await self._adjust(
+                keys=[ROOMS_KEY, self.instance_key, INSTANCES_KEY],
+                args=[room, delta, self.instance_id, time.time()],
+            )
+        except Exception as e:
+            logger.warning(f"Presence update failed for room {room}: {e}")
+
+    async def occupancy(self, room: str) -> int:
+        value = await self.redis.hget(ROOMS_KEY, room)
+        return max(int(value or 0), 0)
+
+    async def heartbeat(self) -> None:
+        now = time.time()
+        args: list = [self.instance_id, now]
+        for room, count in self.local_counts().items():
+            args.extend((room, count))
+        await self._reconcile(
+            keys=[ROOMS_KEY, self.instance_key, INSTANCES_KEY], args=args
+        )
+        cutoff = now - self.ttl
+        for stale in await self.redis.zrangebyscore(INSTANCES_KEY, "-inf", cutoff):
+            if isinstance(stale, (bytes, bytearray)):
+                stale = stale.decode()
+            await self._reap(
+                keys=[INSTANCES_KEY, ROOMS_KEY, INSTANCE_KEY.format(stale)],
+                args=[stale, cutoff],
+            )
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                await self.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Presence heartbeat failed: {e}")
+            await asyncio.sleep(self.interval)
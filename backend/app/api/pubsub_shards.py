@@ -0,0 +1,164 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from app.core.metrics import Metric
+
+logger = logging.getLogger(__name__)
+
+# Points per shard on the hash ring; more points even out the room spread.
+RING_REPLICAS = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of room names onto shard indexes.
+
+    Changing the shard count only moves about 1/n of the rooms, so
+    subscriptions stay put across restarts with a different setting.
+    """
+
+    def __init__(self, shards: int, replicas: int = RING_REPLICAS):
+        points = sorted(
+            (_hash(f"{shard}:{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, room: str) -> int:
+        index = bisect.bisect(self._keys, _hash(room)) % len(self._keys)
+        return self._shards[index]
+
+
+class PubSubShard:
+    """One Redis pub/sub connection and reader task for a subset of rooms.
+
+    The shard subscribes to `ws:{room}` while `is_wanted(room)` holds and
+    hands every message to `on_message`. Subscription changes are
+    serialized per shard and re-check `is_wanted`, so racing joins and
+    leaves settle on the current membership.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        redis_client,
+        is_wanted: Callable[[str], bool],
+        on_message: Callable[[dict], Awaitable[None]],
+    ):
+        self.index = index
+        self.pubsub = redis_client.pubsub()
+        self.is_wanted = is_wanted
+        self.on_message = on_message
+        self.rooms: set[str] = set()
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        # seconds spent delivering messages to local sockets
+        self.busy = 0.0
+        self._lock = asyncio.Lock()
+        # set once the first SUBSCRIBE opened the connection
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._reader_loop())
+
+    async def sync(self, room: str) -> None:
+        async with self._lock:
+            wanted = self.is_wanted(room)
+            if wanted == (room in self.rooms):
+                return
+            try:
+                if wanted:
+                    await self.pubsub.subscribe(f"ws:{room}")
+                    self.rooms.add(room)
+                    self._ready.set()
+                else:
+                    await self.pubsub.unsubscribe(f"ws:{room}")
+                    self.rooms.discard(room)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(
+                    f"Pub/sub shard {self.index} failed to update {room}: {e}"
+                )
+
+    async def _reader_loop(self) -> None:
+        await self._ready.wait()
+        while True:
+            try:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=None
+                )
+                if not message:
+                    continue
+                data = message.get("data")
+                self.messages += 1
+                self.bytes += len(data) if isinstance(data, (bytes, str)) else 0
+                started = time.perf_counter()
+                await self.on_message(message)
+                self.busy += time.perf_counter() - started
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # the client reconnects and resubscribes on the next read
+                self.errors += 1
+                logger.warning(f"Pub/sub shard {self.index} reader error: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "rooms": len(self.rooms),
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "busy_seconds": self.busy,
+        }
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+        try:
+            await self.pubsub.close()
+        except Exception:
+            pass
+
+
+def shard_metrics(shards: list[PubSubShard]) -> list[Metric]:
+    """Per-shard metrics for the `/utils/metrics/` endpoint."""
+    specs = (
+        ("ws_pubsub_rooms", "gauge", "Rooms subscribed on the shard", "rooms"),
+        ("ws_pubsub_messages_total", "counter", "Messages read from Redis", "messages"),
+        ("ws_pubsub_bytes_total", "counter", "Payload bytes read from Redis", "bytes"),
+        (
+            "ws_pubsub_errors_total",
+            "counter",
+            "Pub/sub command and read errors",
+            "errors",
+        ),
+        (
+            "ws_pubsub_busy_seconds_total",
+            "counter",
+            "Time spent delivering messages to local sockets",
+            "busy_seconds",
+        ),
+    )
+    stats = [(str(shard.index), shard.stats()) for shard in shards]
+    return [
+        Metric(
+            name, kind, help_text, [({"shard": index}, s[key]) for index, s in stats]
+        )
+        for name, kind, help_text, key in specs
+    ]
@@ -0,0 +1,242 @@
+import uuid
+from functools import partial
+from typing import Annotated, Any
+
+from anyio import from_thread
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException
+from fastapi.responses import Response
+from sqlmodel import Session, func, select
+
+from app.api.attachments import (
+    attachment_key,
+    attachment_public,
+    content_disposition,
+    schedule_attachment_cleanup,
+    schedule_derivatives,
+    upload_url,
+)
+from app.api.deps import CurrentUser, SessionDep
+from app.core.config import settings
+from app.core.derivatives import DERIVATIVES, derivative_key
+from app.core.r2 import delete_object, head_object
+from app.core.r2_cache import cached_response
+from app.models import (
+    Item,
+    ItemAttachment,
+    ItemAttachmentCreate,
+    ItemAttachmentPublic,
+    ItemAttachmentsPublic,
+    ItemAttachmentUpload,
+    Message,
+    User,
+)
+
+router = APIRouter(prefix="/items/{item_id}/attachments", tags=["items"])
+
+
+def get_item(session: Session, current_user: User, item_id: uuid.UUID) -> Item:
+    item = session.get(Item, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return item
+
+
+def get_attachment(
+    session: Session, current_user: User, item_id: uuid.UUID, id: uuid.UUID
+) -> ItemAttachment:
+    get_item(session, current_user, item_id)
+    attachment = session.get(ItemAttachment, id)
+    if not attachment or attachment.item_id != item_id:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment
+
+
+def require_storage() -> None:
+    if not settings.r2_enabled:
+        raise HTTPException(status_code=503, detail="File storage is unavailable")
+
+
+@router.get("/", response_model=ItemAttachmentsPublic)
+def read_attachments(
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    skip: int = 0,
+    limit: int = 100,
+) -> Any:
+    """
+    Retrieve the uploaded attachments of an item, with download URLs.
+    """
+    get_item(session, current_user, item_id)
+    where = (ItemAttachment.item_id == item_id, ItemAttachment.uploaded)
+    count_statement = select(func.count()).select_from(ItemAttachment).where(*where)
+    count = session.exec(count_statement).one()
+    statement = select(ItemAttachment).where(*where).offset(skip).limit(limit)
+    attachments = session.exec(statement).all()
+    return ItemAttachmentsPublic(
+        data=[attachment_public(a) for a in attachments], count=count
+    )
+
+
+@router.get("/{id}", response_model=ItemAttachmentPublic)
+def read_attachment(
+    session: SessionDep, current_user: CurrentUser, item_id: uuid.UUID, id: uuid.UUID
+) -> Any:
+    """
+    Get attachment by ID.
+    """
+    attachment = get_attachment(session, current_user, item_id, id)
+    return attachment_public(attachment)
+
+
+@router.get("/{id}/file")
+def download_attachment(
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    id: uuid.UUID,
+    range: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    Download the file of an attachment through the API.
+
+    Honours a single-range `Range` header. Clients that can reach storage
+    should prefer the presigned `url`, which does not load the API.
+    """
+    require_storage()
+    attachment = get_attachment(session, current_user, item_id, id)
+    if not attachment.uploaded:
+        raise HTTPException(status_code=404, detail="File has not been uploaded")
+    # served from the local disk cache when enabled; the body is streamed by
+    # the event loop, one chunk at a time
+    return from_thread.run(
+        partial(
+            cached_response,
+            attachment.key,
+            range,
+            if_none_match=if_none_match,
+            headers={"Content-Disposition": content_disposition(attachment)},
+        )
+    )
+
+
+@router.get("/{id}/derivatives/{name}")
+def download_derivative(
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    id: uuid.UUID,
+    name: str,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    Download a thumbnail (see `derivatives`) of an image attachment.
+    """
+    require_storage()
+    attachment = get_attachment(session, current_user, item_id, id)
+    if not attachment.sha256 or name not in {spec.name for spec in DERIVATIVES}:
+        raise HTTPException(status_code=404, detail="Derivative not found")
+    # derivatives never change once stored under the image's digest
+    return from_thread.run(
+        partial(
+            cached_response,
+            derivative_key(attachment.sha256, name),
+            if_none_match=if_none_match,
+            headers={"Cache-Control": "private, max-age=31536000, immutable"},
+        )
+    )
+
+
+@router.post("/", response_model=ItemAttachmentUpload)
+def create_attachment(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    attachment_in: ItemAttachmentCreate,
+) -> Any:
+    """
+    Create an attachment and return a presigned URL to upload its file to.
+
+    Upload the file with `method` to `upload_url`, sending `headers`, then
+    confirm it with `POST /items/{item_id}/attachments/{id}/complete`.
+    """
+    require_storage()
+    item = get_item(session, current_user, item_id)
+    attachment_id = uuid.uuid4()
+    attachment = ItemAttachment.model_validate(
+        attachment_in,
+        update={
+            "id": attachment_id,
+            "item_id": item.id,
+            "key": attachment_key(item, attachment_id, attachment_in.filename),
+        },
+    )
+    session.add(attachment)
+    session.commit()
+    session.refresh(attachment)
+    return ItemAttachmentUpload(
+        attachment=attachment_public(attachment),
+        upload_url=upload_url(attachment),
+        headers={"Content-Type": attachment.content_type},
+        expires_in=settings.R2_ATTACHMENT_URL_EXPIRE_SECONDS,
+    )
+
+
+@router.post("/{id}/complete", response_model=ItemAttachmentPublic)
+def complete_attachment(
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+) -> Any:
+    """
+    Confirm that the file of an attachment has been uploaded.
+
+    Thumbnails of images are generated in the background; they show up in
+    `derivatives` once ready.
+    """
+    require_storage()
+    attachment = get_attachment(session, current_user, item_id, id)
+    # the route runs in the threadpool; R2 calls go to the event loop's client
+    head = from_thread.run(head_object, attachment.key)
+    if head is None:
+        raise HTTPException(status_code=400, detail="File has not been uploaded")
+    if head["ContentLength"] > settings.R2_ATTACHMENT_MAX_BYTES:
+        from_thread.run(delete_object, attachment.key)
+        raise HTTPException(status_code=413, detail="File is too large")
+    attachment.sqlmodel_update(
+        {
+            "uploaded": True,
+            "size": head["ContentLength"],
+            "etag": head.get("ETag"),
+            "content_type": head.get("ContentType") or attachment.content_type,
+        }
+    )
+    session.add(attachment)
+    session.commit()
+    session.refresh(attachment)
+    schedule_derivatives(background_tasks, attachment)
+    return attachment_public(attachment)
+
+
+@router.delete("/{id}")
+def delete_attachment(
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_id: uuid.UUID,
+    id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+) -> Message:
+    """
+    Delete an attachment and its file.
+    """
+    attachment = get_attachment(session, current_user, item_id, id)
+    session.delete(attachment)
+    session.commit()
+    schedule_attachment_cleanup(background_tasks, attachment)
+    return Message(message="Attachment deleted successfully")
@@ -0,0 +1,54 @@
+import uuid
+from typing import Annotated
+
+import redis
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+
+from app.api.deps import get_current_active_superuser
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.models import BroadcastCreate, BroadcastProgress
+from app.workers.broadcast import create_progress, get_progress
+from app.workers.tasks import enqueue, fan_out_broadcast
+
+router = APIRouter(
+    prefix="/broadcasts",
+    tags=["broadcasts"],
+    dependencies=[Depends(get_current_active_superuser)],
+)
+
+RedisDep = Annotated[redis.Redis, Depends(get_sync_redis)]
+
+
+@router.post("/", status_code=202)
+def create_broadcast(
+    broadcast_in: BroadcastCreate, client: RedisDep, background_tasks: BackgroundTasks
+) -> BroadcastProgress:
+    """
+    Email an announcement to every active user.
+    """
+    if not settings.emails_enabled:
+        raise HTTPException(status_code=503, detail="Emails are not configured")
+    broadcast_id = uuid.uuid4()
+    create_progress(client, broadcast_id, broadcast_in.subject)
+    background_tasks.add_task(
+        enqueue,
+        fan_out_broadcast,
+        str(broadcast_id),
+        broadcast_in.subject,
+        broadcast_in.message,
+    )
+    return BroadcastProgress(
+        id=broadcast_id, subject=broadcast_in.subject, status="queued"
+    )
+
+
+@router.get("/{broadcast_id}")
+def read_broadcast(broadcast_id: uuid.UUID, client: RedisDep) -> BroadcastProgress:
+    """
+    Get the progress of a broadcast.
+    """
+    progress = get_progress(client, broadcast_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return progress
@@ -1,10 +1,21 @@
 import uuid
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlmodel import func, select
 
+from app.api.attachments import schedule_item_files_cleanup
 from app.api.deps import CurrentUser, SessionDep
+from app.api.events import (
+    ITEM_CREATED,
+    ITEM_DELETED,
+    ITEM_UPDATED,
+    ITEMS_ROOM,
+    emit_item_event,
+    items_room,
+    sse_stream,
+)
 from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
 
 router = APIRouter(prefix="/items", tags=["items"])
@@ -41,6 +52,25 @@ def read_items(
     return ItemsPublic(data=items, count=count)
 
 
+@router.get("/events", response_class=StreamingResponse)
+async def stream_item_events(
+    request: Request, current_user: CurrentUser
+) -> StreamingResponse:
+    """
+    Stream item changes as Server-Sent Events: the user's own items, or all
+    items for superusers.
+    """
+    manager = getattr(request.app.state, "ws_manager", None)
+    if manager is None:
+        raise HTTPException(status_code=503, detail="Item events are unavailable")
+    room = ITEMS_ROOM if current_user.is_superuser else items_room(current_user.id)
+    return StreamingResponse(
+        sse_stream(request, manager, room),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{id}", response_model=ItemPublic)
 def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
     """
@@ -56,7 +86,12 @@ def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) ->
 
 @router.post("/", response_model=ItemPublic)
 def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_in: ItemCreate,
+    request: Request,
+    background_tasks: BackgroundTasks,
 ) -> Any:
     """
     Create new item.
@@ -65,6 +100,7 @@ def create_item(
     session.add(item)
     session.commit()
     session.refresh(item)
+    emit_item_event(request, background_tasks, ITEM_CREATED, item)
     return item
 
 
@@ -75,6 +111,8 @@ def update_item(
     current_user: CurrentUser,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    request: Request,
+    background_tasks: BackgroundTasks,
 ) -> Any:
     """
     Update an item.
@@ -89,12 +127,17 @@ def update_item(
     session.add(item)
     session.commit()
     session.refresh(item)
+    emit_item_event(request, background_tasks, ITEM_UPDATED, item)
     return item
 
 
 @router.delete("/{id}")
 def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+    session: SessionDep,
+    current_user: CurrentUser,
+    id: uuid.UUID,
+    request: Request,
+    background_tasks: BackgroundTasks,
 ) -> Message:
     """
     Delete an item.
@@ -104,6 +147,9 @@ def delete_item(
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    emit_item_event(request, background_tasks, ITEM_DELETED, item)
+    if item.attachments:
+        schedule_item_files_cleanup(background_tasks, item)
     session.delete(item)
     session.commit()
     return Message(message="Item deleted successfully")
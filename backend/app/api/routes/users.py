@@ -1,7 +1,7 @@
 import uuid
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlmodel import col, delete, func, select
 
 from app import crud
@@ -11,6 +11,7 @@ from app.api.deps import (
     get_current_active_superuser,
 )
 from app.core.config import settings
+from app.core.r2 import delete_prefix, user_prefix
 from app.core.security import get_password_hash, verify_password
 from app.models import (
     Item,
@@ -24,11 +25,20 @@ from app.models import (
     UserUpdate,
     UserUpdateMe,
 )
-from app.utils import generate_new_account_email, send_email
+from app.utils import generate_password_reset_token
+from app.workers.tasks import enqueue, send_welcome_email
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def schedule_user_files_cleanup(
+    background_tasks: BackgroundTasks, user_id: uuid.UUID
+) -> None:
+    """Delete the user's R2 objects once the response has been sent."""
+    if settings.r2_enabled:
+        background_tasks.add_task(delete_prefix, user_prefix(user_id))
+
+
 @router.get(
     "/",
     dependencies=[Depends(get_current_active_superuser)],
@@ -51,7 +61,9 @@ def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
 @router.post(
     "/", dependencies=[Depends(get_current_active_superuser)], response_model=UserPublic
 )
-def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
+def create_user(
+    *, session: SessionDep, user_in: UserCreate, background_tasks: BackgroundTasks
+) -> Any:
     """
     Create new user.
     """
@@ -64,13 +76,11 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
 
     user = crud.create_user(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
-        email_data = generate_new_account_email(
-            email_to=user_in.email, username=user_in.email, password=user_in.password
-        )
-        send_email(
-            email_to=user_in.email,
-            subject=email_data.subject,
-            html_content=email_data.html_content,
+        # a link to set the password, not the password: task arguments are
+        # kept in the broker and visible to monitoring
+        token = generate_password_reset_token(email=user_in.email)
+        background_tasks.add_task(
+            enqueue, send_welcome_email, user_in.email, user_in.email, token
         )
     return user
 
@@ -126,7 +136,9 @@ def read_user_me(current_user: CurrentUser) -> Any:
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+def delete_user_me(
+    session: SessionDep, current_user: CurrentUser, background_tasks: BackgroundTasks
+) -> Any:
     """
     Delete own user.
     """
@@ -136,6 +148,7 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         )
     session.delete(current_user)
     session.commit()
+    schedule_user_files_cleanup(background_tasks, current_user.id)
     return Message(message="User deleted successfully")
 
 
@@ -207,7 +220,10 @@ def update_user(
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
 def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+    session: SessionDep,
+    current_user: CurrentUser,
+    user_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
 ) -> Message:
     """
     Delete a user.
@@ -223,4 +239,5 @@ def delete_user(
     session.exec(statement)  # type: ignore
     session.delete(user)
     session.commit()
+    schedule_user_files_cleanup(background_tasks, user_id)
     return Message(message="User deleted successfully")
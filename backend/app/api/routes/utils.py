@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi.responses import PlainTextResponse
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core.metrics import registry
 from app.models import Message
-from app.utils import generate_test_email, send_email
+from app.workers.tasks import enqueue, send_test_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
 
@@ -13,19 +15,28 @@ router = APIRouter(prefix="/utils", tags=["utils"])
     dependencies=[Depends(get_current_active_superuser)],
     status_code=201,
 )
-def test_email(email_to: EmailStr) -> Message:
+def test_email(email_to: EmailStr, background_tasks: BackgroundTasks) -> Message:
     """
     Test emails.
     """
-    email_data = generate_test_email(email_to=email_to)
-    send_email(
-        email_to=email_to,
-        subject=email_data.subject,
-        html_content=email_data.html_content,
-    )
+    background_tasks.add_task(enqueue, send_test_email, email_to)
     return Message(message="Test email sent")
 
 
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_class=PlainTextResponse,
+)
+async def metrics() -> PlainTextResponse:
+    """
+    Instance metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        await registry.render(), media_type="text/plain; version=0.0.4"
+    )
@@ -1,6 +1,19 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Any
 
-router = APIRouter()
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+
+from app.api.deps import CurrentUser
+from app.api.ws_auth import WebSocketUser, authenticate_websocket, can_access_room
+from app.models import RoomPresence
+
+router = APIRouter(tags=["ws"])
 
 
 @router.websocket("/ws/{room}")
@@ -8,14 +21,58 @@ async def websocket_endpoint(websocket: WebSocket, room: str):
     """Simple WebSocket endpoint that forwards client messages to Redis
     and receives published messages via the WebSocketManager (attached to
     the app state) to broadcast to local clients.
+
+    Clients authenticate with their access token as `?token=<jwt>` (or a
+    bearer `Authorization` header); unauthorized clients are accepted and
+    closed right away with code 1008 (policy violation). For durable rooms,
+    clients reconnecting with `?last_event_id=<id>` first receive the
+    messages published since that id.
     """
+    user = await authenticate_websocket(websocket)
+    if user is None or not can_access_room(user, room):
+        # closing before accepting would reject the handshake with HTTP 403,
+        # hiding the close code from the client
+        await websocket.accept()
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     manager = websocket.app.state.ws_manager
-    await manager.connect(websocket, room)
     try:
+        if not await manager.connect(
+            websocket,
+            room,
+            user_id=str(user.id),
+            last_event_id=websocket.query_params.get("last_event_id"),
+        ):
+            return
         while True:
-            # receive text from client and publish to Redis so other instances
-            # receive it and forward to their connected clients
-            data = await websocket.receive_text()
-            await manager.publish(room, data)
+            # receive a text or binary frame from the client, deliver it to
+            # local room members and publish to Redis so other instances
+            # forward it to their clients
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes")
+            if data is not None:
+                await manager.publish(room, data)
     except WebSocketDisconnect:
+        pass
+    finally:
         await manager.disconnect(websocket, room)
+
+
+@router.get("/ws/{room}/presence", response_model=RoomPresence)
+async def read_room_presence(
+    request: Request, room: str, current_user: CurrentUser
+) -> Any:
+    """
+    Number of clients connected to a room across all instances.
+    """
+    user = WebSocketUser(id=current_user.id, is_superuser=current_user.is_superuser)
+    if not can_access_room(user, room):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    manager = getattr(request.app.state, "ws_manager", None)
+    if manager is None:
+        raise HTTPException(status_code=503, detail="WebSockets are unavailable")
+    return RoomPresence(room=room, count=await manager.room_occupancy(room))
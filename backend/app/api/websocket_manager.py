@@ -1,102 +1,559 @@
 import asyncio
+import json
 import logging
-from typing import Dict, Set
+import uuid
+from collections.abc import Iterable
+from typing import Any
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+
+from app.api.presence import PresenceTracker
+from app.api.pubsub_shards import HashRing, PubSubShard, shard_metrics
+from app.core.metrics import Metric, registry
+
+try:
+    import msgpack  # type: ignore[import-untyped]
+except ImportError:  # optional dependency, enables `batch.msgpack.v1`
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+# A WebSocket message: `str` travels as a text frame, `bytes` as a binary frame.
+WSMessage = str | bytes
+
+# Subprotocols clients request to receive coalesced frames instead of one
+# frame per message: a JSON array of the text messages in a text frame, or
+# a msgpack array of all messages (text and binary) in a binary frame.
+BATCH_SUBPROTOCOL = "batch.v1"
+BATCH_MSGPACK_SUBPROTOCOL = "batch.msgpack.v1"
+# Flush a room's pending batch early once it grows this large.
+BATCH_MAX_MESSAGES = 500
+# Messages buffered per in-process listener (see `subscribe`) before it is
+# considered too slow and cut off.
+LISTENER_QUEUE_SIZE = 1000
+# Published payloads are `<sep><instance id><sep><kind><message>` so the
+# publishing instance can skip its own messages when they come back from
+# Redis (it already delivered them locally) without decoding them, and
+# receivers know whether to forward a text or a binary frame.
+ORIGIN_SEP = b"\x1f"
+KIND_TEXT = b"t"
+KIND_BINARY = b"b"
+
+
+def _stream_id(event_id: str | bytes) -> tuple[int, int]:
+    """Parse a Redis stream id (`<ms>-<seq>`) into a comparable tuple."""
+    if isinstance(event_id, (bytes, bytearray)):
+        event_id = event_id.decode()
+    ms, _, seq = str(event_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _as_str(value: str | bytes | None) -> str | None:
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
 
 class WebSocketManager:
     """Manage WebSocket connections and Redis pub/sub bridging.
 
     - Keeps in-memory mapping of rooms -> WebSocket connections for local broadcasts.
-    - Subscribes to Redis channels `ws:{room}` and broadcasts published messages
-      to local connections so multiple app instances stay in sync.
+    - Subscribes to the Redis channel `ws:{room}` of every room with local
+      members and broadcasts published messages to them so multiple app
+      instances stay in sync. Rooms are spread over `pubsub_shards` pub/sub
+      connections, each with its own reader task, by consistent hashing of
+      the room name.
+    - Text and binary frames are relayed as-is; the Redis client should be
+      a bytes (non-decoding) client so binary payloads survive the trip.
+    - When `batch_window_ms` is set, clients that negotiate the
+      `batch.v1` subprotocol receive text messages arriving within the
+      window coalesced into a single frame holding a JSON array of messages
+      (binary messages are sent to them unbatched). With msgpack installed,
+      `batch.msgpack.v1` clients get every message batched as a msgpack
+      array in a binary frame.
+    - Rooms matching one of `durable_prefixes` also append text messages to
+      a Redis stream `ws:stream:{room}` (trimmed to ~`stream_maxlen`
+      entries). These are delivered as `{"id": <event id>, "data": <message>}`
+      so reconnecting clients can pass the last id they saw and receive only
+      the messages they missed. Binary messages are not kept.
+    - `publish` delivers to local room members right away and tags the
+      Redis message with this instance's id; the reader loop drops messages
+      carrying its own tag.
+    - With `presence_ttl` set, room occupancy across all instances is
+      tracked in Redis (see `PresenceTracker`) and readable in O(1) via
+      `room_occupancy`.
+    - In-process consumers that are not sockets (e.g. Server-Sent Events
+      streams) can `subscribe` to a room and read its messages from a queue.
+    - `max_connections` / `max_connections_per_user` cap the sockets this
+      instance holds; sockets over a cap are accepted and closed right away
+      with close code 1013 (try again later).
     """
 
-    def __init__(self, redis_client):
+    def __init__(
+        self,
+        redis_client,
+        batch_window_ms: int = 0,
+        durable_prefixes: Iterable[str] = (),
+        stream_maxlen: int = 1000,
+        presence_ttl: int = 0,
+        max_connections: int = 0,
+        max_connections_per_user: int = 0,
+        pubsub_shards: int = 1,
+    ):
         self.redis = redis_client
-        self.connections: Dict[str, Set[WebSocket]] = {}
-        self._pubsub = None
-        self._listen_task: asyncio.Task | None = None
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.connection_count = 0
+        self._user_counts: dict[str, int] = {}
+        self._socket_users: dict[WebSocket, str] = {}
+        self.instance_id = uuid.uuid4().hex
+        self._origin_tag = ORIGIN_SEP + self.instance_id.encode() + ORIGIN_SEP
+        self.connections: dict[str, set[WebSocket]] = {}
+        self._listeners: dict[str, set[asyncio.Queue[WSMessage | None]]] = {}
+        self._ring = HashRing(max(pubsub_shards, 1))
+        self.pubsub_shards = max(pubsub_shards, 1)
+        self._shards: list[PubSubShard] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # subscription updates started from synchronous code
+        self._sync_tasks: set[asyncio.Task[None]] = set()
+        self.batch_window = max(batch_window_ms, 0) / 1000
+        # room -> sockets of `connections[room]` that opted into batching,
+        # mapped to their batch subprotocol
+        self._batched: dict[str, dict[WebSocket, str]] = {}
+        self._batch_buffers: dict[str, list[WSMessage]] = {}
+        self._batch_tasks: dict[str, asyncio.Task[None]] = {}
+        self.durable_prefixes = tuple(durable_prefixes)
+        self.stream_maxlen = stream_maxlen
+        # sockets currently replaying missed messages -> live messages held back
+        self._replaying: dict[WebSocket, list[WSMessage]] = {}
+        self.presence: PresenceTracker | None = None
+        if presence_ttl > 0:
+            self.presence = PresenceTracker(
+                redis_client, self.instance_id, self.local_counts, ttl=presence_ttl
+            )
 
     async def start(self) -> None:
+        if self.presence:
+            await self.presence.start()
+        self._loop = asyncio.get_running_loop()
         try:
-            self._pubsub = self.redis.pubsub()
-            # Subscribe to all ws channels using pattern subscription
-            await self._pubsub.psubscribe("ws:*")
-            self._listen_task = asyncio.create_task(self._reader_loop())
-            logger.info("WebSocketManager redis listener started")
+            self._shards = [
+                PubSubShard(i, self.redis, self._room_active, self._on_pubsub_message)
+                for i in range(self.pubsub_shards)
+            ]
+            for room in set(self.connections) | set(self._listeners):
+                await self._sync_room(room)
+            for shard in self._shards:
+                shard.start()
+            registry.register(self.collect_metrics)
+            logger.info(
+                f"WebSocketManager redis listener started ({self.pubsub_shards} shards)"
+            )
         except Exception as e:
             logger.warning(f"WebSocketManager start failed: {e}")
 
-    async def _reader_loop(self) -> None:
+    async def _on_pubsub_message(self, message: dict[str, Any]) -> None:
+        if message.get("type") not in ("pmessage", "message"):
+            return
+        # redis.asyncio returns bytes for channel/data in some setups
+        channel = message.get("channel") or message.get("pattern")
+        raw = message.get("data")
+        if isinstance(raw, str):
+            # decoding client: only text messages can come through
+            raw = raw.encode()
+        if not isinstance(raw, (bytes, bytearray)):
+            return
+        data: WSMessage
+        if raw.startswith(ORIGIN_SEP):
+            if raw.startswith(self._origin_tag):
+                # published by this instance, already delivered locally
+                return
+            offset = len(self._origin_tag)
+            kind = raw[offset : offset + 1]
+            payload = bytes(raw[offset + 1 :])
+            data = payload if kind == KIND_BINARY else payload.decode()
+        else:
+            # untagged publisher (e.g. redis-cli): treat as text
+            data = raw.decode()
+        if isinstance(channel, (bytes, bytearray)):
+            channel = channel.decode()
+        # channel format: ws:<room>
         try:
-            async for message in self._pubsub.listen():
-                if not message:
-                    continue
-                mtype = message.get("type")
-                # handle pmessage (pattern) and message
-                if mtype not in ("pmessage", "message"):
-                    continue
-                # redis.asyncio returns bytes for channel/data in some setups
-                channel = message.get("channel") or message.get("pattern")
-                data = message.get("data")
-                if isinstance(channel, (bytes, bytearray)):
-                    channel = channel.decode()
-                if isinstance(data, (bytes, bytearray)):
-                    data = data.decode()
-                # channel format: ws:<room>
-                try:
-                    room = str(channel).split("ws:", 1)[1]
-                except Exception:
-                    continue
-                await self._broadcast_to_local(room, data)
-        except asyncio.CancelledError:
-            logger.info("WebSocketManager listener task cancelled")
-        except Exception as e:
-            logger.exception(f"WebSocketManager listener error: {e}")
+            room = str(channel).split("ws:", 1)[1]
+        except Exception:
+            return
+        await self._broadcast_to_local(room, data)
+
+    def _room_active(self, room: str) -> bool:
+        return room in self.connections or room in self._listeners
 
-    async def publish(self, room: str, message: str) -> None:
+    async def _sync_room(self, room: str) -> None:
+        """Subscribe to or unsubscribe from `room` to match local membership."""
+        if self._shards:
+            await self._shards[self._ring.shard_for(room)].sync(room)
+
+    def _schedule_sync(self, room: str) -> None:
+        if not self._shards or self._loop is None:
+            return
         try:
-            await self.redis.publish(f"ws:{room}", message)
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # called from outside the event loop thread (e.g. a sync test client)
+            asyncio.run_coroutine_threadsafe(self._sync_room(room), self._loop)
+            return
+        task = asyncio.create_task(self._sync_room(room))
+        self._sync_tasks.add(task)
+        task.add_done_callback(self._sync_tasks.discard)
+
+    def collect_metrics(self) -> list[Metric]:
+        return shard_metrics(self._shards) + [
+            Metric(
+                "ws_connections", "gauge", "WebSocket connections on this instance"
+            ).add(self.connection_count),
+            Metric("ws_rooms", "gauge", "Rooms with local members or listeners").add(
+                len(set(self.connections) | set(self._listeners))
+            ),
+        ]
+
+    def is_durable(self, room: str) -> bool:
+        return bool(self.durable_prefixes) and room.startswith(self.durable_prefixes)
+
+    async def publish(self, room: str, message: WSMessage) -> None:
+        if isinstance(message, str) and self.is_durable(room):
+            try:
+                event_id = await self.redis.xadd(
+                    f"ws:stream:{room}",
+                    {"data": message},
+                    maxlen=self.stream_maxlen,
+                    approximate=True,
+                )
+            except Exception as e:
+                logger.warning(f"Failed to publish websocket message: {e}")
+                return
+            message = json.dumps({"id": _as_str(event_id), "data": message})
+        await self._broadcast_to_local(room, message)
+        if isinstance(message, str):
+            payload = self._origin_tag + KIND_TEXT + message.encode()
+        else:
+            payload = self._origin_tag + KIND_BINARY + message
+        try:
+            await self.redis.publish(f"ws:{room}", payload)
         except Exception as e:
             logger.warning(f"Failed to publish websocket message: {e}")
 
-    async def connect(self, websocket: WebSocket, room: str) -> None:
-        await websocket.accept()
-        self.connections.setdefault(room, set()).add(websocket)
+    def _replay_start(
+        self, room: str, last_event_id: str | None
+    ) -> tuple[int, int] | None:
+        if not last_event_id or not self.is_durable(room):
+            return None
+        try:
+            return _stream_id(last_event_id)
+        except ValueError:
+            return None
+
+    async def replay(self, websocket: WebSocket, room: str, last_event_id: str) -> None:
+        """Send `websocket` the stream entries of a durable room after `last_event_id`.
+
+        Live messages for the socket are held back while the replay runs and
+        sent afterwards, skipping any the replay already covered. If the
+        stream was trimmed past `last_event_id`, a `{"gap": true}` frame is
+        sent first so the client knows it must reload full state.
+
+        Messages delivered to the socket before this is called are not held
+        back; pass `last_event_id` to `connect` to replay a joining socket.
+        """
+        since = self._replay_start(room, last_event_id)
+        if since is None:
+            return
+        self._replaying.setdefault(websocket, [])
+        await self._replay(websocket, room, since)
+
+    async def _replay(
+        self, websocket: WebSocket, room: str, since: tuple[int, int]
+    ) -> None:
+        # live messages are being held back in `_replaying[websocket]`
+        key = f"ws:stream:{room}"
+        last_sent = since
+        try:
+            oldest = await self.redis.xrange(key, count=1)
+            if oldest and since != (0, 0) and _stream_id(oldest[0][0]) > since:
+                # entries right after `since` have been trimmed away
+                await self.send_personal(websocket, json.dumps({"gap": True}))
+            # the stream is trimmed approximately and keeps growing while
+            # this runs, so read in batches until it is exhausted
+            while True:
+                result = await self.redis.xread(
+                    {key: f"{last_sent[0]}-{last_sent[1]}"}, count=self.stream_maxlen
+                )
+                entries = [entry for _stream, batch in result or [] for entry in batch]
+                if not entries:
+                    break
+                for event_id, fields in entries:
+                    data = fields.get(b"data", fields.get("data"))
+                    frame = json.dumps({"id": _as_str(event_id), "data": _as_str(data)})
+                    await self.send_personal(websocket, frame)
+                    last_sent = _stream_id(event_id)
+        except Exception as e:
+            logger.warning(f"Failed to replay websocket room {room}: {e}")
+        # messages keep being held while the held ones are sent, so live
+        # delivery only resumes once the socket has caught up
+        held = self._replaying.get(websocket, [])
+        try:
+            while held:
+                message = held.pop(0)
+                if isinstance(message, str):
+                    try:
+                        event_id = _stream_id(json.loads(message)["id"])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    else:
+                        if event_id <= last_sent:
+                            continue
+                        last_sent = event_id
+                try:
+                    await self.send_personal(websocket, message)
+                except Exception:
+                    pass
+        finally:
+            self._replaying.pop(websocket, None)
+
+    def _negotiate_subprotocol(self, websocket: WebSocket) -> str | None:
+        if not self.batch_window:
+            return None
+        requested = websocket.scope.get("subprotocols") or []
+        # honour the client's order of preference
+        for subprotocol in requested:
+            if subprotocol == BATCH_SUBPROTOCOL:
+                return BATCH_SUBPROTOCOL
+            if subprotocol == BATCH_MSGPACK_SUBPROTOCOL and msgpack is not None:
+                return BATCH_MSGPACK_SUBPROTOCOL
+        return None
+
+    def _reserve(self, websocket: WebSocket, user_id: str | None) -> bool:
+        if self.max_connections and self.connection_count >= self.max_connections:
+            return False
+        if user_id is not None:
+            count = self._user_counts.get(user_id, 0)
+            if self.max_connections_per_user and count >= self.max_connections_per_user:
+                return False
+            self._user_counts[user_id] = count + 1
+            self._socket_users[websocket] = user_id
+        self.connection_count += 1
+        return True
+
+    def _release(self, websocket: WebSocket) -> None:
+        self.connection_count -= 1
+        user_id = self._socket_users.pop(websocket, None)
+        if user_id is None:
+            return
+        count = self._user_counts.get(user_id, 1) - 1
+        if count > 0:
+            self._user_counts[user_id] = count
+        else:
+            self._user_counts.pop(user_id, None)
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        room: str,
+        user_id: str | None = None,
+        last_event_id: str | None = None,
+    ) -> bool:
+        """Accept `websocket` into `room`; returns False if a cap refused it.
+
+        With `last_event_id`, a reconnecting client of a durable room is sent
+        what it missed (see `replay`); live messages are held back from the
+        moment the socket joins the room, so none is sent twice or out of order.
+        """
+        if not self._reserve(websocket, user_id):
+            # accept first so the client sees the close code, not an HTTP 403
+            await websocket.accept()
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        subprotocol = self._negotiate_subprotocol(websocket)
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+        except BaseException:
+            self._release(websocket)
+            raise
+        since = self._replay_start(room, last_event_id)
+        if since is not None:
+            self._replaying[websocket] = []
+        conns = self.connections.setdefault(room, set())
+        conns.add(websocket)
+        if len(conns) == 1:
+            await self._sync_room(room)
+        if subprotocol:
+            self._batched.setdefault(room, {})[websocket] = subprotocol
+        if self.presence:
+            await self.presence.adjust(room, 1)
+        if since is not None:
+            await self._replay(websocket, room, since)
+        return True
 
     async def disconnect(self, websocket: WebSocket, room: str) -> None:
+        self._replaying.pop(websocket, None)
+        batched = self._batched.get(room)
+        if batched:
+            batched.pop(websocket, None)
+            if not batched:
+                self._batched.pop(room, None)
+                self._drop_batch(room)
         conns = self.connections.get(room)
-        if not conns:
+        if not conns or websocket not in conns:
             return
         conns.discard(websocket)
+        self._release(websocket)
         if not conns:
             self.connections.pop(room, None)
+            await self._sync_room(room)
+        if self.presence:
+            await self.presence.adjust(room, -1)
 
-    async def send_personal(self, websocket: WebSocket, message: str) -> None:
-        await websocket.send_text(message)
+    def local_counts(self) -> dict[str, int]:
+        return {room: len(conns) for room, conns in self.connections.items()}
 
-    async def _broadcast_to_local(self, room: str, message: str) -> None:
-        conns = list(self.connections.get(room, []))
-        for ws in conns:
+    async def room_occupancy(self, room: str) -> int:
+        """Number of sockets in `room` across all instances."""
+        if self.presence:
             try:
-                await ws.send_text(message)
-            except Exception:
-                # ignore send errors; disconnect will clean up
-                pass
+                return await self.presence.occupancy(room)
+            except Exception as e:
+                logger.warning(f"Presence lookup failed for room {room}: {e}")
+        return len(self.connections.get(room, ()))
 
-    async def stop(self) -> None:
-        if self._listen_task:
-            self._listen_task.cancel()
+    def subscribe(self, room: str) -> asyncio.Queue[WSMessage | None]:
+        """Return a queue receiving the messages delivered to `room`.
+
+        A `None` item means the consumer fell `LISTENER_QUEUE_SIZE` messages
+        behind and was unsubscribed; it should start over.
+        """
+        queue: asyncio.Queue[WSMessage | None] = asyncio.Queue(
+            maxsize=LISTENER_QUEUE_SIZE
+        )
+        if room not in self._listeners:
+            self._listeners[room] = set()
+            self._schedule_sync(room)
+        self._listeners[room].add(queue)
+        return queue
+
+    def unsubscribe(self, room: str, queue: asyncio.Queue[WSMessage | None]) -> None:
+        listeners = self._listeners.get(room)
+        if not listeners:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            self._listeners.pop(room, None)
+            self._schedule_sync(room)
+
+    def _notify_listeners(self, room: str, message: WSMessage) -> None:
+        for queue in list(self._listeners.get(room, ())):
             try:
-                await self._listen_task
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.unsubscribe(room, queue)
+                # make room for the overflow marker
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def broadcast_local(self, room: str, message: WSMessage) -> None:
+        """Deliver `message` to this instance's members of `room` only.
+
+        For messages every instance produces by itself (e.g. from database
+        change notifications), where publishing through Redis would deliver
+        them once per instance.
+        """
+        await self._broadcast_to_local(room, message)
+
+    async def send_personal(self, websocket: WebSocket, message: WSMessage) -> None:
+        if isinstance(message, (bytes, bytearray)):
+            await websocket.send_bytes(message)
+        else:
+            await websocket.send_text(message)
+
+    async def _broadcast_to_local(self, room: str, message: WSMessage) -> None:
+        if self._listeners:
+            self._notify_listeners(room, message)
+        conns = self.connections.get(room)
+        if not conns:
+            return
+        binary = isinstance(message, (bytes, bytearray))
+        batched = self._batched.get(room)
+        if batched:
+            self._enqueue_batch(room, message)
+        replaying = self._replaying
+        for ws in list(conns):
+            if batched and ws in batched:
+                # JSON batches only carry text; binary goes out right away
+                if not binary or batched[ws] == BATCH_MSGPACK_SUBPROTOCOL:
+                    continue
+            if replaying and ws in replaying:
+                replaying[ws].append(message)
+                continue
+            try:
+                if isinstance(message, str):
+                    await ws.send_text(message)
+                else:
+                    await ws.send_bytes(message)
             except Exception:
+                # ignore send errors; disconnect will clean up
                 pass
-        if self._pubsub:
+
+    def _enqueue_batch(self, room: str, message: WSMessage) -> None:
+        buffer = self._batch_buffers.setdefault(room, [])
+        buffer.append(message)
+        if len(buffer) >= BATCH_MAX_MESSAGES:
+            # flush on the next loop iteration instead of waiting for the timer
+            self._drop_batch(room, keep_buffer=True)
+            self._batch_tasks[room] = asyncio.create_task(self._flush_batch(room, 0))
+        elif room not in self._batch_tasks:
+            self._batch_tasks[room] = asyncio.create_task(
+                self._flush_batch(room, self.batch_window)
+            )
+
+    def _drop_batch(self, room: str, keep_buffer: bool = False) -> None:
+        task = self._batch_tasks.pop(room, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        if not keep_buffer:
+            self._batch_buffers.pop(room, None)
+
+    async def _flush_batch(self, room: str, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        if self._batch_tasks.get(room) is asyncio.current_task():
+            self._batch_tasks.pop(room, None)
+        messages = self._batch_buffers.pop(room, None)
+        if not messages:
+            return
+        texts = [m for m in messages if isinstance(m, str)]
+        frames: dict[str, WSMessage] = {}
+        for ws, subprotocol in list(self._batched.get(room, {}).items()):
+            pending = messages if subprotocol == BATCH_MSGPACK_SUBPROTOCOL else texts
+            if not pending:
+                continue
+            if ws in self._replaying:
+                self._replaying[ws].extend(pending)
+                continue
+            frame = frames.get(subprotocol)
+            if frame is None:
+                if subprotocol == BATCH_MSGPACK_SUBPROTOCOL:
+                    frame = msgpack.packb(messages, use_bin_type=True)
+                else:
+                    frame = json.dumps(texts)
+                frames[subprotocol] = frame
             try:
-                await self._pubsub.close()
+                await self.send_personal(ws, frame)
             except Exception:
                 pass
+
+    async def stop(self) -> None:
+        for room in list(self._batch_tasks):
+            self._drop_batch(room)
+        registry.unregister(self.collect_metrics)
+        for task in list(self._sync_tasks):
+            task.cancel()
+        for shard in self._shards:
+            await shard.stop()
+        if self.presence:
+            await self.presence.stop()
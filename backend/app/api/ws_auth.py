@@ -0,0 +1,122 @@
+"""Authentication and room authorization for WebSocket handshakes.
+
+Tokens are the same JWTs used by the HTTP API (`deps.decode_access_token`).
+Verified tokens are cached in-process with the user's id and role, so
+reconnecting clients don't cost a signature check and a database lookup on
+every handshake. A deactivated user keeps access to new sockets for at most
+`WS_AUTH_CACHE_SECONDS`.
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+from app.api.deps import decode_access_token
+from app.api.events import ITEMS_ROOM
+from app.core.config import settings
+from app.core.db import engine
+from app.models import User
+
+# Rooms named `<prefix><user id>` are private to that user (and superusers).
+PRIVATE_ROOM_PREFIXES = ("user:", f"{ITEMS_ROOM}:")
+# Rooms only superusers may join.
+SUPERUSER_ROOMS = frozenset({ITEMS_ROOM})
+
+
+@dataclass(frozen=True)
+class WebSocketUser:
+    id: uuid.UUID
+    is_superuser: bool = False
+
+
+class TokenCache:
+    """Bounded token -> WebSocketUser cache with per-entry expiry."""
+
+    def __init__(self, ttl: int, maxsize: int = 10_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, WebSocketUser]] = OrderedDict()
+
+    def get(self, token: str) -> WebSocketUser | None:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            self._entries.pop(token, None)
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def set(
+        self, token: str, user: WebSocketUser, token_exp: float | None = None
+    ) -> None:
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._entries[token] = (expires_at, user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = TokenCache(ttl=settings.WS_AUTH_CACHE_SECONDS)
+
+
+def _load_user(user_id: str) -> User | None:
+    with Session(engine) as session:
+        return session.get(User, uuid.UUID(user_id))
+
+
+def _get_token(websocket: WebSocket) -> str | None:
+    token = websocket.query_params.get("token")
+    if token:
+        return token
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return None
+
+
+async def authenticate_websocket(websocket: WebSocket) -> WebSocketUser | None:
+    """Return the user for the handshake's token (`?token=` or bearer header)."""
+    token = _get_token(websocket)
+    if not token:
+        return None
+    cached = token_cache.get(token)
+    if cached:
+        return cached
+    try:
+        token_data = decode_access_token(token)
+    except HTTPException:
+        return None
+    if not token_data.sub:
+        return None
+    try:
+        user = await run_in_threadpool(_load_user, token_data.sub)
+    except ValueError:
+        return None
+    if not user or not user.is_active:
+        return None
+    ws_user = WebSocketUser(id=user.id, is_superuser=user.is_superuser)
+    token_cache.set(token, ws_user, token_data.exp)
+    return ws_user
+
+
+def can_access_room(user: WebSocketUser, room: str) -> bool:
+    if user.is_superuser:
+        return True
+    if room in SUPERUSER_ROOMS:
+        return False
+    for prefix in PRIVATE_ROOM_PREFIXES:
+        if room.startswith(prefix):
+            return room[len(prefix) :] == str(user.id)
+    return True
@@ -1,13 +1,43 @@
 from __future__ import annotations
 
 from celery import Celery
+from kombu import Queue
 
 from .config import settings
 
+try:
+    import msgpack
+except ImportError:  # optional dependency, enables CELERY_SERIALIZER=msgpack
+    msgpack = None
+
 
 broker_url = settings.CELERY_BROKER_URL or settings.REDIS_URL
 result_backend = settings.CELERY_RESULT_BACKEND or settings.REDIS_URL
 
+# Latency-sensitive emails, bulk emails (batches, broadcast chunks) and slow
+# jobs (image rendering, broadcast fan-out) have their own queues, so workers
+# consuming `email` are never stuck behind a broadcast or a backlog of heavy
+# tasks. Everything else goes to `default`. Tasks are routed by exact name:
+# a new task lands in `default` until it is given a queue here.
+DEFAULT_QUEUE = "default"
+EMAIL_QUEUE = "email"
+BULK_QUEUE = "bulk"
+HEAVY_QUEUE = "heavy"
+QUEUES = (DEFAULT_QUEUE, EMAIL_QUEUE, BULK_QUEUE, HEAVY_QUEUE)
+
+TASK_ROUTES = {
+    "app.workers.tasks.send_test_email": {"queue": EMAIL_QUEUE},
+    "app.workers.tasks.send_reset_password_email": {"queue": EMAIL_QUEUE},
+    "app.workers.tasks.send_welcome_email": {"queue": EMAIL_QUEUE},
+    "app.workers.tasks.send_email_batch": {"queue": BULK_QUEUE},
+    "app.workers.tasks.send_broadcast_chunk": {"queue": BULK_QUEUE},
+    "app.workers.tasks.generate_derivatives": {"queue": HEAVY_QUEUE},
+    "app.workers.tasks.fan_out_broadcast": {"queue": HEAVY_QUEUE},
+}
+
+if settings.CELERY_SERIALIZER == "msgpack" and msgpack is None:
+    raise RuntimeError('CELERY_SERIALIZER=msgpack requires msgpack (".[msgpack]")')
+
 
 celery_app = Celery(
     settings.PROJECT_NAME if getattr(settings, "PROJECT_NAME", None) else "app",
@@ -18,11 +48,27 @@ celery_app = Celery(
 
 celery_app.conf.update(
     result_expires=3600,
-    task_serializer="json",
-    result_serializer="json",
-    accept_content=["json"],
+    task_serializer=settings.CELERY_SERIALIZER,
+    result_serializer=settings.CELERY_SERIALIZER,
+    # both, so workers keep consuming messages queued before a switch
+    accept_content=["json", "msgpack"] if msgpack is not None else ["json"],
+    task_compression=settings.CELERY_COMPRESSION,
+    result_compression=settings.CELERY_COMPRESSION,
     timezone="UTC",
     enable_utc=True,
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes=TASK_ROUTES,
+    # Tasks are fire-and-forget; the few whose result is read opt back in.
+    task_ignore_result=True,
+    # Acknowledge after running, so tasks of a crashed worker are delivered
+    # again, and reserve one task per process at a time, so a slow task
+    # doesn't hold others that an idle process could run.
+    task_acks_late=True,
+    worker_prefetch_multiplier=settings.CELERY_PREFETCH_MULTIPLIER,
+    # Unacknowledged tasks are redelivered after this long, so it must
+    # exceed the longest task runtime plus retry countdown.
+    broker_transport_options={"visibility_timeout": 3600},
 )
 
 celery_app.autodiscover_tasks(["app.workers"])
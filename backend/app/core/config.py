@@ -62,6 +62,37 @@ class Settings(BaseSettings):
     # via `CELERY_BROKER_URL` / `CELERY_RESULT_BACKEND` env vars.
     CELERY_BROKER_URL: str | None = None
     CELERY_RESULT_BACKEND: str | None = None
+    # Task message encoding ("msgpack" needs the msgpack extra), compression
+    # ("gzip", "zlib", "bzip2" or unset) and tasks reserved per worker
+    # process (see app/core/celery_app.py).
+    CELERY_SERIALIZER: Literal["json", "msgpack"] = "json"
+    CELERY_COMPRESSION: str | None = "gzip"
+    CELERY_PREFETCH_MULTIPLIER: int = 1
+    # Task metrics are flushed from workers to Redis this often; queue
+    # lengths are sampled by the API this often (0 disables sampling).
+    CELERY_METRICS_FLUSH_SECONDS: float = 10
+    CELERY_QUEUE_SAMPLE_SECONDS: float = 15
+
+    # WebSocket fan-out. When > 0, clients negotiating the `batch.v1`
+    # subprotocol get messages coalesced over this many milliseconds.
+    WS_BATCH_WINDOW_MS: int = 0
+    # Rooms starting with one of these prefixes are durable: messages are
+    # kept in a Redis stream so reconnecting clients can replay what they missed.
+    WS_DURABLE_ROOM_PREFIXES: Annotated[
+        list[str] | str, BeforeValidator(parse_cors)
+    ] = []
+    WS_STREAM_MAXLEN: int = 1000
+    # Seconds without a heartbeat after which an instance's sockets stop
+    # counting towards room presence. 0 disables cluster-wide presence.
+    WS_PRESENCE_TTL_SECONDS: int = 30
+    # Connection caps per instance (0 = unlimited) and how long a verified
+    # handshake token is trusted before the user is looked up again.
+    WS_MAX_CONNECTIONS: int = 10000
+    WS_MAX_CONNECTIONS_PER_USER: int = 10
+    WS_AUTH_CACHE_SECONDS: int = 60
+    # Redis pub/sub connections (each with its own reader task) that rooms
+    # are spread over; raise when one reader cannot keep up.
+    WS_PUBSUB_SHARDS: int = 1
 
     # Cloudflare R2 (S3 compatible) settings
     R2_ENABLED: bool = False
@@ -70,6 +101,30 @@ class Settings(BaseSettings):
     R2_SECRET_ACCESS_KEY: str | None = None
     R2_BUCKET: str | None = None
     R2_ENDPOINT_URL: AnyUrl | None = None
+    # Connection pool of the shared R2 client (see app.core.r2.R2Client):
+    # size, seconds idle connections are kept open, timeouts and attempts
+    # per request (including the first).
+    R2_MAX_POOL_CONNECTIONS: int = 50
+    R2_KEEPALIVE_SECONDS: int = 60
+    R2_CONNECT_TIMEOUT_SECONDS: int = 5
+    R2_READ_TIMEOUT_SECONDS: int = 60
+    R2_MAX_ATTEMPTS: int = 3
+    # Streaming uploads: part size in bytes (R2 requires at least 5 MiB for
+    # all but the last part) and parts uploaded at once; peak memory is
+    # about part size * (concurrency + 1).
+    R2_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    R2_MULTIPART_CONCURRENCY: int = 4
+    # Local disk cache (see app.core.r2_cache) for the attachment files and
+    # thumbnails served through the API; unset disables it. Entries are
+    # revalidated with R2 (If-None-Match) once older than
+    # R2_CACHE_REVALIDATE_SECONDS.
+    R2_CACHE_DIR: str | None = None
+    R2_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    R2_CACHE_REVALIDATE_SECONDS: int = 60
+    # Item attachments are uploaded by clients straight to R2 with presigned
+    # URLs valid this long; larger files are rejected when confirmed.
+    R2_ATTACHMENT_URL_EXPIRE_SECONDS: int = 3600
+    R2_ATTACHMENT_MAX_BYTES: int = 100 * 1024 * 1024
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -83,6 +138,19 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def POSTGRES_DSN(self) -> str:
+        """libpq connection string for direct psycopg connections."""
+        return str(self.SQLALCHEMY_DATABASE_URI).replace(
+            "postgresql+psycopg://", "postgresql://", 1
+        )
+
+    # Deliver item/user changes captured with Postgres LISTEN/NOTIFY to
+    # WebSocket rooms (requires the change notify triggers migration).
+    # When enabled, API routes no longer publish item events themselves.
+    CHANGE_CAPTURE_ENABLED: bool = False
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -91,6 +159,10 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str | None = None
     EMAILS_FROM_EMAIL: EmailStr | None = None
     EMAILS_FROM_NAME: str | None = None
+    # Open SMTP connections kept per worker process (see app/core/smtp.py).
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_IDLE_SECONDS: float = 30
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
 
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
@@ -99,6 +171,11 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Directory where compiled email templates are cached across restarts.
+    EMAIL_TEMPLATES_BYTECODE_CACHE_DIR: str | None = None
+    # Broadcasts queue one task per chunk of users, published in groups.
+    BROADCAST_CHUNK_SIZE: int = 500
+    BROADCAST_GROUP_SIZE: int = 20
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -132,6 +209,8 @@ class Settings(BaseSettings):
         cfg: dict[str, Any] = {
             "aws_access_key_id": self.R2_ACCESS_KEY_ID,
             "aws_secret_access_key": self.R2_SECRET_ACCESS_KEY,
+            # R2 ignores the region but SigV4 needs one
+            "region_name": "auto",
         }
         endpoint = self.r2_endpoint
         if endpoint:
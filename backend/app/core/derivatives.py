@@ -0,0 +1,125 @@
+"""Thumbnails and other resized versions of image attachments.
+
+Derivatives are generated by the `generate_derivatives` Celery task after
+an image is uploaded, never in a request. They are cached by the SHA-256
+of the source image, as `derivatives/<ab>/<digest>/<name>.webp`, so the
+same image uploaded again (by anyone) reuses them without re-rendering.
+Because they are shared, derivatives are not deleted with the attachment;
+an R2 lifecycle rule can expire old ones.
+
+Rendering needs Pillow (`pip install ".[images]"`); without it no
+derivatives are generated and attachments are listed without them.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import IO
+
+from .r2 import StreamingHasher, head_object, iter_object, upload_bytes
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency, enables derivative generation
+    Image = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_PREFIX = "derivatives/"
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+# Sources up to this size are buffered in memory, larger ones on disk.
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+# Formats Pillow decodes that browsers commonly upload; SVG is not raster.
+SOURCE_CONTENT_TYPES = frozenset(
+    {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+)
+
+
+class DerivativeError(Exception):
+    """The source cannot be rendered (not an image, corrupt, too large)."""
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    name: str
+    # bounding box; the aspect ratio is kept and images are never upscaled
+    width: int
+    height: int
+    quality: int = 80
+
+
+DERIVATIVES = (
+    DerivativeSpec("thumbnail", 256, 256),
+    DerivativeSpec("preview", 1280, 1280),
+)
+
+
+def has_derivatives(content_type: str | None) -> bool:
+    return Image is not None and content_type in SOURCE_CONTENT_TYPES
+
+
+def derivative_key(sha256: str, name: str) -> str:
+    return f"{DERIVATIVE_PREFIX}{sha256[:2]}/{sha256}/{name}.webp"
+
+
+def render(source: IO[bytes], specs: tuple[DerivativeSpec, ...]) -> dict[str, bytes]:
+    """Encode `source` once per spec, as WebP."""
+    if Image is None:
+        raise RuntimeError("Pillow is required to render derivatives")
+    try:
+        with Image.open(source) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise DerivativeError(str(e)) from e
+    outputs = {}
+    for spec in specs:
+        resized = image.copy()
+        resized.thumbnail((spec.width, spec.height), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        resized.save(out, "WEBP", quality=spec.quality)
+        outputs[spec.name] = out.getvalue()
+    return outputs
+
+
+async def generate_derivatives(
+    key: str, specs: tuple[DerivativeSpec, ...] = DERIVATIVES
+) -> str:
+    """Generate the derivatives of the image at `key`; returns its SHA-256.
+
+    The source is streamed into a spooled temporary file while hashing;
+    derivatives already stored for that hash are not rendered again.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as source:
+        hasher = StreamingHasher(iter_object(key))
+        async for chunk in hasher:
+            source.write(chunk)
+        digest = hasher.hexdigest()
+        missing: tuple[DerivativeSpec, ...] = ()
+        for spec in specs:
+            if await head_object(derivative_key(digest, spec.name)) is None:
+                missing += (spec,)
+        if not missing:
+            logger.info(f"Derivatives of {key} already exist ({digest})")
+            return digest
+        source.seek(0)
+        outputs = render(source, missing)
+    for name, data in outputs.items():
+        await upload_bytes(
+            derivative_key(digest, name), data, content_type=DERIVATIVE_CONTENT_TYPE
+        )
+    return digest
+
+
+__all__ = [
+    "DERIVATIVES",
+    "DerivativeError",
+    "DerivativeSpec",
+    "derivative_key",
+    "generate_derivatives",
+    "has_derivatives",
+    "render",
+]
@@ -0,0 +1,109 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Components keep their own counters and register a collector that turns
+them into `Metric`s when `/utils/metrics/` is scraped, so nothing is
+computed between scrapes. Collectors may be plain or async callables.
+"""
+
+import inspect
+import logging
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+Labels = dict[str, str]
+
+
+@dataclass
+class Metric:
+    name: str
+    # "counter", "gauge" or "histogram"
+    type: str
+    help: str
+    # (labels, value), plus a name suffix for histogram samples
+    samples: list[tuple[Labels, float] | tuple[Labels, float, str]] = field(
+        default_factory=list
+    )
+
+    def add(self, value: float, **labels: str) -> "Metric":
+        self.samples.append((labels, value))
+        return self
+
+    def add_histogram(
+        self,
+        buckets: Iterable[tuple[float, float]],
+        total: float,
+        count: float,
+        **labels: str,
+    ) -> "Metric":
+        """Add one histogram series from cumulative `(upper bound, count)` buckets."""
+        for bound, value in buckets:
+            self.samples.append(({**labels, "le": f"{bound:g}"}, value, "_bucket"))
+        self.samples.append(({**labels, "le": "+Inf"}, count, "_bucket"))
+        self.samples.append((labels, total, "_sum"))
+        self.samples.append((labels, count, "_count"))
+        return self
+
+
+Collector = Callable[[], Iterable[Metric] | Awaitable[Iterable[Metric]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        name = f"{name}{{{pairs}}}"
+    return f"{name} {value:g}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._collectors: list[Collector] = []
+
+    def register(self, collector: Collector) -> None:
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def unregister(self, collector: Collector) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    async def collect(self) -> list[Metric]:
+        metrics: list[Metric] = []
+        for collector in list(self._collectors):
+            try:
+                result = collector()
+                if inspect.isawaitable(result):
+                    result = await result
+                metrics.extend(result)
+            except Exception as e:
+                # one broken collector must not hide the others
+                logger.warning(f"Metrics collector {collector!r} failed: {e}")
+        return metrics
+
+    async def render(self) -> str:
+        # samples of one metric must be contiguous, even across collectors
+        merged: dict[str, Metric] = {}
+        for metric in await self.collect():
+            if metric.name in merged:
+                merged[metric.name].samples.extend(metric.samples)
+            else:
+                merged[metric.name] = Metric(
+                    metric.name, metric.type, metric.help, list(metric.samples)
+                )
+        lines: list[str] = []
+        for metric in merged.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, value, *suffix in metric.samples:
+                lines.append(
+                    _format_sample(metric.name + "".join(suffix), labels, value)
+                )
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+registry = MetricsRegistry()
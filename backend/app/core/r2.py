@@ -3,75 +3,590 @@
 This module provides small wrappers for common operations used by the
 application: upload, download, delete and generating presigned URLs.
 
+All helpers share one long-lived client (`R2Client`) so TLS sessions and
+pooled keep-alive connections are reused across operations. The API opens
+it on startup and closes it on shutdown; other callers get it lazily.
+
 Usage:
   await upload_bytes("path/to/key", b"data")
+  await upload_stream("path/to/key", upload_file)  # large/streamed bodies
   data = await download_bytes("path/to/key")
+  return await object_response("path/to/key", request.headers.get("range"))
 """
+
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import hashlib
+import inspect
+import logging
+import weakref
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from contextlib import AsyncExitStack
+from typing import Any, BinaryIO
 
-import aioboto3
-from botocore.exceptions import ClientError
+import aioboto3  # type: ignore[import-untyped]
+from aiobotocore.config import AioConfig  # type: ignore[import-untyped]
+from botocore.exceptions import ClientError  # type: ignore[import-untyped]
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 
 from .config import settings
+from .r2_presign import presign_url
+
+logger = logging.getLogger(__name__)
+
+# Anything `upload_stream` can read from: an async iterable of byte chunks
+# or a file-like object with a sync or async `read(n)`.
+UploadSource = AsyncIterable[bytes] | BinaryIO | Any
+
+# Bytes read from R2 per chunk when streaming downloads.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Most keys a single DeleteObjects request accepts.
+DELETE_BATCH_SIZE = 1000
+# Largest object a single CopyObject request can copy; bigger ones are
+# copied part by part with UploadPartCopy, COPY_PART_SIZE bytes at a time.
+COPY_MAX_BYTES = 5 * 1024**3
+COPY_PART_SIZE = 512 * 1024**2
+
+
+def _client_config() -> AioConfig:
+    options: dict[str, Any] = {}
+    if "request_checksum_calculation" in AioConfig.OPTION_DEFAULTS:
+        # R2 does not accept every flexible checksum botocore >= 1.36 sends
+        # by default; older releases don't send them (nor know the option)
+        options.update(
+            request_checksum_calculation="when_required",
+            response_checksum_validation="when_required",
+        )
+    return AioConfig(
+        max_pool_connections=settings.R2_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.R2_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.R2_READ_TIMEOUT_SECONDS,
+        retries={"max_attempts": settings.R2_MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+        connector_args={"keepalive_timeout": settings.R2_KEEPALIVE_SECONDS},
+        **options,
+    )
+
+
+class R2Client:
+    """Process-wide S3 client for R2, created on first use.
+
+    The underlying aiohttp connection pool belongs to the event loop it was
+    created on, so each loop gets its own client (e.g. a worker running
+    tasks with `asyncio.run` next to the API's loop).
+    """
+
+    # event loop -> (client, exit stack closing it)
+    _instances: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, tuple[Any, AsyncExitStack]
+    ] = weakref.WeakKeyDictionary()
+    _locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock] = (
+        weakref.WeakKeyDictionary()
+    )
+
+    @classmethod
+    async def get_client(cls) -> Any:
+        if not settings.r2_enabled:
+            raise RuntimeError("R2 is not configured")
+        loop = asyncio.get_running_loop()
+        instance = cls._instances.get(loop)
+        if instance is None:
+            lock = cls._locks.setdefault(loop, asyncio.Lock())
+            async with lock:
+                instance = cls._instances.get(loop)
+                if instance is None:
+                    stack = AsyncExitStack()
+                    session = aioboto3.Session()
+                    client = await stack.enter_async_context(
+                        session.client(
+                            "s3", config=_client_config(), **settings.r2_boto3_config
+                        )
+                    )
+                    instance = cls._instances[loop] = (client, stack)
+                    logger.info("R2 client initialized")
+        return instance[0]
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close the client of the running event loop, if any."""
+        instance = cls._instances.pop(asyncio.get_running_loop(), None)
+        if instance:
+            await instance[1].aclose()
+            logger.info("R2 client closed")
+
+
+async def get_r2_client() -> Any:
+    return await R2Client.get_client()
 
 
 async def upload_bytes(
     key: str,
     data: bytes,
-    bucket: Optional[str] = None,
-    content_type: Optional[str] = None,
+    bucket: str | None = None,
+    content_type: str | None = None,
 ) -> None:
     bucket = bucket or settings.R2_BUCKET
-    if not settings.r2_enabled:
-        raise RuntimeError("R2 is not configured")
+    client = await get_r2_client()
+    params = {"Bucket": bucket, "Key": key, "Body": data}
+    if content_type:
+        params["ContentType"] = content_type
+    await client.put_object(**params)
+
+
+async def _iter_chunks(source: UploadSource, chunk_size: int) -> AsyncIterator[bytes]:
+    if hasattr(source, "read"):
+        read: Any = source.read
+        blocking = not inspect.iscoroutinefunction(read)
+        while True:
+            if blocking:
+                # plain file objects: keep disk reads off the event loop
+                chunk = await asyncio.to_thread(read, chunk_size)
+            else:
+                chunk = await read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in source:
+            if chunk:
+                yield chunk
+
 
-    async with aioboto3.client("s3", **settings.r2_boto3_config) as client:
-        params = {"Bucket": bucket, "Key": key, "Body": data}
-        if content_type:
-            params["ContentType"] = content_type
-        await client.put_object(**params)
+async def _iter_parts(source: UploadSource, part_size: int) -> AsyncIterator[bytes]:
+    """Re-chunk `source` into `part_size` parts (the last one may be shorter)."""
+    buffer = bytearray()
+    async for chunk in _iter_chunks(source, part_size):
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
 
 
-async def download_bytes(key: str, bucket: Optional[str] = None) -> bytes:
+class StreamingHasher:
+    """Async iterable passing `source` through while computing its SHA-256.
+
+    `hexdigest()` and `size` are final once iteration is over.
+    """
+
+    def __init__(self, source: UploadSource, chunk_size: int = 1024 * 1024):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in _iter_chunks(self.source, self.chunk_size):
+            self._hash.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+async def upload_stream(
+    key: str,
+    source: UploadSource,
+    bucket: str | None = None,
+    content_type: str | None = None,
+    part_size: int | None = None,
+    concurrency: int | None = None,
+) -> None:
+    """Upload `source` without holding it in memory.
+
+    `source` is an async iterable of byte chunks or a file-like object with
+    a (sync or async) `read(n)`, e.g. an `UploadFile`. It is split into
+    `part_size` parts uploaded `concurrency` at a time as a multipart
+    upload; reading pauses while that many parts are in flight. Sources
+    smaller than one part are sent with a single `put_object`. On failure
+    the multipart upload is aborted so no orphaned parts are billed.
+    """
     bucket = bucket or settings.R2_BUCKET
-    if not settings.r2_enabled:
-        raise RuntimeError("R2 is not configured")
+    part_size = part_size or settings.R2_MULTIPART_PART_SIZE
+    concurrency = concurrency or settings.R2_MULTIPART_CONCURRENCY
+    client = await get_r2_client()
+    parts = _iter_parts(source, part_size)
+    first = await anext(parts, None)
+    second = await anext(parts, None) if first is not None else None
+    if first is None or second is None:
+        await upload_bytes(key, first or b"", bucket=bucket, content_type=content_type)
+        return
+
+    params = {"Bucket": bucket, "Key": key}
+    if content_type:
+        params["ContentType"] = content_type
+    upload_id = (await client.create_multipart_upload(**params))["UploadId"]
+    slots = asyncio.Semaphore(concurrency)
+    etags: dict[int, str] = {}
 
-    async with aioboto3.client("s3", **settings.r2_boto3_config) as client:
-        resp = await client.get_object(Bucket=bucket, Key=key)
-        async with resp["Body"] as stream:
-            return await stream.read()
+    async def send(number: int, body: bytes) -> None:
+        try:
+            resp = await client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=body,
+            )
+            etags[number] = resp["ETag"]
+        finally:
+            slots.release()
 
+    async def pending_parts() -> AsyncIterator[bytes]:
+        yield first
+        yield second
+        async for part in parts:
+            yield part
 
-async def delete_object(key: str, bucket: Optional[str] = None) -> None:
+    tasks: list[asyncio.Task[None]] = []
+    try:
+        async for part in pending_parts():
+            await slots.acquire()
+            if any(t.done() and t.exception() for t in tasks):
+                # stop reading; gather below raises the failure
+                slots.release()
+                break
+            tasks.append(asyncio.create_task(send(len(tasks) + 1, part)))
+        await asyncio.gather(*tasks)
+        await client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [{"PartNumber": n, "ETag": etags[n]} for n in sorted(etags)]
+            },
+        )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await client.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id
+            )
+        except Exception as e:
+            logger.warning(f"Failed to abort multipart upload of {key}: {e}")
+        raise
+
+
+async def download_bytes(key: str, bucket: str | None = None) -> bytes:
     bucket = bucket or settings.R2_BUCKET
-    if not settings.r2_enabled:
-        raise RuntimeError("R2 is not configured")
+    client = await get_r2_client()
+    resp = await client.get_object(Bucket=bucket, Key=key)
+    async with resp["Body"] as stream:
+        data: bytes = await stream.read()
+    return data
+
+
+def parse_range_header(
+    value: str | None,
+) -> tuple[int | None, int | None] | None:
+    """Parse a single-range `Range` header into `(start, end)` (inclusive).
+
+    `bytes=100-` gives `(100, None)` and the suffix form `bytes=-500` gives
+    `(None, 500)`. Missing, malformed and multi-range headers return None,
+    meaning the whole object should be served.
+    """
+    if not value:
+        return None
+    unit, _, spec = value.strip().partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(first) if first.strip() else None
+        end = int(last) if last.strip() else None
+    except ValueError:
+        return None
+    if start is None and end is None:
+        return None
+    if start is not None and (start < 0 or (end is not None and end < start)):
+        return None
+    return start, end
+
+
+def _range_param(start: int | None, end: int | None) -> str:
+    if start is None:
+        return f"bytes=-{end}"
+    return f"bytes={start}-{'' if end is None else end}"
+
 
-    async with aioboto3.client("s3", **settings.r2_boto3_config) as client:
-        await client.delete_object(Bucket=bucket, Key=key)
+async def _iter_body(body: Any, chunk_size: int) -> AsyncIterator[bytes]:
+    async with body:
+        async for chunk in body.iter_chunks(chunk_size):
+            yield chunk
 
 
-async def generate_presigned_url(key: str, expires_in: int = 3600, bucket: Optional[str] = None) -> str:
+async def iter_object(
+    key: str,
+    bucket: str | None = None,
+    start: int | None = None,
+    end: int | None = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """Yield an object (or the inclusive byte range `start`-`end`) in chunks."""
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    params = {"Bucket": bucket, "Key": key}
+    if start is not None or end is not None:
+        params["Range"] = _range_param(start, end)
+    resp = await client.get_object(**params)
+    async for chunk in _iter_body(resp["Body"], chunk_size):
+        yield chunk
+
+
+async def object_response(
+    key: str,
+    range_header: str | None = None,
+    bucket: str | None = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    """Stream an object to the client, honouring a single-range `Range` header.
+
+    Answers 206 with `Content-Range` for satisfiable ranges, 416 for
+    unsatisfiable ones and 404 for missing objects. Memory use is one chunk
+    regardless of the object size.
+    """
     bucket = bucket or settings.R2_BUCKET
-    if not settings.r2_enabled:
-        raise RuntimeError("R2 is not configured")
-
-    session = aioboto3.Session()
-    async with session.client("s3", **settings.r2_boto3_config) as client:
-        # generate_presigned_url is provided by botocore client
-        return client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=expires_in,
+    byte_range = parse_range_header(range_header)
+    client = await get_r2_client()
+    params = {"Bucket": bucket, "Key": key}
+    if byte_range:
+        params["Range"] = _range_param(*byte_range)
+    try:
+        resp = await client.get_object(**params)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=404, detail="Object not found")
+        if code == "InvalidRange":
+            head = await client.head_object(Bucket=bucket, Key=key)
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{head['ContentLength']}"},
+            )
+        raise
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(resp["ContentLength"]),
+        **(headers or {}),
+    }
+    if resp.get("ETag"):
+        response_headers["ETag"] = resp["ETag"]
+    status_code = 200
+    if byte_range and resp.get("ContentRange"):
+        status_code = 206
+        response_headers["Content-Range"] = resp["ContentRange"]
+    return StreamingResponse(
+        _iter_body(resp["Body"], chunk_size),
+        status_code=status_code,
+        media_type=resp.get("ContentType") or "application/octet-stream",
+        headers=response_headers,
+    )
+
+
+async def head_object(key: str, bucket: str | None = None) -> dict[str, Any] | None:
+    """Metadata (`ContentLength`, `ETag`, `ContentType`, ...) or None if missing."""
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    try:
+        head: dict[str, Any] = await client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return head
+
+
+async def copy_object(
+    source_key: str,
+    key: str,
+    bucket: str | None = None,
+    size: int | None = None,
+    part_size: int = COPY_PART_SIZE,
+) -> None:
+    """Copy an object within `bucket` on the server side, without downloading it.
+
+    Pass `size` when known to save a `head_object`.
+    """
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    source = {"Bucket": bucket, "Key": source_key}
+    if size is None:
+        head = await client.head_object(**source)
+        size = head["ContentLength"]
+    if size <= COPY_MAX_BYTES:
+        await client.copy_object(Bucket=bucket, Key=key, CopySource=source)
+        return
+
+    upload_id = (await client.create_multipart_upload(Bucket=bucket, Key=key))[
+        "UploadId"
+    ]
+    slots = asyncio.Semaphore(settings.R2_MULTIPART_CONCURRENCY)
+
+    async def copy_part(number: int, start: int) -> dict[str, Any]:
+        async with slots:
+            resp = await client.upload_part_copy(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                CopySource=source,
+                CopySourceRange=f"bytes={start}-{min(start + part_size, size) - 1}",
+            )
+        return {"PartNumber": number, "ETag": resp["CopyPartResult"]["ETag"]}
+
+    tasks = [
+        asyncio.create_task(copy_part(number, start))
+        for number, start in enumerate(range(0, size, part_size), 1)
+    ]
+    try:
+        parts = await asyncio.gather(*tasks)
+        await client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
         )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await client.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id
+            )
+        except Exception as e:
+            logger.warning(f"Failed to abort multipart copy to {key}: {e}")
+        raise
+
+
+async def delete_object(key: str, bucket: str | None = None) -> None:
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    await client.delete_object(Bucket=bucket, Key=key)
+
+
+def user_prefix(user_id: Any) -> str:
+    """Key prefix under which all of a user's objects are stored."""
+    return f"users/{user_id}/"
+
+
+async def iter_objects(
+    prefix: str = "", bucket: str | None = None, page_size: int = 1000
+) -> AsyncIterator[dict[str, Any]]:
+    """Yield the `list_objects_v2` entries (`Key`, `Size`, `ETag`, ...) under `prefix`."""
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    paginator = client.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(
+        Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": page_size}
+    ):
+        for obj in page.get("Contents", ()):
+            yield obj
+
+
+async def delete_many(
+    keys: Iterable[str] | AsyncIterable[str],
+    bucket: str | None = None,
+    concurrency: int = 4,
+) -> list[str]:
+    """Delete `keys` with `DeleteObjects`, 1000 keys per request.
+
+    Up to `concurrency` requests run at once; keys are consumed lazily, so
+    an `iter_objects` listing can be piped in. Returns the keys R2 failed
+    to delete.
+    """
+    bucket = bucket or settings.R2_BUCKET
+    client = await get_r2_client()
+    slots = asyncio.Semaphore(concurrency)
+    failed: list[str] = []
+
+    async def send(batch: list[str]) -> None:
+        try:
+            resp = await client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            for error in resp.get("Errors", ()):
+                logger.warning(
+                    f"Failed to delete {error.get('Key')}: {error.get('Code')}"
+                )
+                failed.append(error.get("Key"))
+        finally:
+            slots.release()
+
+    async def key_iter() -> AsyncIterator[str]:
+        if isinstance(keys, AsyncIterable):
+            async for key in keys:
+                yield key
+        else:
+            for key in keys:
+                yield key
+
+    tasks: list[asyncio.Task[None]] = []
+    batch: list[str] = []
+    try:
+        async for key in key_iter():
+            batch.append(key)
+            if len(batch) == DELETE_BATCH_SIZE:
+                await slots.acquire()
+                tasks.append(asyncio.create_task(send(batch)))
+                batch = []
+        if batch:
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(batch)))
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return failed
+
+
+async def delete_prefix(prefix: str, bucket: str | None = None) -> list[str]:
+    """Delete every object under `prefix`; returns the keys that failed."""
+    if not prefix:
+        # never wipe a whole bucket by accident
+        raise ValueError("prefix must not be empty")
+    keys = (obj["Key"] async for obj in iter_objects(prefix, bucket))
+    failed = await delete_many(keys, bucket)
+    logger.info(f"Deleted objects under {prefix} ({len(failed)} failed)")
+    return failed
+
+
+async def generate_presigned_url(
+    key: str, expires_in: int = 3600, bucket: str | None = None, method: str = "GET"
+) -> str:
+    # signed locally (see app.core.r2_presign), no client or request involved
+    return presign_url(method, key, expires_in=expires_in, bucket=bucket)
 
 
 __all__ = [
+    "R2Client",
+    "StreamingHasher",
+    "get_r2_client",
     "upload_bytes",
+    "upload_stream",
     "download_bytes",
+    "iter_object",
+    "object_response",
+    "parse_range_header",
+    "head_object",
+    "copy_object",
     "delete_object",
+    "delete_many",
+    "delete_prefix",
+    "iter_objects",
+    "user_prefix",
     "generate_presigned_url",
 ]
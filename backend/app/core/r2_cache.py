@@ -0,0 +1,419 @@
+"""Size-bounded local disk LRU cache in front of R2 reads.
+
+Enabled by setting `R2_CACHE_DIR`. Each cached object is one file named
+after its bucket/key plus a JSON sidecar with its ETag, size and content
+type, so the cache survives restarts. Hits are served from a memory-mapped
+view of the file without contacting R2; entries older than
+`R2_CACHE_REVALIDATE_SECONDS` are revalidated with a conditional GET
+(`If-None-Match`), which costs a round trip but no body transfer when the
+object is unchanged. Least recently used entries are evicted once the
+cache grows past `R2_CACHE_MAX_BYTES`; larger objects are not cached.
+
+The cache is meant for one event loop (the API process). Routes serving
+R2 objects through the API (attachment files and their thumbnails) read
+them with `cached_response`, which streams straight from R2 when
+`R2_CACHE_DIR` is unset.
+
+Usage:
+  return await cached_response("avatars/1.png", request.headers.get("range"))
+  data = await cached_download("avatars/1.png")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, TypeVar
+
+from botocore.exceptions import ClientError  # type: ignore[import-untyped]
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from .config import settings
+from .metrics import Metric, registry
+from .r2 import (
+    DOWNLOAD_CHUNK_SIZE,
+    download_bytes,
+    get_r2_client,
+    object_response,
+    parse_range_header,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheEntry:
+    bucket: str
+    key: str
+    etag: str
+    size: int
+    content_type: str
+    # when R2 last confirmed the ETag (not persisted)
+    validated_at: float = 0.0
+
+
+def _error_code(e: ClientError) -> tuple[str | None, int | None]:
+    return (
+        e.response.get("Error", {}).get("Code"),
+        e.response.get("ResponseMetadata", {}).get("HTTPStatusCode"),
+    )
+
+
+class R2DiskCache:
+    def __init__(self, directory: str, max_bytes: int, revalidate_after: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        # file name -> entry, least recently used first
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        # File writes, renames and deletions run off the event loop in one
+        # thread, in the order they were submitted, so deleting an evicted
+        # file never races a later download of the same object.
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="r2-cache")
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    async def _run_io(self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._io, func, *args)
+
+    def _name(self, bucket: str, key: str) -> str:
+        return hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        """Rebuild the index from disk, oldest files first."""
+        found = []
+        for file_name in os.listdir(self.directory):
+            path = self._path(file_name)
+            if file_name.endswith(".tmp"):
+                # left behind by an interrupted download
+                os.unlink(path)
+                continue
+            if not file_name.endswith(".json"):
+                continue
+            name = file_name[: -len(".json")]
+            try:
+                with open(path) as f:
+                    entry = CacheEntry(**json.load(f))
+                stat = os.stat(self._path(name))
+            except (OSError, ValueError, TypeError):
+                self._remove_files(name)
+                continue
+            if stat.st_size != entry.size:
+                self._remove_files(name)
+                continue
+            entry.validated_at = 0.0
+            found.append((stat.st_mtime, name, entry))
+        for _mtime, name, entry in sorted(found):
+            self._entries[name] = entry
+            self.size += entry.size
+        self._remove_files(*self._evict())
+
+    def _remove_files(self, *names: str) -> None:
+        for name in names:
+            for path in (self._path(name), self._path(name) + ".json"):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _discard(self, name: str) -> None:
+        """Drop `name` from the index; its files are left to the caller."""
+        entry = self._entries.pop(name, None)
+        if entry:
+            self.size -= entry.size
+
+    async def _remove(self, name: str) -> None:
+        self._discard(name)
+        await self._run_io(self._remove_files, name)
+
+    def _evict(self, keep: str | None = None) -> list[str]:
+        """Drop least recently used entries until within budget.
+
+        Returns the names whose files should be removed.
+        """
+        evicted = []
+        for name in list(self._entries):
+            if self.size <= self.max_bytes:
+                break
+            if name != keep:
+                self._discard(name)
+                self.evictions += 1
+                evicted.append(name)
+        return evicted
+
+    async def get(self, key: str, bucket: str | None = None) -> CacheEntry | None:
+        """Return the cache entry for an object, downloading it if needed.
+
+        Returns None for objects too large to cache. R2 errors (e.g.
+        `NoSuchKey`) propagate as `ClientError`.
+        """
+        bucket = bucket or settings.R2_BUCKET
+        if not bucket:
+            raise RuntimeError("R2 is not configured")
+        name = self._name(bucket, key)
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        try:
+            async with lock:
+                entry = self._entries.get(name)
+                if entry and time.time() - entry.validated_at < self.revalidate_after:
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                    return entry
+                return await self._fetch(name, bucket, key, entry)
+        finally:
+            if not lock.locked():
+                self._locks.pop(name, None)
+
+    async def _fetch(
+        self, name: str, bucket: str, key: str, stale: CacheEntry | None
+    ) -> CacheEntry | None:
+        client = await get_r2_client()
+        params = {"Bucket": bucket, "Key": key}
+        if stale:
+            params["IfNoneMatch"] = stale.etag
+        try:
+            resp = await client.get_object(**params)
+        except ClientError as e:
+            code, status = _error_code(e)
+            if stale and (status == 304 or code in ("304", "NotModified")):
+                if self._entries.get(name) is not stale:
+                    # evicted (files removed) while R2 was answering
+                    return await self._fetch(name, bucket, key, None)
+                stale.validated_at = time.time()
+                self._entries.move_to_end(name)
+                self.revalidations += 1
+                return stale
+            if code in ("NoSuchKey", "404"):
+                await self._remove(name)
+            raise
+        self.misses += 1
+        size = resp["ContentLength"]
+        if size > self.max_bytes:
+            resp["Body"].close()
+            await self._remove(name)
+            return None
+        path = self._path(name)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            body = resp["Body"]
+            f = await self._run_io(open, tmp, "wb")
+            try:
+                async with body:
+                    async for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                        await self._run_io(f.write, chunk)
+            finally:
+                await self._run_io(f.close)
+            entry = CacheEntry(
+                bucket=bucket,
+                key=key,
+                etag=resp.get("ETag", ""),
+                size=size,
+                content_type=resp.get("ContentType") or "application/octet-stream",
+            )
+            await self._run_io(self._commit_files, tmp, path, entry)
+        except BaseException:
+            await asyncio.shield(self._run_io(self._remove_leftovers, tmp))
+            raise
+        # the previous entry may have been evicted or replaced meanwhile
+        self._discard(name)
+        entry.validated_at = time.time()
+        self._entries[name] = entry
+        self.size += size
+        evicted = self._evict(keep=name)
+        if evicted:
+            # not awaited: `open` maps the file before anything else can run
+            self._io.submit(self._remove_files, *evicted)
+        return entry
+
+    @staticmethod
+    def _commit_files(tmp: str, path: str, entry: CacheEntry) -> None:
+        with open(tmp + ".json", "w") as f:
+            json.dump(
+                {k: v for k, v in asdict(entry).items() if k != "validated_at"}, f
+            )
+        # readers holding a mapping of the old file keep seeing it
+        os.replace(tmp, path)
+        os.replace(tmp + ".json", path + ".json")
+
+    @staticmethod
+    def _remove_leftovers(tmp: str) -> None:
+        for leftover in (tmp, tmp + ".json"):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+
+    async def open(
+        self, key: str, bucket: str | None = None
+    ) -> tuple[CacheEntry, mmap.mmap | None] | None:
+        """Like `get`, also mapping the file (None for empty objects).
+
+        The mapping stays valid even if the entry is evicted meanwhile;
+        the caller must close it.
+        """
+        entry = await self.get(key, bucket)
+        if entry is None:
+            return None
+        if not entry.size:
+            return entry, None
+        # queued on the I/O thread before anything can evict the entry, so
+        # the file is still there when it is mapped
+        path = self._path(self._name(entry.bucket, entry.key))
+        return entry, await self._run_io(self._map, path)
+
+    @staticmethod
+    def _map(path: str) -> mmap.mmap:
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def collect_metrics(self) -> list[Metric]:
+        return [
+            Metric(
+                "r2_cache_hits_total", "counter", "Reads served without contacting R2"
+            ).add(self.hits),
+            Metric(
+                "r2_cache_revalidations_total",
+                "counter",
+                "Reads confirmed unchanged by R2",
+            ).add(self.revalidations),
+            Metric(
+                "r2_cache_misses_total", "counter", "Reads that downloaded the object"
+            ).add(self.misses),
+            Metric(
+                "r2_cache_evictions_total",
+                "counter",
+                "Entries evicted to stay in budget",
+            ).add(self.evictions),
+            Metric("r2_cache_bytes", "gauge", "Bytes of cached objects").add(self.size),
+        ]
+
+
+_cache: R2DiskCache | None = None
+
+
+def get_r2_cache() -> R2DiskCache | None:
+    """The process-wide cache, or None when `R2_CACHE_DIR` is unset."""
+    global _cache
+    if not settings.R2_CACHE_DIR:
+        return None
+    if _cache is None or _cache.directory != settings.R2_CACHE_DIR:
+        if _cache is not None:
+            registry.unregister(_cache.collect_metrics)
+        _cache = R2DiskCache(
+            settings.R2_CACHE_DIR,
+            settings.R2_CACHE_MAX_BYTES,
+            settings.R2_CACHE_REVALIDATE_SECONDS,
+        )
+        registry.register(_cache.collect_metrics)
+    return _cache
+
+
+async def _iter_mapped(
+    view: mmap.mmap | None, start: int, stop: int
+) -> AsyncIterator[bytes]:
+    try:
+        for offset in range(start, stop, DOWNLOAD_CHUNK_SIZE):
+            yield view[offset : min(offset + DOWNLOAD_CHUNK_SIZE, stop)]  # type: ignore[index]
+    finally:
+        if view is not None:
+            view.close()
+
+
+async def cached_response(
+    key: str,
+    range_header: str | None = None,
+    bucket: str | None = None,
+    if_none_match: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """`object_response` served from the disk cache when it is enabled.
+
+    Also answers 304 when `if_none_match` matches the cached ETag.
+    """
+    cache = get_r2_cache()
+    if cache is None:
+        return await object_response(key, range_header, bucket, headers=headers)
+    try:
+        opened = await cache.open(key, bucket)
+    except ClientError as e:
+        if _error_code(e)[0] in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=404, detail="Object not found")
+        raise
+    if opened is None:
+        return await object_response(key, range_header, bucket, headers=headers)
+    entry, view = opened
+    response_headers = {"Accept-Ranges": "bytes", "ETag": entry.etag, **(headers or {})}
+    if if_none_match and if_none_match == entry.etag:
+        if view is not None:
+            view.close()
+        return Response(status_code=304, headers=response_headers)
+    start, end, status_code = 0, entry.size - 1, 200
+    byte_range = parse_range_header(range_header)
+    if byte_range:
+        first, last = byte_range
+        if first is None:
+            start = max(entry.size - (last or 0), 0)
+        else:
+            start = first
+            end = entry.size - 1 if last is None else min(last, entry.size - 1)
+        if start >= entry.size:
+            if view is not None:
+                view.close()
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{entry.size}"},
+            )
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_mapped(view, start, end + 1),
+        status_code=status_code,
+        media_type=entry.content_type,
+        headers=response_headers,
+    )
+
+
+async def cached_download(key: str, bucket: str | None = None) -> bytes:
+    """`download_bytes` served from the disk cache when it is enabled."""
+    cache = get_r2_cache()
+    opened = await cache.open(key, bucket) if cache else None
+    if opened is None:
+        return await download_bytes(key, bucket)
+    _entry, view = opened
+    if view is None:
+        return b""
+    try:
+        return view[:]
+    finally:
+        view.close()
+
+
+__all__ = [
+    "CacheEntry",
+    "R2DiskCache",
+    "cached_download",
+    "cached_response",
+    "get_r2_cache",
+]
@@ -0,0 +1,163 @@
+"""Offline SigV4 presigning for R2 URLs.
+
+Presigning is local HMAC work; this module does it with `hmac`/`hashlib`
+instead of going through a botocore client, reuses the derived signing key
+for the whole UTC day and keeps recently issued URLs, so listing pages can
+sign hundreds of URLs in microseconds. URLs are path-style
+(`<endpoint>/<bucket>/<key>`) with `UNSIGNED-PAYLOAD`, matching what
+botocore generates for `get_object`/`put_object`.
+
+Usage:
+  url = presign_url("GET", "path/to/key", expires_in=600)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from .config import settings
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+# Cached URLs are handed out again while at least this share of their
+# lifetime is left.
+URL_REUSE_FRACTION = 0.5
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class Presigner:
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        endpoint: str,
+        region: str = "auto",
+        service: str = "s3",
+        cache_size: int = 10_000,
+    ):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.endpoint = endpoint
+        parts = urlsplit(endpoint)
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.host = parts.netloc
+        self.region = region
+        self.service = service
+        self.cache_size = cache_size
+        self._signing_key: tuple[str, bytes] | None = None
+        # (method, bucket, key, expires_in) -> (url, reusable until)
+        self._urls: OrderedDict[tuple[str, str, str, int], tuple[str, float]] = (
+            OrderedDict()
+        )
+        # sync routes presign from threadpool threads
+        self._urls_lock = threading.Lock()
+
+    def _key_for(self, datestamp: str) -> bytes:
+        if self._signing_key is None or self._signing_key[0] != datestamp:
+            key = _hmac(f"AWS4{self.secret_key}".encode(), datestamp)
+            key = _hmac(key, self.region)
+            key = _hmac(key, self.service)
+            self._signing_key = (datestamp, _hmac(key, "aws4_request"))
+        return self._signing_key[1]
+
+    def sign(
+        self,
+        method: str,
+        bucket: str,
+        key: str,
+        expires_in: int = 3600,
+        now: datetime | None = None,
+    ) -> str:
+        """Return a presigned URL, always computing a fresh signature."""
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/{self.service}/aws4_request"
+        path = f"/{quote(bucket, safe='')}/{quote(key, safe='/~')}"
+        query = "&".join(
+            f"{name}={quote(value, safe='-_.~')}"
+            for name, value in (
+                ("X-Amz-Algorithm", ALGORITHM),
+                ("X-Amz-Credential", f"{self.access_key}/{scope}"),
+                ("X-Amz-Date", amz_date),
+                ("X-Amz-Expires", str(expires_in)),
+                ("X-Amz-SignedHeaders", "host"),
+            )
+        )
+        canonical_request = "\n".join(
+            (method, path, query, f"host:{self.host}", "", "host", "UNSIGNED-PAYLOAD")
+        )
+        string_to_sign = "\n".join(
+            (
+                ALGORITHM,
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            )
+        )
+        signature = hmac.new(
+            self._key_for(datestamp), string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        return f"{self.base_url}{path}?{query}&X-Amz-Signature={signature}"
+
+    def presign(
+        self, method: str, bucket: str, key: str, expires_in: int = 3600
+    ) -> str:
+        """Return a presigned URL, reusing a recent one for the same object."""
+        cache_key = (method, bucket, key, expires_in)
+        now = time.time()
+        with self._urls_lock:
+            cached = self._urls.get(cache_key)
+            if cached and cached[1] > now:
+                self._urls.move_to_end(cache_key)
+                return cached[0]
+        url = self.sign(method, bucket, key, expires_in)
+        with self._urls_lock:
+            self._urls[cache_key] = (url, now + expires_in * URL_REUSE_FRACTION)
+            self._urls.move_to_end(cache_key)
+            while len(self._urls) > self.cache_size:
+                self._urls.popitem(last=False)
+        return url
+
+
+_presigner: Presigner | None = None
+
+
+def get_presigner() -> Presigner:
+    global _presigner
+    if not settings.r2_enabled or not settings.r2_endpoint:
+        raise RuntimeError("R2 is not configured")
+    credentials = (
+        settings.R2_ACCESS_KEY_ID,
+        settings.R2_SECRET_ACCESS_KEY,
+        settings.r2_endpoint,
+    )
+    if _presigner is None or credentials != (
+        _presigner.access_key,
+        _presigner.secret_key,
+        _presigner.endpoint,
+    ):
+        _presigner = Presigner(*credentials)  # type: ignore[arg-type]
+    return _presigner
+
+
+def presign_url(
+    method: str, key: str, expires_in: int = 3600, bucket: str | None = None
+) -> str:
+    """Presigned `GET`/`PUT` (or other method) URL for `key`."""
+    presigner = get_presigner()
+    bucket = bucket or settings.R2_BUCKET
+    if not bucket:
+        raise RuntimeError("R2 is not configured")
+    return presigner.presign(method.upper(), bucket, key, expires_in)
+
+
+__all__ = ["Presigner", "get_presigner", "presign_url"]
@@ -1,3 +1,4 @@
+import redis
 import redis.asyncio as aioredis
 from typing import Optional
 import json
@@ -9,6 +10,8 @@ logger = logging.getLogger(__name__)
 
 class RedisClient:
     _instance: Optional[aioredis.Redis] = None
+    # non-decoding client for payloads that may be binary (WebSocket relay)
+    _binary_instance: Optional[aioredis.Redis] = None
 
     @classmethod
     async def get_client(cls) -> aioredis.Redis:
@@ -22,18 +25,47 @@ class RedisClient:
             logger.info("Redis client initialized")
         return cls._instance
 
+    @classmethod
+    async def get_binary_client(cls) -> aioredis.Redis:
+        if cls._binary_instance is None:
+            cls._binary_instance = await aioredis.from_url(
+                settings.REDIS_URL,
+                decode_responses=False,
+                max_connections=50
+            )
+            logger.info("Redis binary client initialized")
+        return cls._binary_instance
+
     @classmethod
     async def close(cls):
         if cls._instance:
             await cls._instance.close()
             cls._instance = None
             logger.info("Redis client closed")
+        if cls._binary_instance:
+            await cls._binary_instance.close()
+            cls._binary_instance = None
+            logger.info("Redis binary client closed")
 
 
 async def get_redis() -> aioredis.Redis:
     return await RedisClient.get_client()
 
 
+_sync_instance: Optional[redis.Redis] = None
+
+
+def get_sync_redis() -> redis.Redis:
+    """Synchronous client, for Celery tasks and sync routes."""
+    global _sync_instance
+    if _sync_instance is None:
+        # the connection pool reconnects in forked worker processes
+        _sync_instance = redis.Redis.from_url(
+            settings.REDIS_URL, decode_responses=True, max_connections=50
+        )
+    return _sync_instance
+
+
 class CacheService:
     def __init__(self, redis_client: aioredis.Redis):
         self.redis = redis_client
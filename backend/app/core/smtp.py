@@ -0,0 +1,182 @@
+"""Pooled SMTP connections for the email workers.
+
+`emails.Message.send(smtp={...})` builds a new SMTP backend for every
+message, so each email pays for a TCP connection, STARTTLS and AUTH (and
+the connection is only closed when garbage collected). `SMTPPool` keeps up
+to `SMTP_POOL_SIZE` authenticated connections open per process and reuses
+them across messages; `send_many` sends a batch over one connection.
+
+Connections idle for more than `SMTP_POOL_IDLE_SECONDS` are closed instead
+of reused (servers drop them anyway), and each connection is recycled
+after `SMTP_MAX_MESSAGES_PER_CONNECTION` messages, a limit many providers
+enforce. A connection the server dropped is reopened once, transparently,
+by the `emails` backend; when that fails too, the rest of the batch is
+reported failed without further attempts.
+
+Usage:
+  response = get_smtp_pool().send(message, "someone@example.com")
+"""
+
+from __future__ import annotations
+
+import os
+import smtplib
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import emails  # type: ignore
+from emails.backend.smtp import SMTPBackend  # type: ignore
+
+from .config import settings
+
+
+def smtp_options() -> dict[str, Any]:
+    """`SMTPBackend` options for the configured server."""
+    options: dict[str, Any] = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
+    if settings.SMTP_TLS:
+        options["tls"] = True
+    elif settings.SMTP_SSL:
+        options["ssl"] = True
+    if settings.SMTP_USER:
+        options["user"] = settings.SMTP_USER
+    if settings.SMTP_PASSWORD:
+        options["password"] = settings.SMTP_PASSWORD
+    return options
+
+
+@dataclass
+class _Connection:
+    backend: SMTPBackend
+    sent: int = 0
+    last_used: float = 0.0
+
+    def close(self) -> None:
+        self.backend.close()
+        self.sent = 0
+
+
+def _failed(response: Any) -> bool:
+    """Whether the connection, not the server, failed to send."""
+    return not response.success and response.status_code is None
+
+
+class SMTPPool:
+    """Thread-safe pool of open `emails` SMTP backends for one server."""
+
+    def __init__(
+        self,
+        options: dict[str, Any],
+        size: int = 4,
+        idle_seconds: float = 30,
+        max_messages: int = 100,
+    ):
+        self.options = options
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # most recently used last, so old connections expire first
+        self._idle: list[_Connection] = []
+
+    def _checkout(self) -> _Connection:
+        now = time.monotonic()
+        expired: list[_Connection] = []
+        with self._lock:
+            while self._idle and now - self._idle[0].last_used > self.idle_seconds:
+                expired.append(self._idle.pop(0))
+            connection = self._idle.pop() if self._idle else None
+        for c in expired:
+            c.close()
+        # connects lazily, on first send
+        return connection or _Connection(SMTPBackend(**self.options))
+
+    @contextmanager
+    def connection(self) -> Iterator[_Connection]:
+        """Check out a connection; it is closed if the block raises."""
+        with self._slots:
+            connection = self._checkout()
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+            connection.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(connection)
+
+    def _send(self, connection: _Connection, message: emails.Message, to: str) -> Any:
+        if connection.sent >= self.max_messages:
+            connection.close()
+        try:
+            response = message.send(to=to, smtp=connection.backend)
+        except (OSError, smtplib.SMTPException) as e:
+            # e.g. a timeout mid-command: the session state is unknown
+            response = connection.backend.make_response(exception=e)
+        if _failed(response):
+            connection.close()
+        else:
+            connection.sent += 1
+        return response
+
+    def send(self, message: emails.Message, to: str) -> Any:
+        """Send `message` to `to`; returns the `emails` SMTP response."""
+        with self.connection() as connection:
+            return self._send(connection, message, to)
+
+    def send_many(self, messages: Iterable[tuple[emails.Message, str]]) -> list[Any]:
+        """Send `(message, to)` pairs over one connection, in order.
+
+        Returns one response per message. Once the server cannot be
+        reached, the remaining messages get that failed response as well.
+        """
+        responses: list[Any] = []
+        with self.connection() as connection:
+            for message, to in messages:
+                if responses and _failed(responses[-1]):
+                    responses.append(responses[-1])
+                    continue
+                responses.append(self._send(connection, message, to))
+        return responses
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+_pool: SMTPPool | None = None
+_pid: int | None = None
+
+
+def get_smtp_pool() -> SMTPPool:
+    """This process's pool, rebuilt when the SMTP settings change."""
+    global _pool, _pid
+    options = smtp_options()
+    # connections inherited from the parent process must not be shared
+    if _pool is None or _pid != os.getpid() or _pool.options != options:
+        if _pool is not None and _pid == os.getpid():
+            _pool.close()
+        _pool = SMTPPool(
+            options,
+            size=settings.SMTP_POOL_SIZE,
+            idle_seconds=settings.SMTP_POOL_IDLE_SECONDS,
+            max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+        )
+        _pid = os.getpid()
+    return _pool
+
+
+def close_smtp_pool() -> None:
+    global _pool
+    if _pool is not None and _pid == os.getpid():
+        _pool.close()
+    _pool = None
+
+
+__all__ = ["SMTPPool", "close_smtp_pool", "get_smtp_pool", "smtp_options"]
@@ -14,8 +14,15 @@ from app.middlewares.rate_limiter import RateLimiterMiddleware
 
 # redis client and threading utils
 from app.core.redis import RedisClient
+from app.core.r2 import R2Client
 from app.utils_helper.threading import ThreadingUtils
 from app.api.websocket_manager import WebSocketManager
+from app.api.change_capture import ChangeCapture
+from app.utils import preload_email_templates
+from app.core.celery_app import broker_url
+from app.core.metrics import registry
+from app.workers.metrics import QueueDepthSampler, collect_task_metrics
+import redis.asyncio as aioredis
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -58,9 +65,23 @@ async def startup_event():
         app.state.redis = await RedisClient.get_client()
         # Initialize WebSocket manager and start Redis listener
         try:
-            app.state.ws_manager = WebSocketManager(app.state.redis)
+            app.state.ws_manager = WebSocketManager(
+                await RedisClient.get_binary_client(),
+                batch_window_ms=settings.WS_BATCH_WINDOW_MS,
+                durable_prefixes=settings.WS_DURABLE_ROOM_PREFIXES,
+                stream_maxlen=settings.WS_STREAM_MAXLEN,
+                presence_ttl=settings.WS_PRESENCE_TTL_SECONDS,
+                max_connections=settings.WS_MAX_CONNECTIONS,
+                max_connections_per_user=settings.WS_MAX_CONNECTIONS_PER_USER,
+                pubsub_shards=settings.WS_PUBSUB_SHARDS,
+            )
             # start the manager which spawns a background redis subscription
             await app.state.ws_manager.start()
+            if settings.CHANGE_CAPTURE_ENABLED:
+                app.state.change_capture = ChangeCapture(
+                    app.state.ws_manager, settings.POSTGRES_DSN
+                )
+                await app.state.change_capture.start()
         except Exception as e:
             logging.getLogger(__name__).warning(f"WS manager init failed: {e}")
     except Exception as e:
@@ -69,6 +90,26 @@ async def startup_event():
     # Attach threading utilities to app state for global access
     app.state.threading = ThreadingUtils
 
+    # Compile the email templates now so rendering never touches the disk
+    preload_email_templates()
+
+    # Build the shared R2 client up front instead of on the first request
+    if settings.r2_enabled:
+        try:
+            await R2Client.get_client()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"R2 client init failed: {e}")
+
+    # Celery task metrics (flushed to Redis by the workers) and queue lengths
+    registry.register(collect_task_metrics)
+    if settings.CELERY_QUEUE_SAMPLE_SECONDS > 0 and broker_url.startswith(
+        ("redis://", "rediss://")
+    ):
+        app.state.queue_sampler = QueueDepthSampler(
+            aioredis.from_url(broker_url), settings.CELERY_QUEUE_SAMPLE_SECONDS
+        )
+        app.state.queue_sampler.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -76,6 +117,20 @@ async def shutdown_event():
         await RedisClient.close()
     except Exception as e:
         logging.getLogger(__name__).warning(f"Redis close failed: {e}")
+    try:
+        if getattr(app.state, "change_capture", None):
+            await app.state.change_capture.stop()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Change capture stop failed: {e}")
+    try:
+        await R2Client.close()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"R2 client close failed: {e}")
+    try:
+        if getattr(app.state, "queue_sampler", None):
+            await app.state.queue_sampler.stop()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Queue sampler stop failed: {e}")
     # stop websocket manager if present
     try:
         if getattr(app.state, "ws_manager", None):
@@ -1,6 +1,7 @@
 import uuid
 
 from pydantic import EmailStr
+from sqlalchemy import BigInteger
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -79,6 +80,9 @@ class Item(ItemBase, table=True):
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
     owner: User | None = Relationship(back_populates="items")
+    attachments: list["ItemAttachment"] = Relationship(
+        back_populates="item", cascade_delete=True
+    )
 
 
 # Properties to return via API, id is always required
@@ -92,6 +96,87 @@ class ItemsPublic(SQLModel):
     count: int
 
 
+# Shared properties
+class ItemAttachmentBase(SQLModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str = Field(default="application/octet-stream", max_length=255)
+
+
+# Properties to receive on attachment creation
+class ItemAttachmentCreate(ItemAttachmentBase):
+    pass
+
+
+# Database model; the file itself lives in R2 under `key`
+class ItemAttachment(ItemAttachmentBase, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    item_id: uuid.UUID = Field(
+        foreign_key="item.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    key: str = Field(max_length=1024)
+    # set once the client has uploaded the file and confirmed it
+    uploaded: bool = False
+    size: int | None = Field(default=None, sa_type=BigInteger)
+    etag: str | None = Field(default=None, max_length=255)
+    # SHA-256 of the file, set once its derivatives have been generated
+    sha256: str | None = Field(default=None, max_length=64)
+    item: Item | None = Relationship(back_populates="attachments")
+
+
+# Properties to return via API; `url` is a presigned GET URL
+class ItemAttachmentPublic(ItemAttachmentBase):
+    id: uuid.UUID
+    item_id: uuid.UUID
+    uploaded: bool
+    size: int | None = None
+    url: str | None = None
+    # presigned URLs of thumbnails etc. by name, once generated
+    derivatives: dict[str, str] = {}
+
+
+class ItemAttachmentsPublic(SQLModel):
+    data: list[ItemAttachmentPublic]
+    count: int
+
+
+# Where and how to upload the file of a new attachment
+class ItemAttachmentUpload(SQLModel):
+    attachment: ItemAttachmentPublic
+    upload_url: str
+    method: str = "PUT"
+    headers: dict[str, str]
+    expires_in: int
+
+
+# Announcement emailed to every active user (see app.workers.broadcast)
+class BroadcastCreate(SQLModel):
+    subject: str = Field(min_length=1, max_length=255)
+    # plain text, escaped when rendered
+    message: str = Field(min_length=1, max_length=20000)
+
+
+# Progress of a broadcast, kept in Redis while it runs and for a week after
+class BroadcastProgress(SQLModel):
+    id: uuid.UUID
+    subject: str
+    # queued, running, dispatched (all chunks queued), done or failed
+    status: str
+    recipients: int = 0
+    chunks: int = 0
+    chunks_done: int = 0
+    sent: int = 0
+    rejected: int = 0
+    failed: int = 0
+    # a sample of the addresses that could not be emailed
+    failures: list[str] = []
+
+
+# Number of WebSocket connections in a room across all instances
+class RoomPresence(SQLModel):
+    room: str
+    count: int
+
+
 # Generic message
 class Message(SQLModel):
     message: str
@@ -106,6 +191,7 @@ class Token(SQLModel):
 # Contents of JWT token
 class TokenPayload(SQLModel):
     sub: str | None = None
+    exp: int | None = None
 
 
 class NewPassword(SQLModel):
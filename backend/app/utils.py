@@ -1,4 +1,5 @@
 import logging
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -6,11 +7,17 @@ from typing import Any
 
 import emails  # type: ignore
 import jwt
-from jinja2 import Template
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+)
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
 from app.core.config import settings
+from app.core.smtp import get_smtp_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,37 +29,73 @@ class EmailData:
     subject: str
 
 
+def _bytecode_cache() -> FileSystemBytecodeCache | None:
+    directory = settings.EMAIL_TEMPLATES_BYTECODE_CACHE_DIR
+    if not directory:
+        return None
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+# Compiled templates are cached in memory and never reloaded from disk;
+# templates are trusted HTML, values needing escaping use `| e`.
+email_templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / "email-templates" / "build"),
+    autoescape=False,
+    auto_reload=False,
+    bytecode_cache=_bytecode_cache(),
+)
+
+
+def preload_email_templates() -> None:
+    """Compile all email templates now rather than on first use."""
+    for template_name in email_templates.list_templates(extensions=["html"]):
+        email_templates.get_template(template_name)
+
+
+def load_email_template(template_name: str) -> Template:
+    return email_templates.get_template(template_name)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = load_email_template(template_name).render(context)
     return html_content
 
 
+def _message(subject: str, html_content: str) -> emails.Message:
+    return emails.Message(
+        subject=subject,
+        html=html_content,
+        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    )
+
+
 def send_email(
     *,
     email_to: str,
     subject: str = "",
     html_content: str = "",
-) -> None:
+) -> Any:
+    """Send an email over SMTP; returns the `emails` SMTP response."""
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
-    )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
+    response = get_smtp_pool().send(_message(subject, html_content), email_to)
     logger.info(f"send email result: {response}")
+    return response
+
+
+def send_emails(emails_to: Sequence[tuple[str, EmailData]]) -> list[Any]:
+    """Send `(email_to, email_data)` pairs over one SMTP connection.
+
+    Returns the `emails` SMTP response of each, in order.
+    """
+    assert settings.emails_enabled, "no provided configuration for email variables"
+    responses = get_smtp_pool().send_many(
+        (_message(data.subject, data.html_content), email_to)
+        for email_to, data in emails_to
+    )
+    sent = sum(1 for response in responses if response.success)
+    logger.info(f"sent {sent} of {len(responses)} emails")
+    return responses
 
 
 def generate_test_email(email_to: str) -> EmailData:
@@ -82,24 +125,52 @@ def generate_reset_password_email(email_to: str, email: str, token: str) -> Emai
     return EmailData(html_content=html_content, subject=subject)
 
 
-def generate_new_account_email(
-    email_to: str, username: str, password: str
-) -> EmailData:
+def generate_new_account_email(email_to: str, username: str, token: str) -> EmailData:
+    """Welcome email linking to where the user sets a password.
+
+    `token` is a password reset token, so the password itself never
+    travels through the task queue or the mailbox.
+    """
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
+    link = f"{settings.FRONTEND_HOST}/reset-password?token={token}"
     html_content = render_email_template(
         template_name="new_account.html",
         context={
             "project_name": settings.PROJECT_NAME,
             "username": username,
-            "password": password,
             "email": email_to,
-            "link": settings.FRONTEND_HOST,
+            "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+            "link": link,
         },
     )
     return EmailData(html_content=html_content, subject=subject)
 
 
+def generate_announcement_emails(
+    recipients: Sequence[tuple[str, str | None]], subject: str, message: str
+) -> list[tuple[str, EmailData]]:
+    """Render an announcement for `(email, full_name)` recipients.
+
+    The template is loaded once for all of them.
+    """
+    template = load_email_template("announcement.html")
+    return [
+        (
+            email_to,
+            EmailData(
+                html_content=template.render(
+                    project_name=settings.PROJECT_NAME,
+                    name=full_name or email_to,
+                    message=message,
+                ),
+                subject=subject,
+            ),
+        )
+        for email_to, full_name in recipients
+    ]
+
+
 def generate_password_reset_token(email: str) -> str:
     delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
     now = datetime.now(timezone.utc)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from .tasks import add, send_welcome_email
+from . import metrics  # noqa: F401  (connects the task instrumentation signals)
 from .celery_worker import main as worker_main
+from .tasks import add, generate_derivatives, send_welcome_email
 
-__all__ = ["add", "send_welcome_email", "worker_main"]
+__all__ = ["add", "generate_derivatives", "send_welcome_email", "worker_main"]
@@ -0,0 +1,160 @@
+"""Announcements emailed to every active user, with progress in Redis.
+
+The `fan_out_broadcast` task streams the ids of the active users from a
+server-side cursor (`yield_per`), so memory stays bounded however many
+users there are, and queues them in chunks of `BROADCAST_CHUNK_SIZE` as
+`send_broadcast_chunk` tasks, published as Celery groups of
+`BROADCAST_GROUP_SIZE` chunks. Each chunk loads its users, renders their
+emails and sends them over one pooled SMTP connection (see
+`app.core.smtp`), so chunks run in parallel on all workers.
+
+Progress is a Redis hash per broadcast (`broadcast:<id>`), updated with
+atomic increments by the tasks, plus a capped sample of the addresses
+that could not be emailed; both expire a week after the broadcast starts.
+"""
+
+from __future__ import annotations
+
+import uuid
+from collections.abc import Iterator
+
+import redis
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.models import BroadcastProgress, User
+
+PROGRESS_PREFIX = "broadcast:"
+PROGRESS_TTL = 7 * 24 * 3600
+MAX_FAILURES = 1000
+
+COUNTERS = ("recipients", "chunks", "chunks_done", "sent", "rejected", "failed")
+
+
+def progress_key(broadcast_id: uuid.UUID | str) -> str:
+    return f"{PROGRESS_PREFIX}{broadcast_id}"
+
+
+def failures_key(broadcast_id: uuid.UUID | str) -> str:
+    return f"{PROGRESS_PREFIX}{broadcast_id}:failures"
+
+
+def create_progress(
+    client: redis.Redis, broadcast_id: uuid.UUID | str, subject: str
+) -> None:
+    key = progress_key(broadcast_id)
+    pipe = client.pipeline()
+    pipe.hset(
+        key,
+        mapping={"subject": subject, "status": "queued"} | dict.fromkeys(COUNTERS, 0),
+    )
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.execute()
+
+
+def get_progress(
+    client: redis.Redis, broadcast_id: uuid.UUID | str
+) -> BroadcastProgress | None:
+    broadcast_id = uuid.UUID(str(broadcast_id))
+    pipe = client.pipeline()
+    pipe.hgetall(progress_key(broadcast_id))
+    pipe.lrange(failures_key(broadcast_id), 0, -1)
+    fields, failures = pipe.execute()
+    if not fields:
+        return None
+    return BroadcastProgress(id=broadcast_id, failures=failures, **fields)
+
+
+def set_status(
+    client: redis.Redis, broadcast_id: uuid.UUID | str, status: str, **counters: int
+) -> None:
+    client.hset(progress_key(broadcast_id), mapping={"status": status, **counters})
+
+
+def _finish_if_done(client: redis.Redis, broadcast_id: uuid.UUID | str) -> None:
+    # both the dispatcher and the chunks check after their own write, so
+    # whichever of them finishes last sees everything done
+    status, chunks, chunks_done = client.hmget(
+        progress_key(broadcast_id), ["status", "chunks", "chunks_done"]
+    )
+    if status == "dispatched" and int(chunks_done or 0) >= int(chunks or 0):
+        client.hset(progress_key(broadcast_id), "status", "done")
+
+
+def mark_dispatched(
+    client: redis.Redis, broadcast_id: uuid.UUID | str, chunks: int, recipients: int
+) -> None:
+    """Record that all `chunks` have been queued."""
+    set_status(client, broadcast_id, "dispatched", chunks=chunks, recipients=recipients)
+    _finish_if_done(client, broadcast_id)
+
+
+def record_chunk(
+    client: redis.Redis,
+    broadcast_id: uuid.UUID | str,
+    *,
+    sent: int,
+    rejected: int,
+    failures: list[str],
+    done: bool,
+) -> None:
+    """Count one delivery attempt of a chunk; `done` when it won't retry."""
+    key = progress_key(broadcast_id)
+    pipe = client.pipeline()
+    pipe.hincrby(key, "sent", sent)
+    pipe.hincrby(key, "rejected", rejected)
+    if failures:
+        pipe.hincrby(key, "failed", len(failures))
+        pipe.rpush(failures_key(broadcast_id), *failures)
+        pipe.ltrim(failures_key(broadcast_id), 0, MAX_FAILURES - 1)
+        pipe.expire(failures_key(broadcast_id), PROGRESS_TTL)
+    if done:
+        pipe.hincrby(key, "chunks_done", 1)
+    pipe.execute()
+    if done:
+        _finish_if_done(client, broadcast_id)
+
+
+def iter_active_user_ids(
+    session: Session, chunk_size: int
+) -> Iterator[list[uuid.UUID]]:
+    """Stream the ids of the active users in lists of `chunk_size`."""
+    statement = select(User.id).where(col(User.is_active).is_(True))
+    result = session.exec(statement.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield list(partition)
+
+
+def iter_chunk_groups(session: Session) -> Iterator[list[list[str]]]:
+    """Chunks of active user ids (as strings), grouped for dispatching."""
+    chunk_group: list[list[str]] = []
+    for user_ids in iter_active_user_ids(session, settings.BROADCAST_CHUNK_SIZE):
+        chunk_group.append([str(user_id) for user_id in user_ids])
+        if len(chunk_group) == settings.BROADCAST_GROUP_SIZE:
+            yield chunk_group
+            chunk_group = []
+    if chunk_group:
+        yield chunk_group
+
+
+def load_recipients(
+    session: Session, user_ids: list[str]
+) -> list[tuple[uuid.UUID, str, str | None]]:
+    """`(id, email, full_name)` of the users that are still active."""
+    statement = select(User.id, User.email, User.full_name).where(
+        col(User.id).in_([uuid.UUID(i) for i in user_ids]),
+        col(User.is_active).is_(True),
+    )
+    return list(session.exec(statement).all())
+
+
+__all__ = [
+    "create_progress",
+    "get_progress",
+    "iter_active_user_ids",
+    "iter_chunk_groups",
+    "load_recipients",
+    "mark_dispatched",
+    "record_chunk",
+    "set_status",
+]
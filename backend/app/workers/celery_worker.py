@@ -1,14 +1,65 @@
 from __future__ import annotations
 
-from app.core.celery_app import celery_app
+import argparse
 
+from app.core.celery_app import QUEUES, celery_app
 
-def main() -> None:
-    argv = [
-        "worker",
-        "--loglevel=info",
-    ]
-    celery_app.worker_main(argv)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.workers.celery_worker",
+        description="Run a Celery worker, optionally for some queues only.",
+    )
+    parser.add_argument(
+        "-Q",
+        "--queues",
+        default=",".join(QUEUES),
+        help=f"comma-separated queues to consume (default: {','.join(QUEUES)})",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        help="worker processes/threads (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-P",
+        "--pool",
+        choices=["prefork", "threads", "solo", "eventlet", "gevent"],
+        help="execution pool; threads suit I/O-bound queues such as email",
+    )
+    parser.add_argument(
+        "--prefetch-multiplier",
+        type=int,
+        help="tasks reserved per process (default: CELERY_PREFETCH_MULTIPLIER)",
+    )
+    parser.add_argument(
+        "--max-tasks-per-child",
+        type=int,
+        help="replace a pool process after this many tasks",
+    )
+    parser.add_argument("-n", "--hostname", help="node name, e.g. email@%%h")
+    parser.add_argument("-l", "--loglevel", default="info")
+    return parser.parse_args(argv)
+
+
+def worker_argv(args: argparse.Namespace) -> list[str]:
+    argv = ["worker", f"--loglevel={args.loglevel}", f"--queues={args.queues}"]
+    if args.concurrency:
+        argv.append(f"--concurrency={args.concurrency}")
+    if args.pool:
+        argv.append(f"--pool={args.pool}")
+    if args.prefetch_multiplier:
+        argv.append(f"--prefetch-multiplier={args.prefetch_multiplier}")
+    if args.max_tasks_per_child:
+        argv.append(f"--max-tasks-per-child={args.max_tasks_per_child}")
+    if args.hostname:
+        argv.append(f"--hostname={args.hostname}")
+    return argv
+
+
+def main(argv: list[str] | None = None) -> None:
+    celery_app.worker_main(worker_argv(parse_args(argv)))
 
 
 if __name__ == "__main__":
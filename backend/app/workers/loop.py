@@ -0,0 +1,40 @@
+"""One event loop per worker thread for tasks calling async helpers.
+
+Celery tasks are synchronous; running each coroutine on a fresh loop
+(`asyncio.run`) would also open a fresh R2 client and connection pool per
+task, since `R2Client` keeps one client per loop. `run_async` instead
+reuses a loop created lazily in each worker thread, so it works under the
+prefork pool (one thread per forked process) as well as `-P threads`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class _LocalLoop(threading.local):
+    loop: asyncio.AbstractEventLoop | None = None
+    pid: int | None = None
+
+
+_local = _LocalLoop()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    loop = _local.loop
+    # a loop inherited from the parent process must not be reused
+    if loop is None or loop.is_closed() or _local.pid != os.getpid():
+        loop = _local.loop = asyncio.new_event_loop()
+        _local.pid = os.getpid()
+    return loop
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Run `coro` to completion on the calling thread's loop."""
+    return get_loop().run_until_complete(coro)
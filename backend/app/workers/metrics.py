@@ -0,0 +1,268 @@
+"""Celery task metrics, exposed on the API's `/utils/metrics/`.
+
+Signal handlers stamp each task message with its publish time and, in the
+workers, record per task name how long it waited in the queue, how long it
+ran and how it ended (success, failure, retry). Workers aggregate these in
+memory and a background thread adds them to one Redis hash
+(`celery:task_metrics`) every `CELERY_METRICS_FLUSH_SECONDS`, so recording
+costs no I/O in the task itself. The API renders the hash with
+`collect_task_metrics`.
+
+`QueueDepthSampler` runs in the API and samples the length of each Celery
+queue in the Redis broker every `CELERY_QUEUE_SAMPLE_SECONDS`.
+
+Metrics:
+  celery_tasks_total{task,outcome}            counter
+  celery_task_wait_seconds{task}              histogram, publish to start
+  celery_task_runtime_seconds{task}           histogram
+  celery_queue_length{queue}                  gauge
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any
+
+import redis.asyncio as aioredis
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_process_shutdown,
+)
+
+from app.core.celery_app import QUEUES
+from app.core.config import settings
+from app.core.metrics import Metric, registry
+from app.core.redis import RedisClient, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = "celery:task_metrics"
+PUBLISHED_AT_HEADER = "published_at"
+# upper bounds, in seconds, of the wait and runtime histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)
+HISTOGRAMS = {
+    "wait": ("celery_task_wait_seconds", "Seconds from publishing to start"),
+    "runtime": ("celery_task_runtime_seconds", "Seconds tasks ran"),
+}
+
+
+class TaskStats:
+    """Counters of this process, flushed to Redis by a daemon thread.
+
+    Fields are `<series>|<task>[|<bucket>]`, e.g. `runtime|<task>|0.5`
+    counts runs of at most 0.5s (and more than the previous bound), while
+    `runtime_sum|<task>` adds up their seconds.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._counts: Counter[str] = Counter()
+        self._sums: defaultdict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def observe(self, series: str, task: str, seconds: float) -> None:
+        index = bisect.bisect_left(BUCKETS, seconds)
+        bucket = f"{BUCKETS[index]:g}" if index < len(BUCKETS) else "+Inf"
+        with self._lock:
+            self._counts[f"{series}|{task}|{bucket}"] += 1
+            self._sums[f"{series}_sum|{task}"] += seconds
+            self._start()
+
+    def count(self, task: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[f"tasks|{task}|{outcome}"] += 1
+            self._start()
+
+    def _start(self) -> None:
+        # called with the lock held
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="celery-metrics", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            sums, self._sums = self._sums, defaultdict(float)
+        if not counts and not sums:
+            return
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            for name, value in [*counts.items(), *sums.items()]:
+                pipe.hincrbyfloat(METRICS_KEY, name, value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to flush task metrics: {e}")
+            with self._lock:
+                self._counts.update(counts)
+                for name, total in sums.items():
+                    self._sums[name] += total
+
+
+_stats: TaskStats | None = None
+_pid: int | None = None
+# task id -> start time, for the tasks running in this process
+_started: dict[str, float] = {}
+
+
+def get_task_stats() -> TaskStats:
+    global _stats, _pid
+    # the parent's counts (and flush thread) don't carry over a fork
+    if _stats is None or _pid != os.getpid():
+        _stats = TaskStats(settings.CELERY_METRICS_FLUSH_SECONDS)
+        _pid = os.getpid()
+    return _stats
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers: dict[str, Any] | None = None, **_: Any) -> None:
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def _task_started(task_id: str, task: Any, **_: Any) -> None:
+    request = task.request
+    if request.is_eager:
+        # run inline by the caller (e.g. `.apply()`), not by a worker
+        return
+    _started[task_id] = time.monotonic()
+    published_at = request.get(PUBLISHED_AT_HEADER)
+    if published_at is None:
+        return
+    ready_at = float(published_at)
+    eta = request.eta
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta is not None:
+        # a countdown is a deliberate delay, not time spent waiting for a worker
+        ready_at = max(ready_at, eta.timestamp())
+    get_task_stats().observe("wait", task.name, max(time.time() - ready_at, 0.0))
+
+
+@task_postrun.connect
+def _task_finished(task_id: str, task: Any, state: str | None = None, **_: Any) -> None:
+    if task.request.is_eager:
+        return
+    started = _started.pop(task_id, None)
+    stats = get_task_stats()
+    if started is not None:
+        stats.observe("runtime", task.name, time.monotonic() - started)
+    stats.count(task.name, (state or "unknown").lower())
+
+
+@worker_process_shutdown.connect
+def _flush_task_stats(**_: Any) -> None:
+    if _stats is not None and _pid == os.getpid():
+        _stats.flush()
+
+
+def _histograms(fields: dict[str, str]) -> list[Metric]:
+    # {(series, task): {bucket: count}} and {(series, task): sum}
+    buckets: dict[tuple[str, str], dict[str, float]] = {}
+    sums: dict[tuple[str, str], float] = {}
+    for name, value in fields.items():
+        series, task, *bucket = name.split("|")
+        if series.endswith("_sum"):
+            sums[(series.removesuffix("_sum"), task)] = float(value)
+        elif series in HISTOGRAMS and bucket:
+            buckets.setdefault((series, task), {})[bucket[0]] = float(value)
+    metrics = {
+        series: Metric(name, "histogram", text)
+        for series, (name, text) in HISTOGRAMS.items()
+    }
+    for (series, task), counts in sorted(buckets.items()):
+        cumulative, total = [], 0.0
+        for bound in BUCKETS:
+            total += counts.get(f"{bound:g}", 0)
+            cumulative.append((bound, total))
+        total += counts.get("+Inf", 0)
+        metrics[series].add_histogram(
+            cumulative, sums.get((series, task), 0.0), total, task=task
+        )
+    return list(metrics.values())
+
+
+async def collect_task_metrics() -> list[Metric]:
+    """Metrics of all workers, as last flushed to Redis."""
+    client = await RedisClient.get_client()
+    fields: dict[str, str] = await client.hgetall(METRICS_KEY)
+    tasks = Metric("celery_tasks_total", "counter", "Tasks run, by outcome")
+    for name, value in sorted(fields.items()):
+        series, task, *outcome = name.split("|")
+        if series == "tasks" and outcome:
+            tasks.add(float(value), task=task, outcome=outcome[0])
+    return [tasks, *_histograms(fields)]
+
+
+class QueueDepthSampler:
+    """Samples the length of the Celery queues in a Redis broker."""
+
+    def __init__(
+        self, broker: aioredis.Redis, interval: float, queues: tuple[str, ...] = QUEUES
+    ):
+        self.broker = broker
+        self.interval = interval
+        self.queues = queues
+        self.lengths: dict[str, int] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    async def sample(self) -> None:
+        pipe = self.broker.pipeline(transaction=False)
+        for queue in self.queues:
+            pipe.llen(queue)
+        self.lengths = dict(zip(self.queues, await pipe.execute(), strict=True))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.warning(f"Failed to sample Celery queue lengths: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            registry.register(self.collect_metrics)
+
+    async def stop(self) -> None:
+        registry.unregister(self.collect_metrics)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.broker.close()
+
+    def collect_metrics(self) -> list[Metric]:
+        metric = Metric("celery_queue_length", "gauge", "Tasks waiting in the queue")
+        for queue, length in self.lengths.items():
+            metric.add(length, queue=queue)
+        return [metric]
+
+
+__all__ = [
+    "QueueDepthSampler",
+    "TaskStats",
+    "collect_task_metrics",
+    "get_task_stats",
+]
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from typing import Any
+
+from celery import Task, group
+from celery.signals import worker_init, worker_process_shutdown
+from celery.utils.time import get_exponential_backoff_interval
+from sqlmodel import Session
+
+from app.core.celery_app import celery_app
+from app.core.db import engine
+from app.core.derivatives import DerivativeError, has_derivatives
+from app.core.derivatives import generate_derivatives as render_derivatives
+from app.core.redis import get_sync_redis
+from app.core.smtp import close_smtp_pool
+from app.models import ItemAttachment
+from app.utils import (
+    EmailData,
+    generate_announcement_emails,
+    generate_new_account_email,
+    generate_reset_password_email,
+    generate_test_email,
+    preload_email_templates,
+    send_email,
+    send_emails,
+)
+
+from . import broadcast
+from .loop import run_async
+
+logger = logging.getLogger(__name__)
+
+# Publishing gives up after about a second when the broker is unreachable.
+PUBLISH_RETRY_POLICY = {
+    "max_retries": 3,
+    "interval_start": 0,
+    "interval_step": 0.2,
+    "interval_max": 0.5,
+}
+
+
+class EmailNotSentError(Exception):
+    """The SMTP server could not be reached or deferred the message."""
+
+
+# Transient SMTP failures are retried with exponential backoff (30s, 60s,
+# ... capped at 10 minutes, jittered), for about 45 minutes in total.
+EMAIL_RETRY_BACKOFF = 30
+EMAIL_RETRY_BACKOFF_MAX = 600
+EMAIL_MAX_RETRIES = 8
+EMAIL_TASK_OPTIONS: dict[str, Any] = {
+    "autoretry_for": (EmailNotSentError,),
+    "retry_backoff": EMAIL_RETRY_BACKOFF,
+    "retry_backoff_max": EMAIL_RETRY_BACKOFF_MAX,
+    "retry_jitter": True,
+    "max_retries": EMAIL_MAX_RETRIES,
+}
+
+
+def enqueue(task: Task, *args: Any) -> None:
+    """Queue `task`, logging instead of raising when the broker is down.
+
+    Meant to run after the response (as a `BackgroundTasks` task), so
+    neither the broker nor the work itself adds to API latency.
+    """
+    try:
+        task.apply_async(args, retry_policy=PUBLISH_RETRY_POLICY)
+    except Exception as e:
+        logger.error(f"Failed to queue {task.name}: {e}")
+
+
+@worker_init.connect
+def _preload_email_templates(**_: Any) -> None:
+    # in the main process, so forked pool processes inherit them compiled
+    preload_email_templates()
+
+
+@worker_process_shutdown.connect
+def _close_smtp_connections(**_: Any) -> None:
+    close_smtp_pool()
+
+
+def _deferred(email_to: str, response: Any) -> bool:
+    """Whether sending failed in a way worth retrying."""
+    if response.success:
+        return False
+    status = response.status_code
+    if status and 500 <= status < 600:
+        # permanent rejection (e.g. unknown mailbox): retrying will not help
+        logger.error(f"Email to {email_to} rejected: {status} {response.status_text}")
+        return False
+    return True
+
+
+def _email_retry_countdown(retries: int) -> int:
+    return get_exponential_backoff_interval(
+        EMAIL_RETRY_BACKOFF, retries, EMAIL_RETRY_BACKOFF_MAX, full_jitter=True
+    )
+
+
+def deliver(email_to: str, email_data: EmailData) -> None:
+    response = send_email(
+        email_to=email_to,
+        subject=email_data.subject,
+        html_content=email_data.html_content,
+    )
+    if _deferred(email_to, response):
+        raise EmailNotSentError(
+            f"{response.status_code} {response.status_text or response.error}"
+        )
+
+
+@celery_app.task(ignore_result=False)
+def add(x: int, y: int) -> int:
+    return x + y
+
+
+@celery_app.task(**EMAIL_TASK_OPTIONS)
+def send_test_email(email_to: str) -> None:
+    deliver(email_to, generate_test_email(email_to=email_to))
+
+
+@celery_app.task(**EMAIL_TASK_OPTIONS)
+def send_reset_password_email(email_to: str, email: str, token: str) -> None:
+    deliver(
+        email_to,
+        generate_reset_password_email(email_to=email_to, email=email, token=token),
+    )
+
+
+@celery_app.task(**EMAIL_TASK_OPTIONS)
+def send_welcome_email(email_to: str, username: str, token: str) -> None:
+    deliver(
+        email_to,
+        generate_new_account_email(email_to=email_to, username=username, token=token),
+    )
+
+
+@celery_app.task(bind=True, max_retries=EMAIL_MAX_RETRIES)
+def send_email_batch(self, messages: list[dict[str, str]]) -> None:  # type: ignore[no-untyped-def]
+    """Send `{"email_to", "subject", "html_content"}` messages in one batch.
+
+    The batch goes out over one pooled SMTP connection. Only the messages
+    that failed transiently are retried, as a smaller batch, with the same
+    backoff as single emails.
+    """
+    responses = send_emails(
+        [
+            (
+                m["email_to"],
+                EmailData(html_content=m["html_content"], subject=m["subject"]),
+            )
+            for m in messages
+        ]
+    )
+    deferred = [
+        m
+        for m, response in zip(messages, responses, strict=True)
+        if _deferred(m["email_to"], response)
+    ]
+    if deferred:
+        raise self.retry(
+            args=(deferred,),
+            countdown=_email_retry_countdown(self.request.retries),
+            exc=EmailNotSentError(
+                f"{len(deferred)} of {len(messages)} emails deferred"
+            ),
+        )
+
+
+# acknowledged on receipt: running it again would send the queued chunks twice
+@celery_app.task(acks_late=False)
+def fan_out_broadcast(broadcast_id: str, subject: str, message: str) -> None:
+    """Queue a broadcast to every active user, in chunks of user ids."""
+    client = get_sync_redis()
+    broadcast.set_status(client, broadcast_id, "running")
+    chunks = recipients = 0
+    try:
+        with Session(engine) as session:
+            for chunk_group in broadcast.iter_chunk_groups(session):
+                group(
+                    send_broadcast_chunk.s(broadcast_id, user_ids, subject, message)
+                    for user_ids in chunk_group
+                ).apply_async(retry_policy=PUBLISH_RETRY_POLICY)
+                chunks += len(chunk_group)
+                recipients += sum(len(user_ids) for user_ids in chunk_group)
+                broadcast.set_status(
+                    client,
+                    broadcast_id,
+                    "running",
+                    chunks=chunks,
+                    recipients=recipients,
+                )
+    except Exception:
+        broadcast.set_status(client, broadcast_id, "failed")
+        raise
+    broadcast.mark_dispatched(client, broadcast_id, chunks, recipients)
+    logger.info(f"Broadcast {broadcast_id}: {recipients} recipients in {chunks} chunks")
+
+
+@celery_app.task(bind=True, max_retries=EMAIL_MAX_RETRIES)
+def send_broadcast_chunk(  # type: ignore[no-untyped-def]
+    self, broadcast_id: str, user_ids: list[str], subject: str, message: str
+) -> None:
+    """Email a broadcast to a chunk of users over one SMTP connection.
+
+    Deferred messages are retried like `send_email_batch`; those still
+    failing after the last retry are counted as failures.
+    """
+    with Session(engine) as session:
+        recipients = broadcast.load_recipients(session, user_ids)
+    responses = send_emails(
+        generate_announcement_emails(
+            [(email, full_name) for _, email, full_name in recipients],
+            subject,
+            message,
+        )
+    )
+    sent = rejected = 0
+    deferred: list[tuple[str, str]] = []
+    for (user_id, email, _), response in zip(recipients, responses, strict=True):
+        if response.success:
+            sent += 1
+        elif _deferred(email, response):
+            deferred.append((str(user_id), email))
+        else:
+            rejected += 1
+    retry = bool(deferred) and self.request.retries < self.max_retries
+    broadcast.record_chunk(
+        get_sync_redis(),
+        broadcast_id,
+        sent=sent,
+        rejected=rejected,
+        failures=[] if retry else [email for _, email in deferred],
+        done=not retry,
+    )
+    if retry:
+        raise self.retry(
+            args=(broadcast_id, [user_id for user_id, _ in deferred], subject, message),
+            countdown=_email_retry_countdown(self.request.retries),
+            exc=EmailNotSentError(
+                f"{len(deferred)} of {len(recipients)} emails deferred"
+            ),
+        )
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_derivatives(self, attachment_id: str) -> str | None:  # type: ignore[no-untyped-def]
+    """Render the thumbnails of an uploaded image attachment.
+
+    Records the image's SHA-256 on the attachment, which makes the
+    derivative URLs part of its API representation.
+    """
+    with Session(engine) as session:
+        attachment = session.get(ItemAttachment, uuid.UUID(attachment_id))
+        if (
+            attachment is None
+            or not attachment.uploaded
+            or not has_derivatives(attachment.content_type)
+        ):
+            return None
+        try:
+            digest = run_async(render_derivatives(attachment.key))
+        except DerivativeError as e:
+            # retrying will not fix a corrupt image
+            logger.warning(f"Cannot render derivatives of {attachment.key}: {e}")
+            return None
+        except Exception as e:
+            raise self.retry(exc=e)
+        attachment.sha256 = digest
+        session.add(attachment)
+        session.commit()
+        return digest
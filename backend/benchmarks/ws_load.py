@@ -0,0 +1,286 @@
+"""Load test for the WebSocket fan-out (`WebSocketManager`).
+
+Runs the FastAPI app in-process under uvicorn, backed by an in-memory Redis
+(fakeredis), an embedded `redis-server` or an existing Redis URL, opens many
+WebSocket clients spread across rooms, publishes timestamped messages through
+one client per room and reports delivery latency percentiles, throughput and
+memory per connection.
+
+Usage (from ./backend/):
+
+    python -m benchmarks.ws_load --clients 10000 --rooms 200 --messages 20000
+
+Clients authenticate with a token minted for a synthetic user whose
+verification is primed in the handshake token cache, so no database is
+needed; the connection caps are lifted to the number of clients.
+
+Memory per connection is the RSS growth while opening the clients divided by
+their number; client and server sockets live in the same process, so it
+covers both ends of each connection.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from array import array
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from typing import Any
+
+import redis.asyncio as aioredis
+import uvicorn
+import websockets
+
+from app.api.ws_auth import WebSocketUser, token_cache
+from app.core.config import settings
+from app.core.redis import RedisClient
+from app.core.security import create_access_token
+
+
+def raise_fd_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is a high-water mark (KiB on Linux), good enough elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def percentile(sorted_values: list[int], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return float(sorted_values[index])
+
+
+async def make_redis(target: str) -> tuple[Any, Callable[[], Awaitable[None]]]:
+    """Return a Redis client for `target` (`fake`, `embedded` or a URL)."""
+    if target == "fake":
+        from fakeredis import aioredis as fakeredis
+
+        client = fakeredis.FakeRedis()
+        return client, client.close
+
+    process = None
+    url = target
+    if target == "embedded":
+        binary = shutil.which("redis-server")
+        if not binary:
+            raise SystemExit("redis-server not found on PATH")
+        port = free_port()
+        process = subprocess.Popen(
+            [binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+        )
+        url = f"redis://127.0.0.1:{port}/0"
+
+    client = aioredis.from_url(url, max_connections=100)
+    for _ in range(50):
+        try:
+            await client.ping()
+            break
+        except Exception:
+            await asyncio.sleep(0.1)
+
+    async def cleanup() -> None:
+        await client.close()
+        if process:
+            process.terminate()
+            process.wait()
+
+    return client, cleanup
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    fd_limit = raise_fd_limit()
+    if fd_limit < args.clients * 2 + 100:
+        raise SystemExit(
+            f"open file limit {fd_limit} is too low for {args.clients} clients"
+        )
+
+    redis_client, close_redis = await make_redis(args.redis)
+    # the app picks up the shared (bytes) client on startup
+    RedisClient._binary_instance = redis_client
+    settings.WS_MAX_CONNECTIONS = args.clients
+    settings.WS_MAX_CONNECTIONS_PER_USER = args.clients
+    settings.WS_PUBSUB_SHARDS = args.shards
+    user = WebSocketUser(id=uuid.uuid4())
+    token = create_access_token(user.id, expires_delta=timedelta(hours=1))
+    token_cache.set(token, user)
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app,
+            host="127.0.0.1",
+            port=0,
+            log_level="warning",
+            backlog=4096,
+            ws_per_message_deflate=args.per_message_deflate,
+        )
+    )
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"ws://127.0.0.1:{port}{settings.API_V1_STR}/ws"
+
+    rooms = [f"bench-{i}" for i in range(args.rooms)]
+    members = [0] * args.rooms
+    latencies = array("q")
+    done = asyncio.Event()
+    expected = 0
+    received = 0
+
+    async def receive(ws: Any) -> None:
+        nonlocal received
+        async for raw in ws:
+            sent_at = json.loads(raw)["t"]
+            latencies.append(time.perf_counter_ns() - sent_at)
+            received += 1
+            if received >= expected:
+                done.set()
+
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_client(index: int) -> Any:
+        async with gate:
+            return await websockets.connect(
+                f"{base_url}/{rooms[index % args.rooms]}?token={token}",
+                ping_interval=None,
+                max_queue=None,
+                compression="deflate" if args.per_message_deflate else None,
+            )
+
+    rss_before = rss_bytes()
+    connect_started = time.perf_counter()
+    clients = await asyncio.gather(*(open_client(i) for i in range(args.clients)))
+    connect_seconds = time.perf_counter() - connect_started
+    # let the server finish registering sockets before measuring
+    await asyncio.sleep(0.5)
+    rss_after = rss_bytes()
+    for index in range(args.clients):
+        members[index % args.rooms] += 1
+    receivers = [asyncio.create_task(receive(ws)) for ws in clients]
+
+    senders = clients[: args.rooms]
+    expected = sum(members[i % args.rooms] for i in range(args.messages))
+    interval = 1 / args.rate if args.rate else 0
+    publish_started = time.perf_counter()
+    for seq in range(args.messages):
+        ws = senders[seq % args.rooms]
+        payload = json.dumps({"t": time.perf_counter_ns(), "seq": seq})
+        await ws.send(payload.encode() if args.binary else payload)
+        if interval:
+            delay = publish_started + (seq + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    publish_seconds = time.perf_counter() - publish_started
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - publish_started
+
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(
+        *(ws.close() for ws in clients), *receivers, return_exceptions=True
+    )
+    server.should_exit = True
+    await serve_task
+    await close_redis()
+
+    ordered = sorted(latencies)
+    return {
+        "redis": args.redis,
+        "frames": "binary" if args.binary else "text",
+        "per_message_deflate": args.per_message_deflate,
+        "clients": args.clients,
+        "rooms": args.rooms,
+        "messages_published": args.messages,
+        "deliveries_expected": expected,
+        "deliveries_received": received,
+        "connect_seconds": round(connect_seconds, 3),
+        "publish_seconds": round(publish_seconds, 3),
+        "publish_rate_per_s": round(args.messages / publish_seconds, 1),
+        "delivery_throughput_per_s": round(received / elapsed, 1),
+        "latency_ms_p50": round(percentile(ordered, 50) / 1e6, 3),
+        "latency_ms_p90": round(percentile(ordered, 90) / 1e6, 3),
+        "latency_ms_p99": round(percentile(ordered, 99) / 1e6, 3),
+        "latency_ms_max": round(percentile(ordered, 100) / 1e6, 3),
+        "memory_per_connection_kib": round(
+            (rss_after - rss_before) / args.clients / 1024, 2
+        ),
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="publishes per second, 0 = unbounded"
+    )
+    parser.add_argument(
+        "--redis",
+        default="fake",
+        help="`fake` (fakeredis), `embedded` (spawn redis-server) or a Redis URL",
+    )
+    parser.add_argument(
+        "--binary", action="store_true", help="publish binary instead of text frames"
+    )
+    parser.add_argument(
+        "--per-message-deflate",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="negotiate permessage-deflate between clients and server",
+    )
+    parser.add_argument(
+        "--shards", type=int, default=1, help="Redis pub/sub reader connections"
+    )
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if args.rooms < 1 or args.clients < args.rooms:
+        parser.error("need at least one client per room")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        sys.stdout.write(json.dumps(report) + "\n")
+        return
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        sys.stdout.write(f"{key:<{width}}  {value}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import uuid
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.derivatives import derivative_key
+from app.models import ItemAttachment
+from app.workers.tasks import generate_derivatives
+from tests.utils.item import create_random_item
+from tests.utils.s3 import BUCKET, StoredObject, fake_r2_thread
+
+
+def _attachments_url(item_id: object) -> str:
+    return f"{settings.API_V1_STR}/items/{item_id}/attachments/"
+
+
+def _upload_key(upload: dict[str, Any]) -> str:
+    return str(upload["upload_url"]).split("?")[0].split(f"/{BUCKET}/", 1)[1]
+
+
+def test_attachment_upload_flow(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with fake_r2_thread(client) as s3:
+        r = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "../My Report.pdf", "content_type": "application/pdf"},
+        )
+        assert r.status_code == 200
+        upload = r.json()
+        attachment = upload["attachment"]
+        assert upload["method"] == "PUT"
+        assert attachment["uploaded"] is False and attachment["url"] is None
+        assert "X-Amz-Signature=" in upload["upload_url"]
+        key = (
+            f"users/{item.owner_id}/items/{item.id}/attachments/"
+            f"{attachment['id']}/My_Report.pdf"
+        )
+        assert upload["upload_url"].split("?")[0].endswith(f"/{BUCKET}/{key}")
+
+        # the bytes go straight to storage, not through the API
+        put = httpx.put(
+            upload["upload_url"], content=b"%PDF-1.7", headers=upload["headers"]
+        )
+        assert put.status_code == 200
+        assert s3.objects[(BUCKET, key)].body == b"%PDF-1.7"
+
+        r = client.post(
+            f"{_attachments_url(item.id)}{attachment['id']}/complete",
+            headers=superuser_token_headers,
+        )
+        assert r.status_code == 200
+        completed = r.json()
+        assert completed["uploaded"] is True
+        assert completed["size"] == 8
+        assert completed["content_type"] == "application/pdf"
+
+        r = client.get(_attachments_url(item.id), headers=superuser_token_headers)
+        assert r.status_code == 200
+        listing = r.json()
+        assert listing["count"] == 1
+        assert httpx.get(listing["data"][0]["url"]).content == b"%PDF-1.7"
+
+        r = client.delete(
+            f"{settings.API_V1_STR}/items/{item.id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 200
+        assert s3.objects == {}
+
+
+def test_download_attachment_file(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with fake_r2_thread(client):
+        upload = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "notes.txt", "content_type": "text/plain"},
+        ).json()
+        file_url = f"{_attachments_url(item.id)}{upload['attachment']['id']}/file"
+        r = client.get(file_url, headers=superuser_token_headers)
+        assert r.status_code == 404
+
+        httpx.put(
+            upload["upload_url"], content=b"0123456789", headers=upload["headers"]
+        )
+        client.post(
+            f"{_attachments_url(item.id)}{upload['attachment']['id']}/complete",
+            headers=superuser_token_headers,
+        )
+        r = client.get(file_url, headers=superuser_token_headers)
+        assert r.status_code == 200
+        assert r.content == b"0123456789"
+        assert r.headers["content-type"].startswith("text/plain")
+        assert r.headers["content-disposition"] == 'attachment; filename="notes.txt"'
+
+        r = client.get(
+            file_url, headers={**superuser_token_headers, "Range": "bytes=2-4"}
+        )
+        assert r.status_code == 206
+        assert r.content == b"234"
+        assert r.headers["content-range"] == "bytes 2-4/10"
+
+
+def test_attachment_downloads_are_cached(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    tmp_path: Path,
+) -> None:
+    item = create_random_item(db)
+    with (
+        fake_r2_thread(client) as s3,
+        patch.object(settings, "R2_CACHE_DIR", str(tmp_path)),
+    ):
+        upload = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "photo.png", "content_type": "image/png"},
+        ).json()
+        attachment_id = upload["attachment"]["id"]
+        httpx.put(upload["upload_url"], content=b"png", headers=upload["headers"])
+        with patch.object(generate_derivatives, "apply_async"):
+            client.post(
+                f"{_attachments_url(item.id)}{attachment_id}/complete",
+                headers=superuser_token_headers,
+            )
+        file_url = f"{_attachments_url(item.id)}{attachment_id}/file"
+        for _ in range(2):
+            r = client.get(file_url, headers=superuser_token_headers)
+            assert r.status_code == 200 and r.content == b"png"
+        assert s3.requests.count(("GET", _upload_key(upload))) == 1
+
+        derivative_url = f"{_attachments_url(item.id)}{attachment_id}/derivatives/"
+        r = client.get(f"{derivative_url}thumbnail", headers=superuser_token_headers)
+        assert r.status_code == 404
+        # what the worker stores and records for the image
+        s3.objects[(BUCKET, derivative_key("ab" * 32, "thumbnail"))] = StoredObject(
+            b"webp", "image/webp"
+        )
+        attachment = db.get(ItemAttachment, uuid.UUID(attachment_id))
+        assert attachment
+        attachment.sha256 = "ab" * 32
+        db.add(attachment)
+        db.commit()
+        r = client.get(f"{derivative_url}thumbnail", headers=superuser_token_headers)
+        assert r.status_code == 200 and r.content == b"webp"
+        assert r.headers["content-type"] == "image/webp"
+        assert "immutable" in r.headers["cache-control"]
+        r = client.get(
+            f"{derivative_url}thumbnail",
+            headers={**superuser_token_headers, "If-None-Match": r.headers["etag"]},
+        )
+        assert r.status_code == 304
+        r = client.get(f"{derivative_url}poster", headers=superuser_token_headers)
+        assert r.status_code == 404
+
+
+def test_image_attachments_get_derivatives(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with fake_r2_thread(client):
+        upload = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "photo.png", "content_type": "image/png"},
+        ).json()
+        attachment_id = upload["attachment"]["id"]
+        httpx.put(upload["upload_url"], content=b"png", headers=upload["headers"])
+        with patch.object(generate_derivatives, "apply_async") as apply_async:
+            r = client.post(
+                f"{_attachments_url(item.id)}{attachment_id}/complete",
+                headers=superuser_token_headers,
+            )
+        assert r.status_code == 200
+        assert r.json()["derivatives"] == {}
+        assert apply_async.call_args.args == ((attachment_id,),)
+
+        # what the worker records once the derivatives are stored
+        attachment = db.get(ItemAttachment, uuid.UUID(attachment_id))
+        assert attachment
+        attachment.sha256 = "ab" * 32
+        db.add(attachment)
+        db.commit()
+        r = client.get(
+            f"{_attachments_url(item.id)}{attachment_id}",
+            headers=superuser_token_headers,
+        )
+        derivatives = r.json()["derivatives"]
+        assert set(derivatives) == {"thumbnail", "preview"}
+        assert derivative_key("ab" * 32, "thumbnail") in derivatives["thumbnail"]
+
+
+def test_complete_attachment_checks_the_upload(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with fake_r2_thread(client) as s3:
+        r = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "notes.txt"},
+        )
+        upload = r.json()
+        complete_url = (
+            f"{_attachments_url(item.id)}{upload['attachment']['id']}/complete"
+        )
+        r = client.post(complete_url, headers=superuser_token_headers)
+        assert r.status_code == 400
+        assert r.json()["detail"] == "File has not been uploaded"
+
+        httpx.put(upload["upload_url"], content=b"too large")
+        with patch.object(settings, "R2_ATTACHMENT_MAX_BYTES", 4):
+            r = client.post(complete_url, headers=superuser_token_headers)
+        assert r.status_code == 413
+        assert s3.objects == {}
+
+        r = client.get(_attachments_url(item.id), headers=superuser_token_headers)
+        assert r.json() == {"data": [], "count": 0}
+
+
+def test_attachments_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with fake_r2_thread(client):
+        r = client.post(
+            _attachments_url(item.id),
+            headers=normal_user_token_headers,
+            json={"filename": "notes.txt"},
+        )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Not enough permissions"
+
+
+def test_create_attachment_without_storage(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with patch.object(settings, "R2_ENABLED", False):
+        r = client.post(
+            _attachments_url(item.id),
+            headers=superuser_token_headers,
+            json={"filename": "notes.txt"},
+        )
+    assert r.status_code == 503
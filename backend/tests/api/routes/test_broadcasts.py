@@ -0,0 +1,90 @@
+import uuid
+from collections.abc import Generator
+from unittest.mock import patch
+
+import pytest
+from fakeredis import FakeRedis
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.main import app
+from app.workers.broadcast import get_progress
+from app.workers.tasks import fan_out_broadcast
+
+
+@pytest.fixture
+def redis() -> Generator[FakeRedis, None, None]:
+    client = FakeRedis(decode_responses=True)
+    app.dependency_overrides[get_sync_redis] = lambda: client
+    yield client
+    app.dependency_overrides.pop(get_sync_redis)
+
+
+def test_create_broadcast(
+    client: TestClient, superuser_token_headers: dict[str, str], redis: FakeRedis
+) -> None:
+    with (
+        patch.object(fan_out_broadcast, "apply_async") as apply_async,
+        patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
+        patch("app.core.config.settings.EMAILS_FROM_EMAIL", "noreply@example.com"),
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/broadcasts/",
+            headers=superuser_token_headers,
+            json={"subject": "Maintenance", "message": "Down on Sunday."},
+        )
+    assert r.status_code == 202
+    content = r.json()
+    assert content["status"] == "queued"
+    assert apply_async.call_args.args == (
+        (content["id"], "Maintenance", "Down on Sunday."),
+    )
+    progress = get_progress(redis, content["id"])
+    assert progress is not None
+    assert progress.subject == "Maintenance"
+
+    r = client.get(
+        f"{settings.API_V1_STR}/broadcasts/{content['id']}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json() == content
+
+
+@pytest.mark.usefixtures("redis")
+def test_create_broadcast_without_emails(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with patch("app.core.config.settings.SMTP_HOST", None):
+        r = client.post(
+            f"{settings.API_V1_STR}/broadcasts/",
+            headers=superuser_token_headers,
+            json={"subject": "Maintenance", "message": "Down on Sunday."},
+        )
+    assert r.status_code == 503
+
+
+@pytest.mark.usefixtures("redis")
+def test_read_broadcast_not_found(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/broadcasts/{uuid.uuid4()}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
+
+
+@pytest.mark.usefixtures("redis")
+def test_broadcasts_require_superuser(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/broadcasts/",
+        headers=normal_user_token_headers,
+        json={"subject": "Maintenance", "message": "Down on Sunday."},
+    )
+    assert r.status_code == 403
@@ -1,3 +1,4 @@
+import json
 import uuid
 
 from fastapi.testclient import TestClient
@@ -162,3 +163,50 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_item_changes_publish_events(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    manager = client.app.state.ws_manager  # type: ignore[attr-defined]
+    everything = manager.subscribe("items")
+    try:
+        response = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": "Watched"},
+        )
+        item = response.json()
+        own = manager.subscribe(f"items:{item['owner_id']}")
+        try:
+            client.put(
+                f"{settings.API_V1_STR}/items/{item['id']}",
+                headers=normal_user_token_headers,
+                json={"title": "Renamed"},
+            )
+            client.delete(
+                f"{settings.API_V1_STR}/items/{item['id']}",
+                headers=normal_user_token_headers,
+            )
+            own_events = [json.loads(own.get_nowait()) for _ in range(own.qsize())]
+        finally:
+            manager.unsubscribe(f"items:{item['owner_id']}", own)
+        all_events = [
+            json.loads(everything.get_nowait()) for _ in range(everything.qsize())
+        ]
+    finally:
+        manager.unsubscribe("items", everything)
+
+    assert [(e["type"], e["id"]) for e in all_events] == [
+        ("item.created", item["id"]),
+        ("item.updated", item["id"]),
+        ("item.deleted", item["id"]),
+    ]
+    assert all_events[1]["data"]["title"] == "Renamed"
+    assert all_events[2]["data"] is None
+    assert own_events == all_events[1:]
+
+
+def test_item_events_stream_requires_auth(client: TestClient) -> None:
+    response = client.get(f"{settings.API_V1_STR}/items/events")
+    assert response.status_code == 401
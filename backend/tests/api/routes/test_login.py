@@ -7,7 +7,8 @@ from app.core.config import settings
 from app.core.security import verify_password
 from app.crud import create_user
 from app.models import UserCreate
-from app.utils import generate_password_reset_token
+from app.utils import generate_password_reset_token, verify_password_reset_token
+from app.workers.tasks import send_reset_password_email
 from tests.utils.user import user_authentication_headers
 from tests.utils.utils import random_email, random_lower_string
 
@@ -51,6 +52,7 @@ def test_recovery_password(
     with (
         patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
         patch("app.core.config.settings.SMTP_USER", "admin@example.com"),
+        patch.object(send_reset_password_email, "apply_async") as apply_async,
     ):
         email = "test@example.com"
         r = client.post(
@@ -59,6 +61,9 @@ def test_recovery_password(
         )
         assert r.status_code == 200
         assert r.json() == {"message": "Password recovery email sent"}
+        email_to, _email, token = apply_async.call_args.args[0]
+        assert email_to == email
+        assert verify_password_reset_token(token) == email
 
 
 def test_recovery_password_user_not_exits(
@@ -6,8 +6,12 @@ from sqlmodel import Session, select
 
 from app import crud
 from app.core.config import settings
+from app.core.r2 import user_prefix
 from app.core.security import verify_password
 from app.models import User, UserCreate
+from app.utils import verify_password_reset_token
+from app.workers.tasks import send_welcome_email
+from tests.utils.s3 import BUCKET, StoredObject, fake_r2_thread
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -37,7 +41,8 @@ def test_create_user_new_email(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     with (
-        patch("app.utils.send_email", return_value=None),
+        patch("app.utils.send_email", return_value=None) as send_email,
+        patch.object(send_welcome_email, "apply_async") as apply_async,
         patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
         patch("app.core.config.settings.SMTP_USER", "admin@example.com"),
     ):
@@ -54,6 +59,13 @@ def test_create_user_new_email(
         user = crud.get_user_by_email(session=db, email=username)
         assert user
         assert user.email == created_user["email"]
+        # sent by a worker, not during the request, with a link to set the
+        # password instead of the password
+        (email_to, email, token), = apply_async.call_args.args
+        assert email_to == email == username
+        assert password not in str(apply_async.call_args)
+        assert verify_password_reset_token(token) == username
+        send_email.assert_not_called()
 
 
 def test_get_existing_user(
@@ -444,6 +456,27 @@ def test_delete_user_super_user(
     assert result is None
 
 
+def test_delete_user_removes_stored_files(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    other = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    with fake_r2_thread(client) as s3:
+        for owner in (user, other):
+            key = f"{user_prefix(owner.id)}avatar.png"
+            s3.objects[(BUCKET, key)] = StoredObject(b"png")
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user.id}",
+            headers=superuser_token_headers,
+        )
+        assert r.status_code == 200
+        assert list(s3.objects) == [(BUCKET, f"{user_prefix(other.id)}avatar.png")]
+
+
 def test_delete_user_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -0,0 +1,62 @@
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.metrics import Metric, MetricsRegistry
+from app.workers.tasks import send_test_email
+
+
+def test_metrics_registry_renders_prometheus_text() -> None:
+    registry = MetricsRegistry()
+
+    async def pending() -> list[Metric]:
+        return [Metric("jobs", "gauge", "Pending jobs").add(2, queue='a"b')]
+
+    registry.register(lambda: [Metric("hits_total", "counter", "Hits").add(3)])
+    registry.register(pending)
+    registry.register(lambda: [Metric("jobs", "gauge", "Pending jobs").add(1, queue="c")])
+    assert asyncio.run(registry.render()) == (
+        "# HELP hits_total Hits\n"
+        "# TYPE hits_total counter\n"
+        "hits_total 3\n"
+        "# HELP jobs Pending jobs\n"
+        "# TYPE jobs gauge\n"
+        'jobs{queue="a\\"b"} 2\n'
+        'jobs{queue="c"} 1\n'
+    )
+
+
+def test_metrics_endpoint(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/utils/metrics/", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE ws_connections gauge" in response.text
+    assert 'ws_pubsub_rooms{shard="0"}' in response.text
+
+
+def test_metrics_endpoint_requires_superuser(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/utils/metrics/", headers=normal_user_token_headers
+    )
+    assert response.status_code == 403
+
+
+def test_test_email_is_queued(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with patch.object(send_test_email, "apply_async") as apply_async:
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": "someone@example.com"},
+        )
+    assert r.status_code == 201
+    assert apply_async.call_args.args == (("someone@example.com",),)
@@ -0,0 +1,126 @@
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import settings
+
+
+def _token(headers: dict[str, str]) -> str:
+    return headers["Authorization"].split(" ", 1)[1]
+
+
+def test_read_room_presence(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    token = _token(normal_user_token_headers)
+    with client.websocket_connect(
+        f"{settings.API_V1_STR}/ws/presence-room?token={token}"
+    ):
+        r = client.get(
+            f"{settings.API_V1_STR}/ws/presence-room/presence",
+            headers=normal_user_token_headers,
+        )
+    assert r.status_code == 200
+    assert r.json() == {"room": "presence-room", "count": 1}
+
+
+def test_read_room_presence_requires_auth(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/ws/presence-room/presence")
+    assert r.status_code == 401
+
+
+def test_read_private_room_presence_forbidden(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/ws/user:{uuid.uuid4()}/presence",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_websocket_echoes_to_room(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/ws/echo-room?token={_token(normal_user_token_headers)}"
+    with client.websocket_connect(url) as first, client.websocket_connect(url) as second:
+        first.send_text("hello")
+        assert first.receive_text() == "hello"
+        assert second.receive_text() == "hello"
+
+
+def test_websocket_relays_binary_frames(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/ws/binary-room?token={_token(normal_user_token_headers)}"
+    with client.websocket_connect(url) as first, client.websocket_connect(url) as second:
+        first.send_bytes(b"\x00\x01\x02")
+        assert first.receive_bytes() == b"\x00\x01\x02"
+        assert second.receive_bytes() == b"\x00\x01\x02"
+
+
+def _close_code(client: TestClient, url: str) -> int:
+    # the handshake is accepted (a rejected one raises on connect), then the
+    # socket is closed with a code
+    with client.websocket_connect(url) as ws:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_text()
+    return exc.value.code
+
+
+def test_websocket_rejects_missing_token(client: TestClient) -> None:
+    assert _close_code(client, f"{settings.API_V1_STR}/ws/some-room") == 1008
+
+
+def test_websocket_rejects_invalid_token(client: TestClient) -> None:
+    url = f"{settings.API_V1_STR}/ws/some-room?token=invalid"
+    assert _close_code(client, url) == 1008
+
+
+def test_websocket_private_room_of_other_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    token = _token(normal_user_token_headers)
+    url = f"{settings.API_V1_STR}/ws/user:{uuid.uuid4()}?token={token}"
+    assert _close_code(client, url) == 1008
+
+
+def test_websocket_private_room_superuser(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    token = _token(superuser_token_headers)
+    with client.websocket_connect(
+        f"{settings.API_V1_STR}/ws/user:{uuid.uuid4()}?token={token}"
+    ) as ws:
+        ws.send_text("hi")
+        assert ws.receive_text() == "hi"
+
+
+def test_websocket_per_user_connection_cap(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    manager = client.app.state.ws_manager  # type: ignore[attr-defined]
+    url = f"{settings.API_V1_STR}/ws/cap-room?token={_token(normal_user_token_headers)}"
+    previous = manager.max_connections_per_user
+    manager.max_connections_per_user = 1
+    try:
+        for _ in range(100):
+            # sockets from earlier tests may still be closing
+            if not manager.connection_count:
+                break
+            time.sleep(0.01)
+        with client.websocket_connect(url):
+            assert _close_code(client, url) == 1013
+        for _ in range(100):
+            if not manager.connection_count:
+                break
+            time.sleep(0.01)
+        # the slot is released once the first socket disconnects
+        with client.websocket_connect(url) as ws:
+            ws.send_text("again")
+            assert ws.receive_text() == "again"
+    finally:
+        manager.max_connections_per_user = previous
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from app.api.change_capture import ChangeCapture, change_messages
+from app.api.websocket_manager import WebSocketManager
+
+
+def test_item_change_maps_to_owner_and_items_rooms() -> None:
+    payload = json.dumps({"t": "item", "op": "u", "id": "i1", "o": "u1"})
+    messages = change_messages(payload)
+    assert [room for room, _ in messages] == ["items:u1", "items"]
+    assert json.loads(messages[0][1]) == {
+        "type": "item.updated",
+        "id": "i1",
+        "owner_id": "u1",
+        "data": None,
+    }
+
+
+def test_user_change_maps_to_user_room() -> None:
+    messages = change_messages(json.dumps({"t": "user", "op": "d", "id": "u1"}))
+    assert messages == [("user:u1", '{"type": "user.deleted", "id": "u1"}')]
+
+
+def test_malformed_and_unknown_changes_are_ignored() -> None:
+    assert change_messages("not json") == []
+    assert change_messages(json.dumps({"t": "item", "op": "x", "id": "i1"})) == []
+    assert change_messages(json.dumps({"t": "other", "op": "i", "id": 1})) == []
+
+
+def test_dispatch_delivers_locally_only() -> None:
+    class RecordingRedis:
+        def __init__(self) -> None:
+            self.published: list[str] = []
+
+        async def publish(self, channel: str, message: bytes) -> None:
+            self.published.append(channel)
+
+    async def scenario() -> tuple[list[object], list[str]]:
+        redis = RecordingRedis()
+        manager = WebSocketManager(redis)
+        queue = manager.subscribe("items")
+        capture = ChangeCapture(manager, dsn="")
+        await capture._dispatch(json.dumps({"t": "item", "op": "i", "id": "i1", "o": "u1"}))
+        return [queue.get_nowait()], redis.published
+
+    received, published = asyncio.run(scenario())
+    assert json.loads(received[0])["type"] == "item.created"  # type: ignore[arg-type]
+    assert published == []
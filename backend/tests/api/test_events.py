@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any
+
+from app.api.events import sse_stream
+from app.api.websocket_manager import WebSocketManager
+
+
+class FakeRequest:
+    def __init__(self) -> None:
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+def test_sse_stream_yields_room_messages() -> None:
+    async def scenario() -> tuple[list[str], dict[str, Any]]:
+        manager = WebSocketManager(None)
+        request = FakeRequest()
+        stream = sse_stream(request, manager, "items", keepalive=0.01)  # type: ignore[arg-type]
+        chunks = [await stream.__anext__()]
+        await manager._broadcast_to_local("items", '{"type": "item.created"}')
+        chunks.append(await stream.__anext__())
+        chunks.append(await stream.__anext__())  # idle: keep-alive comment
+        request.disconnected = True
+        chunks.extend([chunk async for chunk in stream])
+        return chunks, manager._listeners
+
+    chunks, listeners = asyncio.run(scenario())
+    assert chunks == [
+        "retry: 3000\n\n",
+        'data: {"type": "item.created"}\n\n',
+        ": keep-alive\n\n",
+    ]
+    assert listeners == {}
+
+
+def test_slow_listener_is_cut_off() -> None:
+    async def scenario() -> list[Any]:
+        manager = WebSocketManager(None)
+        queue = manager.subscribe("room")
+        for i in range(queue.maxsize + 1):
+            await manager._broadcast_to_local("room", str(i))
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    received = asyncio.run(scenario())
+    assert received[-1] is None
+    assert received[:-1] == [str(i) for i in range(1, len(received))]
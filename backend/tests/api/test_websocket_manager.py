@@ -0,0 +1,299 @@
+import asyncio
+import json
+from collections import Counter
+from typing import Any
+
+import msgpack
+from fakeredis import aioredis as fakeredis
+
+from app.api.pubsub_shards import HashRing
+from app.api.websocket_manager import (
+    BATCH_MSGPACK_SUBPROTOCOL,
+    BATCH_SUBPROTOCOL,
+    WebSocketManager,
+)
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocols: list[str] | None = None) -> None:
+        self.scope: dict[str, Any] = {"subprotocols": subprotocols or []}
+        self.accepted_subprotocol: str | None = None
+        self.sent: list[str | bytes] = []
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        self.accepted_subprotocol = subprotocol
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent.append(data)
+
+
+def test_batched_clients_receive_coalesced_frames() -> None:
+    async def scenario() -> tuple[FakeWebSocket, FakeWebSocket]:
+        manager = WebSocketManager(None, batch_window_ms=20)
+        plain = FakeWebSocket()
+        batched = FakeWebSocket([BATCH_SUBPROTOCOL])
+        await manager.connect(plain, "room")  # type: ignore[arg-type]
+        await manager.connect(batched, "room")  # type: ignore[arg-type]
+        for i in range(3):
+            await manager._broadcast_to_local("room", f"m{i}")
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return plain, batched
+
+    plain, batched = asyncio.run(scenario())
+    assert plain.accepted_subprotocol is None
+    assert plain.sent == ["m0", "m1", "m2"]
+    assert batched.accepted_subprotocol == BATCH_SUBPROTOCOL
+    assert [json.loads(frame) for frame in batched.sent] == [["m0", "m1", "m2"]]
+
+
+def test_msgpack_batches_carry_binary_messages() -> None:
+    async def scenario() -> tuple[FakeWebSocket, FakeWebSocket]:
+        manager = WebSocketManager(None, batch_window_ms=20)
+        as_json = FakeWebSocket([BATCH_SUBPROTOCOL])
+        as_msgpack = FakeWebSocket([BATCH_MSGPACK_SUBPROTOCOL])
+        await manager.connect(as_json, "room")  # type: ignore[arg-type]
+        await manager.connect(as_msgpack, "room")  # type: ignore[arg-type]
+        await manager._broadcast_to_local("room", "text")
+        await manager._broadcast_to_local("room", b"\x00\x01")
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return as_json, as_msgpack
+
+    as_json, as_msgpack = asyncio.run(scenario())
+    # JSON batches only hold text, binary is sent on its own
+    assert as_json.sent == [b"\x00\x01", '["text"]']
+    assert len(as_msgpack.sent) == 1
+    assert msgpack.unpackb(as_msgpack.sent[0]) == ["text", b"\x00\x01"]
+
+
+def test_batching_disabled_ignores_subprotocol() -> None:
+    async def scenario() -> FakeWebSocket:
+        manager = WebSocketManager(None)
+        ws = FakeWebSocket([BATCH_SUBPROTOCOL])
+        await manager.connect(ws, "room")  # type: ignore[arg-type]
+        await manager._broadcast_to_local("room", "hello")
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert ws.accepted_subprotocol is None
+    assert ws.sent == ["hello"]
+
+
+def test_durable_room_replays_missed_messages() -> None:
+    async def scenario() -> tuple[list[str], FakeWebSocket]:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        manager = WebSocketManager(redis, durable_prefixes=["doc:"])
+        for i in range(3):
+            await manager.publish("doc:1", f"m{i}")
+        entries = await redis.xrange("ws:stream:doc:1")
+        ids = [event_id for event_id, _ in entries]
+        ws = FakeWebSocket()
+        await manager.connect(ws, "doc:1", last_event_id=ids[0])  # type: ignore[arg-type]
+        return ids, ws
+
+    ids, ws = asyncio.run(scenario())
+    assert [json.loads(frame) for frame in ws.sent] == [
+        {"id": ids[1], "data": "m1"},
+        {"id": ids[2], "data": "m2"},
+    ]
+
+
+def test_messages_published_while_connecting_are_sent_once() -> None:
+    async def scenario() -> tuple[list[str], FakeWebSocket]:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        manager = WebSocketManager(redis, durable_prefixes=["doc:"])
+        await manager.publish("doc:3", "missed")
+        sync_room = manager._sync_room
+
+        async def publish_while_subscribing(room: str) -> None:
+            # another client publishes once the socket is in the room but
+            # before the replay has read the stream
+            await manager.publish(room, "during connect")
+            await sync_room(room)
+
+        manager._sync_room = publish_while_subscribing  # type: ignore[method-assign]
+        ws = FakeWebSocket()
+        await manager.connect(ws, "doc:3", last_event_id="0-0")  # type: ignore[arg-type]
+        await manager.publish("doc:3", "after")
+        entries = await redis.xrange("ws:stream:doc:3")
+        return [event_id for event_id, _ in entries], ws
+
+    ids, ws = asyncio.run(scenario())
+    assert [json.loads(frame) for frame in ws.sent] == [
+        {"id": ids[0], "data": "missed"},
+        {"id": ids[1], "data": "during connect"},
+        {"id": ids[2], "data": "after"},
+    ]
+
+
+def test_replay_reads_past_one_batch() -> None:
+    async def scenario() -> FakeWebSocket:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        manager = WebSocketManager(redis, durable_prefixes=["doc:"], stream_maxlen=2)
+        # more entries than one read returns, as approximate trimming allows
+        for i in range(5):
+            await redis.xadd("ws:stream:doc:4", {"data": f"m{i}"}, id=f"{i + 1}-0")
+        ws = FakeWebSocket()
+        await manager.connect(ws, "doc:4", last_event_id="0-0")  # type: ignore[arg-type]
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert [json.loads(frame) for frame in ws.sent] == [
+        {"id": f"{i + 1}-0", "data": f"m{i}"} for i in range(5)
+    ]
+
+
+def test_durable_room_reports_gap_after_trim() -> None:
+    async def scenario() -> FakeWebSocket:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        manager = WebSocketManager(redis, durable_prefixes=["doc:"])
+        await redis.xadd("ws:stream:doc:2", {"data": "kept"}, id="200-0")
+        ws = FakeWebSocket()
+        await manager.connect(ws, "doc:2", last_event_id="100-0")  # type: ignore[arg-type]
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert [json.loads(frame) for frame in ws.sent] == [
+        {"gap": True},
+        {"id": "200-0", "data": "kept"},
+    ]
+
+
+def test_presence_counts_rooms_across_instances() -> None:
+    async def scenario() -> tuple[int, int, int]:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        first = WebSocketManager(redis, presence_ttl=30)
+        second = WebSocketManager(redis, presence_ttl=30)
+        for manager in (first, second):
+            await manager.presence.heartbeat()  # type: ignore[union-attr]
+        sockets = [FakeWebSocket() for _ in range(3)]
+        await first.connect(sockets[0], "lobby")  # type: ignore[arg-type]
+        await first.connect(sockets[1], "lobby")  # type: ignore[arg-type]
+        await second.connect(sockets[2], "lobby")  # type: ignore[arg-type]
+        together = await first.room_occupancy("lobby")
+        await first.disconnect(sockets[1], "lobby")  # type: ignore[arg-type]
+        after_leave = await second.room_occupancy("lobby")
+        # `second` stops heartbeating and is reaped by `first`
+        await redis.zadd("ws:presence:instances", {second.instance_id: 0})
+        await first.presence.heartbeat()  # type: ignore[union-attr]
+        after_reap = await first.room_occupancy("lobby")
+        return together, after_leave, after_reap
+
+    assert asyncio.run(scenario()) == (3, 2, 1)
+
+
+def test_presence_of_a_dead_instance_is_always_reaped() -> None:
+    async def scenario() -> tuple[int, int, int]:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        first = WebSocketManager(redis, presence_ttl=30)
+        second = WebSocketManager(redis, presence_ttl=30)
+        await first.connect(FakeWebSocket(), "lobby")  # type: ignore[arg-type]
+        # `second` was reaped during a pause but still has sockets joining
+        await second.connect(FakeWebSocket(), "lobby")  # type: ignore[arg-type]
+        await redis.zadd("ws:presence:instances", {second.instance_id: 0})
+        await first.presence.heartbeat()  # type: ignore[union-attr]
+        await second.connect(FakeWebSocket(), "lobby")  # type: ignore[arg-type]
+        # its counts never expire before a reaper reads them
+        key_ttl = await redis.ttl(f"ws:presence:instance:{second.instance_id}")
+        before_reap = await first.room_occupancy("lobby")
+        # and joining listed it again, so it is reaped once it stops
+        await redis.zadd("ws:presence:instances", {second.instance_id: 0}, xx=True)
+        await first.presence.heartbeat()  # type: ignore[union-attr]
+        return key_ttl, before_reap, await first.room_occupancy("lobby")
+
+    assert asyncio.run(scenario()) == (-1, 2, 1)
+
+
+def test_publish_delivers_locally_and_skips_own_echo() -> None:
+    async def scenario() -> tuple[FakeWebSocket, FakeWebSocket]:
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        first = WebSocketManager(redis)
+        second = WebSocketManager(redis)
+        await first.start()
+        await second.start()
+        local = FakeWebSocket()
+        remote = FakeWebSocket()
+        await first.connect(local, "room")  # type: ignore[arg-type]
+        await second.connect(remote, "room")  # type: ignore[arg-type]
+        await first.publish("room", "hello")
+        # delivered before the message went through Redis
+        assert local.sent == ["hello"]
+        for _ in range(50):
+            if remote.sent:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await first.stop()
+        await second.stop()
+        return local, remote
+
+    local, remote = asyncio.run(scenario())
+    assert local.sent == ["hello"]
+    assert remote.sent == ["hello"]
+
+
+def test_binary_messages_relayed_between_instances() -> None:
+    async def scenario() -> FakeWebSocket:
+        redis = fakeredis.FakeRedis()
+        first = WebSocketManager(redis)
+        second = WebSocketManager(redis)
+        await second.start()
+        remote = FakeWebSocket()
+        await second.connect(remote, "room")  # type: ignore[arg-type]
+        await first.publish("room", b"\xff\x00binary")
+        await first.publish("room", "tëxt")
+        for _ in range(50):
+            if len(remote.sent) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await second.stop()
+        return remote
+
+    remote = asyncio.run(scenario())
+    assert remote.sent == [b"\xff\x00binary", "tëxt"]
+
+
+def test_hash_ring_spreads_rooms_and_moves_few_on_resize() -> None:
+    rooms = [f"room-{i}" for i in range(2000)]
+    four = HashRing(4)
+    five = HashRing(5)
+    counts = Counter(four.shard_for(room) for room in rooms)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(rooms) / 4 * 0.6
+    moved = sum(four.shard_for(room) != five.shard_for(room) for room in rooms)
+    # ideally 1/5 of the rooms move to the new shard
+    assert moved < len(rooms) * 0.3
+
+
+def test_sharded_readers_subscribe_per_room() -> None:
+    async def scenario() -> tuple[list[FakeWebSocket], list[dict], list[set[str]]]:
+        redis = fakeredis.FakeRedis()
+        first = WebSocketManager(redis)
+        second = WebSocketManager(redis, pubsub_shards=4)
+        await second.start()
+        sockets = [FakeWebSocket() for _ in range(8)]
+        for i, ws in enumerate(sockets):
+            await second.connect(ws, f"room-{i}")  # type: ignore[arg-type]
+        for i in range(8):
+            await first.publish(f"room-{i}", f"m{i}")
+        for _ in range(50):
+            if all(ws.sent for ws in sockets):
+                break
+            await asyncio.sleep(0.01)
+        stats = [shard.stats() for shard in second._shards]
+        for i, ws in enumerate(sockets):
+            await second.disconnect(ws, f"room-{i}")  # type: ignore[arg-type]
+        rooms_left = [set(shard.rooms) for shard in second._shards]
+        await second.stop()
+        return sockets, stats, rooms_left
+
+    sockets, stats, rooms_left = asyncio.run(scenario())
+    assert [ws.sent for ws in sockets] == [[f"m{i}"] for i in range(8)]
+    assert sum(s["rooms"] for s in stats) == 8
+    assert sum(s["messages"] for s in stats) == 8
+    assert sum(1 for s in stats if s["rooms"]) > 1
+    assert rooms_left == [set(), set(), set(), set()]
@@ -7,6 +7,7 @@ from sqlmodel import Session, delete
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
+from app.middlewares.rate_limiter import RateLimiterMiddleware
 from app.models import Item, User
 from tests.utils.user import authentication_token_from_email
 from tests.utils.utils import get_superuser_token_headers
@@ -24,6 +25,17 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limit() -> None:
+    # every TestClient request comes from the same address, so the whole
+    # suite would otherwise share one per-minute budget
+    layer = app.middleware_stack
+    while layer is not None:
+        if isinstance(layer, RateLimiterMiddleware):
+            layer.requests.clear()
+        layer = getattr(layer, "app", None)
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from app.core.derivatives import (
+    DerivativeError,
+    derivative_key,
+    generate_derivatives,
+)
+from app.core.r2 import upload_bytes
+from tests.utils.s3 import BUCKET, fake_r2
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(out, "PNG")
+    return out.getvalue()
+
+
+def test_derivatives_are_rendered_and_cached_by_content() -> None:
+    data = _png(2000, 1000)
+    digest = hashlib.sha256(data).hexdigest()
+
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            await upload_bytes("a.png", data, content_type="image/png")
+            assert await generate_derivatives("a.png") == digest
+            thumbnail = s3.objects[(BUCKET, derivative_key(digest, "thumbnail"))]
+            assert thumbnail.content_type == "image/webp"
+            with Image.open(io.BytesIO(thumbnail.body)) as image:
+                assert image.format == "WEBP" and image.size == (256, 128)
+            preview = s3.objects[(BUCKET, derivative_key(digest, "preview"))]
+            with Image.open(io.BytesIO(preview.body)) as image:
+                assert image.size == (1280, 640)
+
+            # the same image under another key reuses them
+            await upload_bytes("b.png", data, content_type="image/png")
+            puts = len([r for r in s3.requests if r[0] == "PUT"])
+            assert await generate_derivatives("b.png") == digest
+            assert len([r for r in s3.requests if r[0] == "PUT"]) == puts
+
+    asyncio.run(scenario())
+
+
+def test_small_images_are_not_upscaled() -> None:
+    data = _png(100, 50)
+
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            await upload_bytes("small.png", data)
+            digest = await generate_derivatives("small.png")
+            thumbnail = s3.objects[(BUCKET, derivative_key(digest, "thumbnail"))]
+            with Image.open(io.BytesIO(thumbnail.body)) as image:
+                assert image.size == (100, 50)
+
+    asyncio.run(scenario())
+
+
+def test_corrupt_images_raise_derivative_error() -> None:
+    async def scenario() -> None:
+        async with fake_r2():
+            await upload_bytes("broken.png", b"\x89PNG not really")
+            with pytest.raises(DerivativeError):
+                await generate_derivatives("broken.png")
+
+    asyncio.run(scenario())
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import io
+import os
+import sys
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+import botocore.auth
+import httpx
+import pytest
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.r2 import (
+    R2Client,
+    StreamingHasher,
+    copy_object,
+    delete_many,
+    delete_object,
+    delete_prefix,
+    download_bytes,
+    generate_presigned_url,
+    iter_object,
+    iter_objects,
+    object_response,
+    parse_range_header,
+    upload_bytes,
+    upload_stream,
+)
+from app.core.r2_presign import Presigner
+from tests.utils.s3 import BUCKET, StoredObject, fake_r2
+
+
+def test_helpers_share_one_client_and_connection() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            for i in range(5):
+                await upload_bytes(f"k{i}", b"data", content_type="text/plain")
+            assert await download_bytes("k0") == b"data"
+            await delete_object("k0")
+            client = await R2Client.get_client()
+            assert client is await R2Client.get_client()
+            url = await generate_presigned_url("k1", expires_in=60)
+            assert f"/{BUCKET}/k1?" in url
+            assert s3.objects[(BUCKET, "k1")].content_type == "text/plain"
+            assert (BUCKET, "k0") not in s3.objects
+            # sequential requests reuse the kept-alive connection
+            assert len(s3.peers) == 1
+
+    asyncio.run(scenario())
+
+
+def test_client_is_rebuilt_for_another_event_loop() -> None:
+    async def get_and_close() -> object:
+        client = await R2Client.get_client()
+        await R2Client.close()
+        return client
+
+    async def scenario() -> None:
+        async with fake_r2():
+            first = await R2Client.get_client()
+            # a different loop (e.g. a worker's asyncio.run) gets its own client
+            other = await asyncio.to_thread(asyncio.run, get_and_close())
+            assert other is not first
+            assert await R2Client.get_client() is first
+
+    asyncio.run(scenario())
+
+
+async def _chunks(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_upload_stream_uploads_parts_concurrently() -> None:
+    data = os.urandom(10_000)
+
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            s3.part_delay = 0.02
+            await upload_stream(
+                "big",
+                _chunks(data, 333),
+                content_type="application/pdf",
+                part_size=1000,
+                concurrency=3,
+            )
+            stored = s3.objects[(BUCKET, "big")]
+            assert stored.body == data
+            assert stored.content_type == "application/pdf"
+            assert s3.max_parts_in_flight == 3
+            assert [m for m, _ in s3.requests].count("PUT") == 10
+
+    asyncio.run(scenario())
+
+
+def test_upload_stream_reads_files_and_sends_small_sources_whole() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            await upload_stream("small", io.BytesIO(b"tiny"), part_size=1000)
+            assert s3.objects[(BUCKET, "small")].body == b"tiny"
+            assert s3.uploads == {} and ("PUT", "small") in s3.requests
+            await upload_stream("file", io.BytesIO(b"x" * 2500), part_size=1000)
+            assert s3.objects[(BUCKET, "file")].body == b"x" * 2500
+
+    asyncio.run(scenario())
+
+
+def test_upload_stream_aborts_on_failed_part() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            s3.fail_parts = {2}
+            with pytest.raises(ClientError):
+                await upload_stream("broken", _chunks(b"y" * 5000, 1000), part_size=1000)
+            assert (BUCKET, "broken") not in s3.objects
+            assert len(s3.aborted) == 1
+            assert s3.uploads == {}
+
+    asyncio.run(scenario())
+
+
+def test_iter_objects_follows_continuation_tokens() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            for i in range(2500):
+                s3.objects[(BUCKET, f"logs/{i:05}")] = StoredObject(b"x")
+            s3.objects[(BUCKET, "other")] = StoredObject(b"y")
+            keys = [obj["Key"] async for obj in iter_objects("logs/")]
+            assert keys == [f"logs/{i:05}" for i in range(2500)]
+            assert s3.requests.count(("LIST", "logs/")) == 3
+
+    asyncio.run(scenario())
+
+
+def test_delete_many_batches_and_reports_failures() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            keys = [f"k/{i}" for i in range(2100)]
+            for key in keys:
+                s3.objects[(BUCKET, key)] = StoredObject(b"x")
+            s3.fail_delete_keys = {"k/7"}
+            assert await delete_many(keys) == ["k/7"]
+            assert s3.delete_batches == 3
+            assert list(s3.objects) == [(BUCKET, "k/7")]
+
+    asyncio.run(scenario())
+
+
+def test_delete_prefix_only_touches_the_prefix() -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            for key in ("users/a/1", "users/a/2", "users/ab/1"):
+                s3.objects[(BUCKET, key)] = StoredObject(b"x")
+            assert await delete_prefix("users/a/") == []
+            assert list(s3.objects) == [(BUCKET, "users/ab/1")]
+            with pytest.raises(ValueError):
+                await delete_prefix("")
+
+    asyncio.run(scenario())
+
+
+def test_copy_object_copies_large_objects_in_parts(monkeypatch) -> None:
+    data = os.urandom(2500)
+    monkeypatch.setattr("app.core.r2.COPY_MAX_BYTES", 1000)
+
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            await upload_bytes("small", b"tiny")
+            await copy_object("small", "small-copy")
+            assert s3.objects[(BUCKET, "small-copy")].body == b"tiny"
+
+            await upload_bytes("big", data)
+            await copy_object("big", "big-copy", part_size=1000)
+            assert s3.objects[(BUCKET, "big-copy")].body == data
+            assert s3.uploads == {}
+
+    asyncio.run(scenario())
+
+
+def test_parse_range_header() -> None:
+    assert parse_range_header("bytes=0-99") == (0, 99)
+    assert parse_range_header("bytes=100-") == (100, None)
+    assert parse_range_header("bytes=-500") == (None, 500)
+    for value in (None, "", "items=0-1", "bytes=0-1,5-6", "bytes=5-1", "bytes=a-b", "bytes=-"):
+        assert parse_range_header(value) is None
+
+
+def test_object_response_streams_ranges() -> None:
+    data = bytes(range(256)) * 40
+    app = FastAPI()
+
+    @app.get("/file")
+    async def file(request: Request) -> StreamingResponse:
+        return await object_response(
+            "blob", request.headers.get("range"), chunk_size=1000
+        )
+
+    async def scenario() -> list[httpx.Response]:
+        async with fake_r2():
+            await upload_bytes("blob", data, content_type="image/png")
+            assert b"".join([c async for c in iter_object("blob", start=10, end=19)]) == data[10:20]
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+                return [
+                    await c.get("/file"),
+                    await c.get("/file", headers={"Range": "bytes=100-199"}),
+                    await c.get("/file", headers={"Range": "bytes=-10"}),
+                    await c.get("/file", headers={"Range": "bytes=999999-"}),
+                ]
+
+    full, part, suffix, unsatisfiable = asyncio.run(scenario())
+    assert full.status_code == 200
+    assert full.content == data
+    assert full.headers["content-length"] == str(len(data))
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-type"] == "image/png"
+    assert part.status_code == 206
+    assert part.content == data[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+    assert part.headers["content-length"] == "100"
+    assert suffix.content == data[-10:]
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(data)}"
+
+
+@pytest.mark.parametrize(
+    ("method", "operation", "key"),
+    [
+        ("GET", "get_object", "users/1/photo.png"),
+        ("PUT", "put_object", "odd key/ünïcode+(1)~!.txt"),
+    ],
+)
+def test_presigner_matches_botocore(
+    monkeypatch: pytest.MonkeyPatch, method: str, operation: str, key: str
+) -> None:
+    now = datetime(2024, 5, 17, 12, 30, 5, tzinfo=timezone.utc)
+    monkeypatch.setattr(botocore.auth, "get_current_datetime", lambda: now)
+    endpoint = "https://account.r2.cloudflarestorage.com"
+    client = boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        region_name="auto",
+        aws_access_key_id="AKID",
+        aws_secret_access_key="secret",
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    )
+    expected = client.generate_presigned_url(
+        operation, Params={"Bucket": "bucket", "Key": key}, ExpiresIn=900
+    )
+    signer = Presigner("AKID", "secret", endpoint)
+    assert signer.sign(method, "bucket", key, expires_in=900, now=now) == expected
+
+
+def test_presigned_urls_are_cached() -> None:
+    signer = Presigner("AKID", "secret", "https://r2.example.com")
+    first = signer.presign("GET", "bucket", "a")
+    assert signer.presign("GET", "bucket", "a") is first
+    assert signer.presign("PUT", "bucket", "a") != first
+    signer.cache_size = 1
+    signer.presign("GET", "bucket", "b")
+    assert list(signer._urls) == [("GET", "bucket", "b", 3600)]
+
+
+def test_presigned_url_cache_is_thread_safe() -> None:
+    signer = Presigner("AKID", "secret", "https://r2.example.com", cache_size=50)
+
+    def presign_many(worker: int) -> None:
+        for i in range(5000):
+            signer.presign("GET", "bucket", f"{(worker + i) % 60}")
+
+    # switch threads as often as possible to interleave cache updates
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            # re-raises whatever a thread ran into
+            list(pool.map(presign_many, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert len(signer._urls) == 50
+
+
+def test_streaming_hasher_passes_chunks_through() -> None:
+    data = os.urandom(5000)
+
+    async def scenario() -> list[bytes]:
+        hasher = StreamingHasher(io.BytesIO(data), chunk_size=1024)
+        chunks = [chunk async for chunk in hasher]
+        assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+        assert hasher.size == len(data)
+        return chunks
+
+    assert b"".join(asyncio.run(scenario())) == data
@@ -0,0 +1,130 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from app.core.r2 import get_r2_client, upload_bytes
+from app.core.r2_cache import R2DiskCache, cached_download, cached_response
+from tests.utils.s3 import BUCKET, fake_r2
+
+
+def _gets(requests: list[tuple[str, str]], key: str) -> int:
+    return requests.count(("GET", key))
+
+
+def test_hits_are_served_from_disk(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("app.core.config.settings.R2_CACHE_DIR", str(tmp_path))
+    data = bytes(range(256)) * 1000
+    app = FastAPI()
+
+    @app.get("/files/{key}")
+    async def file(key: str, request: Request) -> Response:
+        return await cached_response(
+            key,
+            request.headers.get("range"),
+            if_none_match=request.headers.get("if-none-match"),
+        )
+
+    async def scenario() -> tuple[list[httpx.Response], int]:
+        async with fake_r2() as s3:
+            await upload_bytes("avatar", data, content_type="image/png")
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+                full = await c.get("/files/avatar")
+                part = await c.get("/files/avatar", headers={"Range": "bytes=1000-1099"})
+                unchanged = await c.get(
+                    "/files/avatar", headers={"If-None-Match": full.headers["etag"]}
+                )
+                missing = await c.get("/files/missing")
+            assert await cached_download("avatar") == data
+            return [full, part, unchanged, missing], _gets(s3.requests, "avatar")
+
+    (full, part, unchanged, missing), downloads = asyncio.run(scenario())
+    assert full.status_code == 200
+    assert full.content == data
+    assert full.headers["content-type"] == "image/png"
+    assert full.headers["content-length"] == str(len(data))
+    assert part.status_code == 206
+    assert part.content == data[1000:1100]
+    assert part.headers["content-range"] == f"bytes 1000-1099/{len(data)}"
+    assert unchanged.status_code == 304
+    assert missing.status_code == 404
+    assert downloads == 1
+
+
+def test_stale_entries_are_revalidated(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        async with fake_r2() as s3:
+            cache = R2DiskCache(str(tmp_path), max_bytes=10_000, revalidate_after=0)
+            await upload_bytes("doc", b"v1")
+            assert (await cache.get("doc")).size == 2  # type: ignore[union-attr]
+            await cache.get("doc")
+            assert (cache.misses, cache.revalidations) == (1, 1)
+            await upload_bytes("doc", b"version 2")
+            entry, view = await cache.open("doc")  # type: ignore[misc]
+            assert view is not None and view[:] == b"version 2"
+            view.close()
+            assert cache.misses == 2 and cache.size == entry.size == 9
+            assert _gets(s3.requests, "doc") == 3
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        async with fake_r2():
+            cache = R2DiskCache(str(tmp_path), max_bytes=250, revalidate_after=60)
+            for key in ("a", "b", "c"):
+                await upload_bytes(key, key.encode() * 100)
+            await cache.get("a")
+            await cache.get("b")
+            await cache.get("a")  # "b" is now least recently used
+            await cache.get("c")
+            assert cache.size == 200 and cache.evictions == 1
+            await upload_bytes("big", b"x" * 1000)
+            assert await cache.get("big") is None
+            # the index is rebuilt from disk
+            reloaded = R2DiskCache(str(tmp_path), max_bytes=250, revalidate_after=60)
+            assert sorted(e.key for e in reloaded._entries.values()) == ["a", "c"]
+            assert reloaded.size == 200
+
+    asyncio.run(scenario())
+
+
+def test_entries_evicted_while_fetching(tmp_path: Path, monkeypatch) -> None:
+    async def scenario() -> None:
+        async with fake_r2():
+            cache = R2DiskCache(str(tmp_path), max_bytes=10_000, revalidate_after=0)
+            await upload_bytes("doc", b"v1")
+            await cache.get("doc")
+            name = cache._name(BUCKET, "doc")
+            client = await get_r2_client()
+
+            class EvictingClient:
+                async def get_object(self, **params: Any) -> Any:
+                    # another download evicts the entry while R2 answers
+                    cache._discard(name)
+                    cache._remove_files(name)
+                    return await client.get_object(**params)
+
+            async def evicting_client() -> EvictingClient:
+                return EvictingClient()
+
+            monkeypatch.setattr("app.core.r2_cache.get_r2_client", evicting_client)
+            # unchanged (304): downloaded again since the file is gone
+            entry, view = await cache.open("doc")  # type: ignore[misc]
+            assert view is not None and view[:] == b"v1"
+            view.close()
+            assert list(cache._entries.values()) == [entry] and cache.size == 2
+            # changed (200)
+            await upload_bytes("doc", b"version 2")
+            entry, view = await cache.open("doc")  # type: ignore[misc]
+            assert view is not None and view[:] == b"version 2"
+            view.close()
+            assert list(cache._entries.values()) == [entry] and cache.size == 9
+            assert sorted(p.name for p in tmp_path.iterdir()) == [name, f"{name}.json"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import socket
+
+import emails  # type: ignore
+
+from app.core.smtp import SMTPPool, get_smtp_pool, smtp_options
+from app.utils import EmailData, send_email, send_emails
+from tests.utils.smtp import local_smtp
+
+
+def message() -> emails.Message:
+    return emails.Message(subject="Hi", html="<p>Hi</p>", mail_from="a@example.com")
+
+
+def test_send_email_reuses_one_authenticated_connection() -> None:
+    with local_smtp() as server:
+        for i in range(20):
+            response = send_email(
+                email_to=f"user{i}@example.com", subject="Hi", html_content="<p>Hi</p>"
+            )
+            assert response.success
+    assert server.connections == 1
+    assert server.logins == 1
+    assert [m.rcpt_to for m in server.messages] == [
+        [f"user{i}@example.com"] for i in range(20)
+    ]
+
+
+def test_send_emails_sends_a_batch_in_order() -> None:
+    data = EmailData(html_content="<p>News</p>", subject="News")
+    with local_smtp() as server:
+        server.reply_to("gone@example.com", 550)
+        responses = send_emails(
+            [
+                ("first@example.com", data),
+                ("gone@example.com", data),
+                ("last@example.com", data),
+            ]
+        )
+    assert [r.status_code for r in responses] == [250, 550, 250]
+    assert [m.rcpt_to for m in server.messages] == [
+        ["first@example.com"],
+        ["last@example.com"],
+    ]
+    assert server.connections == 1
+
+
+def test_connections_are_recycled_after_max_messages() -> None:
+    with local_smtp() as server:
+        pool = SMTPPool(smtp_options(), max_messages=5)
+        responses = pool.send_many(
+            (message(), f"user{i}@example.com") for i in range(12)
+        )
+        pool.close()
+    assert all(r.success for r in responses)
+    assert server.connections == 3
+
+
+def test_idle_connections_are_not_reused() -> None:
+    with local_smtp() as server:
+        pool = SMTPPool(smtp_options(), idle_seconds=0)
+        assert pool.send(message(), "one@example.com").success
+        assert pool.send(message(), "two@example.com").success
+        pool.close()
+    assert server.connections == 2
+
+
+def test_dropped_connections_are_reopened() -> None:
+    with local_smtp() as server:
+        assert get_smtp_pool().send(message(), "one@example.com").success
+        server.disconnect_all()
+        assert get_smtp_pool().send(message(), "two@example.com").success
+    assert server.connections == 2
+    assert len(server.messages) == 2
+
+
+def test_unreachable_server_fails_the_rest_of_the_batch() -> None:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    pool = SMTPPool({"host": "127.0.0.1", "port": port})
+    responses = pool.send_many((message(), f"user{i}@example.com") for i in range(3))
+    assert len(responses) == 3
+    assert not any(r.success for r in responses)
+    assert responses[0].status_code is None
+    assert responses[0].error is not None
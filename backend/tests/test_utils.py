@@ -0,0 +1,47 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from jinja2 import Environment
+
+from app.utils import (
+    _bytecode_cache,
+    email_templates,
+    generate_announcement_emails,
+    generate_reset_password_email,
+    preload_email_templates,
+)
+
+
+def test_email_templates_render_without_reading_files() -> None:
+    preload_email_templates()
+    with patch.object(
+        email_templates.loader, "get_source", side_effect=AssertionError("read")
+    ):
+        email_data = generate_reset_password_email(
+            email_to="someone@example.com", email="someone@example.com", token="abc"
+        )
+    assert "reset-password?token=abc" in email_data.html_content
+
+
+def test_email_templates_bytecode_cache(tmp_path: Path) -> None:
+    directory = tmp_path / "templates"
+    with patch(
+        "app.core.config.settings.EMAIL_TEMPLATES_BYTECODE_CACHE_DIR", str(directory)
+    ):
+        cache = _bytecode_cache()
+    environment = Environment(loader=email_templates.loader, bytecode_cache=cache)
+    environment.get_template("new_account.html")
+    assert len(list(directory.iterdir())) == 1
+
+
+def test_announcement_escapes_user_supplied_text() -> None:
+    with patch("app.core.config.settings.PROJECT_NAME", "A & B"):
+        ((_, email_data),) = generate_announcement_emails(
+            [("someone@example.com", '<a href="https://evil">x</a>')],
+            "Subject",
+            "<script>alert(1)</script>",
+        )
+    html = email_data.html_content
+    assert "<a href" not in html and "<script>" not in html
+    assert "Hi &lt;a href=&#34;https://evil&#34;&gt;x&lt;/a&gt;," in html
+    assert "A &amp; B" in html
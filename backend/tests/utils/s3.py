@@ -0,0 +1,310 @@
+"""In-memory S3 stand-in for exercising `app.core.r2` over real HTTP.
+
+Implements the subset of the S3 API the app uses, path-style, without
+checking signatures. Run it inside the test's event loop with `fake_r2()`,
+or in a background thread with `fake_r2_thread()`; both point the R2
+settings at it.
+"""
+import asyncio
+import hashlib
+import threading
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import unquote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.r2 import R2Client
+
+BUCKET = "test-bucket"
+
+
+@dataclass
+class StoredObject:
+    body: bytes
+    content_type: str = "binary/octet-stream"
+    etag: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.etag:
+            self.etag = f'"{hashlib.md5(self.body).hexdigest()}"'
+
+
+@dataclass
+class FakeS3:
+    objects: dict[tuple[str, str], StoredObject] = field(default_factory=dict)
+    requests: list[tuple[str, str]] = field(default_factory=list)
+    peers: set[Any] = field(default_factory=set)
+    # upload id -> part number -> body
+    uploads: dict[str, dict[int, bytes]] = field(default_factory=dict)
+    aborted: list[str] = field(default_factory=list)
+    content_types: dict[str, str] = field(default_factory=dict)
+    # part numbers refused with 403, seconds each part upload takes
+    fail_parts: set[int] = field(default_factory=set)
+    part_delay: float = 0.0
+    parts_in_flight: int = 0
+    max_parts_in_flight: int = 0
+    # keys DeleteObjects reports as failed, number of DeleteObjects calls
+    fail_delete_keys: set[str] = field(default_factory=set)
+    delete_batches: int = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=1024**3)
+        app.router.add_route("*", "/{bucket}/{key:.+}", self.handle_object)
+        app.router.add_route("*", "/{bucket}", self.handle_bucket)
+        return app
+
+    async def handle_bucket(self, request: web.Request) -> web.Response:
+        bucket = request.match_info["bucket"]
+        if request.method == "POST" and "delete" in request.query:
+            self.requests.append(("DELETE_OBJECTS", ""))
+            self.delete_batches += 1
+            root = ElementTree.fromstring(await request.read())
+            keys = [el.text or "" for el in root.iter() if el.tag.endswith("Key")]
+            errors = []
+            for key in keys:
+                if key in self.fail_delete_keys:
+                    errors.append(
+                        f"<Error><Key>{escape(key)}</Key><Code>AccessDenied</Code>"
+                        "<Message>denied</Message></Error>"
+                    )
+                else:
+                    self.objects.pop((bucket, key), None)
+            body = f"<DeleteResult>{''.join(errors)}</DeleteResult>"
+            return web.Response(body=body, content_type="application/xml")
+        if request.method == "GET" and request.query.get("list-type") == "2":
+            self.requests.append(("LIST", request.query.get("prefix", "")))
+            prefix = request.query.get("prefix", "")
+            max_keys = int(request.query.get("max-keys", 1000))
+            after = request.query.get("continuation-token", "")
+            keys = sorted(
+                k for b, k in self.objects if b == bucket and k.startswith(prefix) and k > after
+            )
+            page, rest = keys[:max_keys], keys[max_keys:]
+            contents = "".join(
+                f"<Contents><Key>{escape(k)}</Key>"
+                f"<Size>{len(self.objects[(bucket, k)].body)}</Size>"
+                f"<ETag>{escape(self.objects[(bucket, k)].etag)}</ETag>"
+                "<LastModified>2024-01-01T00:00:00.000Z</LastModified></Contents>"
+                for k in page
+            )
+            more = (
+                f"<IsTruncated>true</IsTruncated>"
+                f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>"
+                if rest
+                else "<IsTruncated>false</IsTruncated>"
+            )
+            body = (
+                f"<ListBucketResult><Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix>"
+                f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+                f"{more}{contents}</ListBucketResult>"
+            )
+            return web.Response(body=body, content_type="application/xml")
+        return _error(405, "MethodNotAllowed")
+
+    async def handle_object(self, request: web.Request) -> web.StreamResponse:
+        bucket = request.match_info["bucket"]
+        key = request.match_info["key"]
+        self.requests.append((request.method, key))
+        if request.transport is not None:
+            self.peers.add(request.transport.get_extra_info("peername"))
+        if "uploads" in request.query or "uploadId" in request.query:
+            return await self.handle_multipart(request, bucket, key)
+        if request.method == "PUT" and "x-amz-copy-source" in request.headers:
+            source = self._copy_source(request)
+            if source is None:
+                return _error(404, "NoSuchKey")
+            obj = StoredObject(source.body, source.content_type)
+            self.objects[(bucket, key)] = obj
+            return _xml("CopyObjectResult", ETag=obj.etag)
+        if request.method == "PUT":
+            obj = StoredObject(
+                await request.read(),
+                request.headers.get("Content-Type", "binary/octet-stream"),
+            )
+            self.objects[(bucket, key)] = obj
+            return web.Response(headers={"ETag": obj.etag})
+        if request.method == "DELETE":
+            self.objects.pop((bucket, key), None)
+            return web.Response(status=204)
+        obj = self.objects.get((bucket, key))
+        if obj is None:
+            return _error(404, "NoSuchKey")
+        headers = {
+            "ETag": obj.etag,
+            "Content-Type": obj.content_type,
+            "Content-Length": str(len(obj.body)),
+        }
+        if request.headers.get("If-None-Match") == obj.etag:
+            return web.Response(status=304, headers={"ETag": obj.etag})
+        if request.method == "HEAD":
+            return web.Response(headers=headers)
+        byte_range = request.headers.get("Range")
+        if byte_range:
+            size = len(obj.body)
+            first, _, last = byte_range.removeprefix("bytes=").partition("-")
+            if not first:
+                start, end = max(size - int(last), 0), size - 1
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                return _error(416, "InvalidRange")
+            body = obj.body[start : end + 1]
+            headers["Content-Length"] = str(len(body))
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return web.Response(status=206, body=body, headers=headers)
+        return web.Response(body=obj.body, headers=headers)
+
+    def _copy_source(self, request: web.Request) -> StoredObject | None:
+        source_bucket, _, source_key = (
+            unquote(request.headers["x-amz-copy-source"]).lstrip("/").partition("/")
+        )
+        return self.objects.get((source_bucket, source_key))
+
+    async def handle_multipart(
+        self, request: web.Request, bucket: str, key: str
+    ) -> web.Response:
+        if request.method == "POST" and "uploads" in request.query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            self.content_types[upload_id] = request.headers.get(
+                "Content-Type", "binary/octet-stream"
+            )
+            return _xml(
+                "InitiateMultipartUploadResult",
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+        upload_id = request.query["uploadId"]
+        parts = self.uploads.get(upload_id)
+        if parts is None:
+            return _error(404, "NoSuchUpload")
+        if request.method == "PUT" and "x-amz-copy-source" in request.headers:
+            source = self._copy_source(request)
+            if source is None:
+                return _error(404, "NoSuchKey")
+            first, _, last = (
+                request.headers["x-amz-copy-source-range"].removeprefix("bytes=").partition("-")
+            )
+            body = source.body[int(first) : int(last) + 1]
+            parts[int(request.query["partNumber"])] = body
+            return _xml("CopyPartResult", ETag=f'"{hashlib.md5(body).hexdigest()}"')
+        if request.method == "PUT":
+            number = int(request.query["partNumber"])
+            self.parts_in_flight += 1
+            self.max_parts_in_flight = max(
+                self.max_parts_in_flight, self.parts_in_flight
+            )
+            try:
+                body = await request.read()
+                await asyncio.sleep(self.part_delay)
+            finally:
+                self.parts_in_flight -= 1
+            if number in self.fail_parts:
+                return _error(403, "AccessDenied")
+            parts[number] = body
+            return web.Response(headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if request.method == "DELETE":
+            del self.uploads[upload_id]
+            self.aborted.append(upload_id)
+            return web.Response(status=204)
+        # POST ?uploadId: complete, in the order the client listed the parts
+        root = ElementTree.fromstring(await request.read())
+        numbers = [int(el.text or 0) for el in root.iter() if el.tag.endswith("PartNumber")]
+        body = b"".join(parts[n] for n in numbers)
+        del self.uploads[upload_id]
+        obj = StoredObject(body, self.content_types.pop(upload_id))
+        self.objects[(bucket, key)] = obj
+        return _xml("CompleteMultipartUploadResult", Bucket=bucket, Key=key, ETag=obj.etag)
+
+
+def _xml(root: str, **fields: str) -> web.Response:
+    inner = "".join(f"<{k}>{escape(v)}</{k}>" for k, v in fields.items())
+    return web.Response(body=f"<{root}>{inner}</{root}>", content_type="application/xml")
+
+
+def _error(status: int, code: str) -> web.Response:
+    body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>"
+    return web.Response(status=status, body=body, content_type="application/xml")
+
+
+async def _serve(s3: FakeS3) -> tuple[web.AppRunner, int]:
+    runner = web.AppRunner(s3.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+
+@contextmanager
+def _configure_r2(port: int) -> Iterator[None]:
+    saved = {
+        name: getattr(settings, name)
+        for name in (
+            "R2_ENABLED",
+            "R2_BUCKET",
+            "R2_ACCESS_KEY_ID",
+            "R2_SECRET_ACCESS_KEY",
+            "R2_ENDPOINT_URL",
+        )
+    }
+    settings.R2_ENABLED = True
+    settings.R2_BUCKET = BUCKET
+    settings.R2_ACCESS_KEY_ID = "test-key"
+    settings.R2_SECRET_ACCESS_KEY = "test-secret"
+    settings.R2_ENDPOINT_URL = f"http://127.0.0.1:{port}"  # type: ignore[assignment]
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+
+@asynccontextmanager
+async def fake_r2() -> AsyncIterator[FakeS3]:
+    """Serve a `FakeS3` on localhost and configure R2 to use it."""
+    s3 = FakeS3()
+    runner, port = await _serve(s3)
+    try:
+        with _configure_r2(port):
+            try:
+                yield s3
+            finally:
+                await R2Client.close()
+    finally:
+        await runner.cleanup()
+
+
+@contextmanager
+def fake_r2_thread(client: TestClient | None = None) -> Iterator[FakeS3]:
+    """Like `fake_r2`, serving from a background thread for sync tests.
+
+    Pass the `TestClient` under test to close the R2 client its app opened
+    (on the client's event loop) when done.
+    """
+    s3 = FakeS3()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner, port = asyncio.run_coroutine_threadsafe(_serve(s3), loop).result()
+    try:
+        with _configure_r2(port):
+            try:
+                yield s3
+            finally:
+                if client is not None:
+                    client.portal.call(R2Client.close)  # type: ignore[union-attr]
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
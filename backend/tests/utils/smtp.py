@@ -0,0 +1,133 @@
+import email
+import email.policy
+import socket
+import socketserver
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from unittest.mock import patch
+
+from app.core.smtp import close_smtp_pool
+
+
+@dataclass
+class ReceivedMessage:
+    mail_from: str
+    rcpt_to: list[str]
+    data: bytes
+
+    @property
+    def html(self) -> str:
+        message = email.message_from_bytes(self.data, policy=email.policy.default)
+        return message.get_body(("html",)).get_content()  # type: ignore[union-attr,no-any-return]
+
+
+@dataclass
+class SMTPServer:
+    """Records what a local SMTP stand-in received."""
+
+    connections: int = 0
+    logins: int = 0
+    messages: list[ReceivedMessage] = field(default_factory=list)
+    # replies to RCPT TO for an address, used up one per attempt
+    replies: dict[str, list[int]] = field(default_factory=dict)
+    sockets: set[socket.socket] = field(default_factory=set)
+    port: int = 0
+
+    def reply_to(self, address: str, *codes: int) -> None:
+        self.replies.setdefault(address, []).extend(codes)
+
+    def disconnect_all(self) -> None:
+        """Drop the open connections, as a server timing them out would."""
+        for sock in list(self.sockets):
+            sock.shutdown(socket.SHUT_RDWR)
+
+
+def _address(argument: str) -> str:
+    return argument.split(":", 1)[1].strip().split()[0].strip("<>")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_TCPServer"
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        state = self.server.state
+        state.connections += 1
+        state.sockets.add(self.connection)
+        try:
+            self.session(state)
+        except OSError:
+            pass
+        finally:
+            state.sockets.discard(self.connection)
+
+    def session(self, state: SMTPServer) -> None:
+        self.reply("220 localhost ESMTP stand-in")
+        mail_from, rcpt_to = "", []
+        while line := self.rfile.readline():
+            command, _, argument = line.decode().rstrip("\r\n").partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250-8BITMIME")
+                self.reply("250 AUTH PLAIN")
+            elif command == "AUTH":
+                state.logins += 1
+                self.reply("235 Authentication successful")
+            elif command == "MAIL":
+                mail_from, rcpt_to = _address(argument), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = _address(argument)
+                queued = state.replies.get(address)
+                code = queued.pop(0) if queued else 250
+                if code == 250:
+                    rcpt_to.append(address)
+                self.reply(f"{code} {'OK' if code == 250 else 'Refused'}")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    data += chunk
+                state.messages.append(ReceivedMessage(mail_from, rcpt_to, data))
+                self.reply("250 OK")
+            elif command in ("HELO", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    state: SMTPServer
+
+
+@contextmanager
+def local_smtp() -> Iterator[SMTPServer]:
+    """Run an SMTP stand-in on localhost and point the settings at it."""
+    server = _TCPServer(("127.0.0.1", 0), _Handler)
+    server.state = SMTPServer(port=server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with (
+            patch("app.core.config.settings.SMTP_HOST", "127.0.0.1"),
+            patch("app.core.config.settings.SMTP_PORT", server.state.port),
+            patch("app.core.config.settings.SMTP_TLS", False),
+            patch("app.core.config.settings.SMTP_SSL", False),
+            patch("app.core.config.settings.SMTP_USER", "mailer"),
+            patch("app.core.config.settings.SMTP_PASSWORD", "secret"),
+            patch("app.core.config.settings.EMAILS_FROM_EMAIL", "noreply@example.com"),
+        ):
+            yield server.state
+    finally:
+        close_smtp_pool()
+        server.shutdown()
+        server.server_close()
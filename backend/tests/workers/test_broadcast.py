@@ -0,0 +1,63 @@
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from fakeredis import FakeRedis
+from sqlmodel import Session, col, func, select
+
+from app.core.celery_app import celery_app
+from app.models import User
+from app.workers.broadcast import create_progress, get_progress
+from app.workers.tasks import fan_out_broadcast
+from tests.utils.smtp import local_smtp
+from tests.utils.user import create_random_user
+
+
+@contextmanager
+def eager_tasks() -> Iterator[None]:
+    """Run queued tasks (and groups) inline instead of publishing them."""
+    celery_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        celery_app.conf.task_always_eager = False
+
+
+def test_broadcast_emails_every_active_user(db: Session) -> None:
+    inactive = create_random_user(db)
+    inactive.is_active = False
+    db.add(inactive)
+    db.commit()
+    busy = create_random_user(db)
+    gone = create_random_user(db)
+    active = db.exec(
+        select(func.count()).select_from(User).where(col(User.is_active).is_(True))
+    ).one()
+
+    redis = FakeRedis(decode_responses=True)
+    broadcast_id = str(uuid.uuid4())
+    create_progress(redis, broadcast_id, "Maintenance")
+    with (
+        local_smtp() as server,
+        patch("app.workers.tasks.get_sync_redis", return_value=redis),
+        patch("app.core.config.settings.BROADCAST_CHUNK_SIZE", 2),
+        patch("app.core.config.settings.BROADCAST_GROUP_SIZE", 2),
+        eager_tasks(),
+    ):
+        server.reply_to(busy.email, 451)
+        server.reply_to(gone.email, 550)
+        fan_out_broadcast.apply(args=(broadcast_id, "Maintenance", "<b>Sunday</b>"))
+
+    progress = get_progress(redis, broadcast_id)
+    assert progress is not None
+    assert progress.status == "done"
+    assert progress.recipients == active
+    assert progress.chunks == progress.chunks_done == (active + 1) // 2
+    assert progress.sent == active - 1
+    assert progress.rejected == 1
+    assert progress.failed == 0
+    recipients = [rcpt for m in server.messages for rcpt in m.rcpt_to]
+    assert inactive.email not in recipients
+    assert recipients.count(busy.email) == 1
+    assert "&lt;b&gt;Sunday&lt;/b&gt;" in server.messages[0].html
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core.celery_app import (
+    BULK_QUEUE,
+    DEFAULT_QUEUE,
+    EMAIL_QUEUE,
+    HEAVY_QUEUE,
+    celery_app,
+)
+from app.workers import tasks
+from app.workers.celery_worker import main
+
+TASK_QUEUES = {
+    "app.workers.tasks.add": DEFAULT_QUEUE,
+    "app.workers.tasks.send_test_email": EMAIL_QUEUE,
+    "app.workers.tasks.send_reset_password_email": EMAIL_QUEUE,
+    "app.workers.tasks.send_welcome_email": EMAIL_QUEUE,
+    "app.workers.tasks.send_email_batch": BULK_QUEUE,
+    "app.workers.tasks.send_broadcast_chunk": BULK_QUEUE,
+    "app.workers.tasks.generate_derivatives": HEAVY_QUEUE,
+    "app.workers.tasks.fan_out_broadcast": HEAVY_QUEUE,
+}
+
+
+@pytest.mark.parametrize(("task", "queue"), TASK_QUEUES.items())
+def test_tasks_are_routed_to_their_queue(task: str, queue: str) -> None:
+    assert celery_app.amqp.router.route({}, task)["queue"].name == queue
+
+
+def test_every_task_has_an_expected_queue() -> None:
+    registered = {name for name in celery_app.tasks if name.startswith(tasks.__name__)}
+    assert registered == set(TASK_QUEUES)
+
+
+def test_worker_consumes_all_queues_by_default() -> None:
+    with patch.object(celery_app, "worker_main") as worker_main:
+        main([])
+    worker_main.assert_called_once_with(
+        ["worker", "--loglevel=info", "--queues=default,email,bulk,heavy"]
+    )
+
+
+def test_worker_options() -> None:
+    with patch.object(celery_app, "worker_main") as worker_main:
+        main(["-Q", "email", "-c", "32", "-P", "threads", "-n", "email@%h"])
+    worker_main.assert_called_once_with(
+        [
+            "worker",
+            "--loglevel=info",
+            "--queues=email",
+            "--concurrency=32",
+            "--pool=threads",
+            "--hostname=email@%h",
+        ]
+    )
@@ -0,0 +1,26 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.workers.loop import get_loop, run_async
+
+
+def test_run_async_reuses_the_thread_loop() -> None:
+    async def current() -> asyncio.AbstractEventLoop:
+        return asyncio.get_running_loop()
+
+    assert run_async(current()) is run_async(current()) is get_loop()
+
+
+def test_run_async_from_concurrent_threads() -> None:
+    # both coroutines must be running at once for either to finish, which
+    # fails if the threads share one loop ("already running")
+    barrier = threading.Barrier(2)
+
+    async def wait() -> asyncio.AbstractEventLoop:
+        await asyncio.to_thread(barrier.wait, 5)
+        return asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(2) as pool:
+        loops = list(pool.map(lambda _: run_async(wait()), range(2)))
+    assert loops[0] is not loops[1]
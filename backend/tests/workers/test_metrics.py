@@ -0,0 +1,103 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from celery.app.task import Context
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from fakeredis import FakeRedis, FakeServer
+from fakeredis import aioredis as fakeredis
+
+from app.core.metrics import MetricsRegistry
+from app.core.redis import RedisClient
+from app.workers.metrics import (
+    QueueDepthSampler,
+    collect_task_metrics,
+    get_task_stats,
+)
+
+
+def run_task(name: str, state: str, **request: object) -> None:
+    """Fire the signals of a task run by a worker."""
+    task = SimpleNamespace(
+        name=name, request=Context({"is_eager": False, "eta": None, **request})
+    )
+    task_prerun.send(sender=name, task_id="id", task=task, args=(), kwargs={})
+    task_postrun.send(
+        sender=name, task_id="id", task=task, args=(), kwargs={}, state=state
+    )
+
+
+def render(server: FakeServer) -> str:
+    registry = MetricsRegistry()
+    registry.register(collect_task_metrics)
+
+    async def scenario() -> str:
+        with patch.object(
+            RedisClient,
+            "_instance",
+            fakeredis.FakeRedis(server=server, decode_responses=True),
+        ):
+            return await registry.render()
+
+    return asyncio.run(scenario())
+
+
+def test_published_tasks_are_stamped() -> None:
+    headers: dict[str, object] = {}
+    before_task_publish.send(sender="app.workers.tasks.add", headers=headers)
+    assert abs(headers["published_at"] - time.time()) < 5  # type: ignore[operator]
+
+
+def test_task_metrics_are_flushed_and_rendered() -> None:
+    server = FakeServer()
+    run_task("t", "SUCCESS", published_at=time.time() - 2)
+    run_task("t", "RETRY", published_at=time.time())
+    # the wait of a task with a countdown starts at its ETA
+    eta = datetime.now(timezone.utc) - timedelta(seconds=0.2)
+    run_task("t", "FAILURE", published_at=time.time() - 120, eta=eta.isoformat())
+    with patch(
+        "app.workers.metrics.get_sync_redis",
+        return_value=FakeRedis(server=server, decode_responses=True),
+    ):
+        get_task_stats().flush()
+
+    text = render(server)
+    assert 'celery_tasks_total{task="t",outcome="success"} 1' in text
+    assert 'celery_tasks_total{task="t",outcome="retry"} 1' in text
+    assert 'celery_tasks_total{task="t",outcome="failure"} 1' in text
+    assert "# TYPE celery_task_wait_seconds histogram" in text
+    assert 'celery_task_wait_seconds_bucket{task="t",le="0.1"} 1' in text
+    assert 'celery_task_wait_seconds_bucket{task="t",le="1"} 2' in text
+    assert 'celery_task_wait_seconds_bucket{task="t",le="5"} 3' in text
+    assert 'celery_task_wait_seconds_count{task="t"} 3' in text
+    assert 'celery_task_runtime_seconds_bucket{task="t",le="+Inf"} 3' in text
+
+
+def test_eager_tasks_are_not_recorded() -> None:
+    server = FakeServer()
+    run_task("eager", "SUCCESS", is_eager=True)
+    with patch(
+        "app.workers.metrics.get_sync_redis",
+        return_value=FakeRedis(server=server, decode_responses=True),
+    ):
+        get_task_stats().flush()
+    assert 'task="eager"' not in render(server)
+
+
+def test_queue_depth_sampler() -> None:
+    async def scenario() -> None:
+        broker = fakeredis.FakeRedis()
+        await broker.rpush("email", "a", "b", "c")
+        sampler = QueueDepthSampler(broker, interval=60)
+        await sampler.sample()
+        [metric] = sampler.collect_metrics()
+        assert metric.samples == [
+            ({"queue": "default"}, 0),
+            ({"queue": "email"}, 3),
+            ({"queue": "bulk"}, 0),
+            ({"queue": "heavy"}, 0),
+        ]
+
+    asyncio.run(scenario())
@@ -0,0 +1,116 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import Session
+
+from app.core.derivatives import derivative_key
+from app.core.r2 import R2Client, upload_bytes
+from app.models import ItemAttachment
+from app.workers.loop import run_async
+from app.workers.tasks import (
+    add,
+    enqueue,
+    generate_derivatives,
+    send_email_batch,
+    send_test_email,
+)
+from tests.utils.item import create_random_item
+from tests.utils.s3 import BUCKET, fake_r2_thread
+from tests.utils.smtp import local_smtp
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_add() -> None:
+    assert add.apply(args=(2, 3)).get() == 5
+
+
+def test_generate_derivatives_records_the_content_hash(db: Session) -> None:
+    item = create_random_item(db)
+    out = io.BytesIO()
+    Image.new("RGB", (640, 480), "navy").save(out, "JPEG")
+    attachment = ItemAttachment(
+        item_id=item.id,
+        filename="photo.jpg",
+        content_type="image/jpeg",
+        key=f"users/{item.owner_id}/items/{item.id}/photo.jpg",
+        uploaded=True,
+    )
+    db.add(attachment)
+    db.commit()
+    with fake_r2_thread() as s3:
+        try:
+            run_async(upload_bytes(attachment.key, out.getvalue()))
+            digest = generate_derivatives.apply(args=(str(attachment.id),)).get()
+        finally:
+            run_async(R2Client.close())
+        assert (BUCKET, derivative_key(digest, "thumbnail")) in s3.objects
+    db.refresh(attachment)
+    assert attachment.sha256 == digest
+
+
+def test_generate_derivatives_skips_other_files(db: Session) -> None:
+    item = create_random_item(db)
+    attachment = ItemAttachment(
+        item_id=item.id,
+        filename="notes.txt",
+        content_type="text/plain",
+        key="notes.txt",
+        uploaded=True,
+    )
+    db.add(attachment)
+    db.commit()
+    assert generate_derivatives.apply(args=(str(attachment.id),)).get() is None
+
+
+class SMTPResponse:
+    def __init__(self, status_code: int | None, error: Exception | None = None):
+        self.status_code = status_code
+        self.status_text = "status"
+        self.error = error
+        self.success = status_code == 250
+
+
+def test_email_tasks_retry_transient_failures() -> None:
+    responses = [
+        SMTPResponse(None, ConnectionRefusedError()),
+        SMTPResponse(421),
+        SMTPResponse(250),
+    ]
+    with patch("app.workers.tasks.send_email", side_effect=responses) as send_email:
+        send_test_email.apply(args=("someone@example.com",)).get()
+    assert send_email.call_count == 3
+    assert send_email.call_args.kwargs["email_to"] == "someone@example.com"
+
+
+def test_email_tasks_give_up_on_rejections() -> None:
+    with patch(
+        "app.workers.tasks.send_email", return_value=SMTPResponse(550)
+    ) as send_email:
+        send_test_email.apply(args=("nobody@example.com",)).get()
+    assert send_email.call_count == 1
+
+
+def test_email_batches_retry_only_deferred_messages() -> None:
+    messages = [
+        {"email_to": to, "subject": "News", "html_content": "<p>News</p>"}
+        for to in ("a@example.com", "busy@example.com", "gone@example.com")
+    ]
+    with local_smtp() as server:
+        server.reply_to("busy@example.com", 451, 451)
+        server.reply_to("gone@example.com", 550)
+        send_email_batch.apply(args=(messages,)).get()
+    assert [m.rcpt_to for m in server.messages] == [
+        ["a@example.com"],
+        ["busy@example.com"],
+    ]
+    assert server.connections == 1
+
+
+def test_enqueue_survives_an_unreachable_broker() -> None:
+    with patch.object(
+        send_test_email, "apply_async", side_effect=OSError("no broker")
+    ) as apply_async:
+        enqueue(send_test_email, "someone@example.com")
+    apply_async.assert_called_once()